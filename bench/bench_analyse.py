@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+#
+# nom                bench_analyse.py
+# description        Mesure le débit (opérations/s) de chaque étape de la conversion
+#                    sur des relevés synthétiques (genere_releve.py) : classement des
+#                    lignes, analyse, export CSV, export XLSX, aller-retour du cache
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import argparse, contextlib, io, json, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import convertBNP_5col as bnp
+from genere_releve import genere_releve
+
+
+def corpus(releves, operations, pages, separateur, annexes):
+    """Textes de releves relevés synthétiques, un par mois à partir de janvier 2016,
+    découpés en lignes comme par 'pdftotext -layout'"""
+    textes = []
+    for num in range(releves):
+        annee, mois = 2016 + num // 12, 1 + num % 12
+        texte = genere_releve(operations, pages, annee, mois, graine=num,
+                              separateur=separateur, pages_annexes=annexes)
+        textes.append(("{:04d}".format(annee), "{:02d}".format(mois),
+                       io.StringIO(texte, newline=None).readlines()))
+    return textes
+
+
+def analyse(textes, jobs=1):
+    releves = []
+    for annee, mois, lignes in textes:
+        releve = bnp.UnReleve()
+        releve.ajoute_from_lignes(lignes, annee, mois, jobs=jobs)
+        releves.append((annee, mois, releve))
+    return releves
+
+
+def classement(textes):
+    for annee, mois, lignes in textes:
+        for ligne in lignes:
+            bnp.classe_ligne(ligne)
+
+
+def export(releves, contexte, repertoire):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for annee, mois, releve in releves:
+            releve.contexte = contexte
+            releve.genere_CSV("Relevé_{}-{}".format(annee, mois), repertoire, mois)
+
+
+def cache(releves):
+    for annee, mois, releve in releves:
+        donnees = json.dumps(releve.vers_donnees(), ensure_ascii=False, separators=(',', ':'))
+        bnp.UnReleve.depuis_donnees(json.loads(donnees))
+
+
+def chrono(fonction, repetitions, *args):
+    """Meilleure durée (s) de fonction(*args) sur repetitions essais"""
+    meilleure = None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction(*args)
+        duree = time.perf_counter() - debut
+        meilleure = duree if meilleure is None else min(meilleure, duree)
+    return meilleure
+
+
+def main():
+    parser = argparse.ArgumentParser(description="débit de chaque étape de la conversion")
+    parser.add_argument("--releves", type=int, default=12, help="nombre de relevés")
+    parser.add_argument("--operations", type=int, default=300,
+                        help="nombre d'opérations par relevé")
+    parser.add_argument("--pages", type=int, help="nombre de pages du tableau par relevé")
+    parser.add_argument("--annexes", type=int, default=0,
+                        help="pages de mentions légales après le solde final")
+    parser.add_argument("--separateur", default='.', help="séparateur des milliers ('.' ou ' ')")
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--sans-xlsx", action="store_true", help="ne mesure pas l'export XLSX")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="mesure aussi l'analyse page par page dans jobs processus "
+                        "(relevés d'au moins {} pages)".format(bnp.PAGES_PARALLELES))
+    myargs = parser.parse_args()
+
+    textes = corpus(myargs.releves, myargs.operations, myargs.pages, myargs.separateur,
+                    myargs.annexes)
+    releves = analyse(textes)
+    nombre = sum(len(releve.liste) for annee, mois, releve in releves)
+    lignes = sum(len(texte) for annee, mois, texte in textes)
+    if nombre != myargs.releves * myargs.operations:
+        print("{} opérations lues au lieu de {}".format(nombre, myargs.releves * myargs.operations))
+        return 1
+    print("{} relevés, {} opérations, {} lignes".format(len(releves), nombre, lignes))
+
+    with tempfile.TemporaryDirectory() as repertoire:
+        etapes = [("classement", classement, (textes,)),
+                  ("analyse", analyse, (textes,)),
+                  ("export CSV", export, (releves, bnp.Contexte(sorties=('csv',)), repertoire)),
+                  ("cache", cache, (releves,))]
+        if myargs.jobs > 1:
+            etapes.insert(2, ("analyse//", analyse, (textes, myargs.jobs)))
+        if not myargs.sans_xlsx:
+            xlsx = bnp.Contexte(sorties=('xlsx',))
+            etapes.insert(3, ("export XLSX", export, (releves, xlsx, repertoire)))
+        for nom, fonction, args in etapes:
+            duree = chrono(fonction, myargs.repetitions, *args)
+            print("{:12} : {:8.3f} s  {:10.0f} opérations/s  {:10.0f} lignes/s".format(
+                nom, duree, nombre / duree, lignes / duree))
+    bnp.ferme_executeur()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
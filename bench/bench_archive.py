@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+#
+# nom                bench_archive.py
+# description        Compare, sur un historique synthétique (genere_releve.py), le
+#                    rechargement des CSV mensuels pour l'analyse à l'ouverture de l'archive
+#                    en colonnes (ArchiveColonnes, LectureArchive) : ouverture, puis
+#                    parcours des montants en memoryview et, si NumPy est installé, en NumPy
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import argparse, contextlib, csv, io, os, sys, tempfile, time
+from datetime import datetime as dt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import convertBNP_5col as bnp
+from genere_releve import genere_releve
+
+
+def historique(releves, operations, repertoire, archive):
+    """Analyse releves relevés synthétiques, un par mois à partir de janvier 2010, en
+    écrit les CSV dans repertoire et les importe dans l'archive. Renvoie les CSV"""
+    contexte = bnp.Contexte(sorties=('csv',))
+    colonnes = bnp.ArchiveColonnes(archive)
+    fichiers = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for num in range(releves):
+            annee, mois = "{:04d}".format(2010 + num // 12), "{:02d}".format(1 + num % 12)
+            texte = genere_releve(operations, None, int(annee), int(mois), graine=num)
+            releve = bnp.UnReleve(contexte=contexte)
+            releve.ajoute_from_lignes(io.StringIO(texte, newline=None).readlines(), annee, mois)
+            nom = "Relevé_BNP_{}-{}".format(annee, mois)
+            releve.genere_CSV(nom, repertoire, mois)
+            colonnes.importe(releve, "3000400123", annee, mois, nom + ".pdf")
+            fichiers.append(os.path.join(repertoire, nom + ".csv"))
+    colonnes.ferme()
+    return fichiers
+
+
+def charge_CSV(fichiers):
+    """Recharge les opérations des CSV (hors soldes) en (date, débit, crédit,
+    descriptif), dates en ordinal et montants en centimes ; renvoie le total des débits"""
+    operations = []
+    for fichier in fichiers:
+        with open(fichier, newline='') as file:
+            lignes = csv.reader(file, delimiter=bnp.CSV_SEP)
+            next(lignes)
+            for date, valeur, oper, debit, credit, desc in lignes:
+                if valeur:
+                    operations.append((dt.strptime(date, '%d/%m/%Y').toordinal(),
+                                       round(float(debit) * 100), round(float(credit) * 100),
+                                       desc))
+    return sum(operation[1] for operation in operations)
+
+
+def ouvre(archive):
+    with bnp.LectureArchive(archive) as lecture:
+        lecture.colonne('date')
+        lecture.colonne('debit')
+
+
+def parcours_memoryview(archive):
+    with bnp.LectureArchive(archive) as lecture:
+        return sum(lecture.colonne('debit'))
+
+
+def parcours_numpy(archive):
+    lecture = bnp.LectureArchive(archive)
+    dates, debits = lecture.numpy('date'), lecture.numpy('debit')
+    # débits d'une année : filtre sur les dates, sans boucle Python
+    debut, fin = dt(2015, 1, 1).toordinal(), dt(2016, 1, 1).toordinal()
+    debits[(dates >= debut) & (dates < fin)].sum()
+    total = int(debits.sum())
+    del dates, debits
+    lecture.ferme()
+    return total
+
+
+def chrono(fonction, repetitions, *args):
+    """Meilleure durée (s) de fonction(*args) sur repetitions essais, et son résultat"""
+    meilleure = None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction(*args)
+        duree = time.perf_counter() - debut
+        meilleure = duree if meilleure is None else min(meilleure, duree)
+    return meilleure, resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="rechargement des CSV / archive en colonnes")
+    parser.add_argument("--releves", type=int, default=180, help="nombre de relevés (mois)")
+    parser.add_argument("--operations", type=int, default=300,
+                        help="nombre d'opérations par relevé")
+    parser.add_argument("--repetitions", type=int, default=3)
+    myargs = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as repertoire:
+        archive = os.path.join(repertoire, "archive")
+        fichiers = historique(myargs.releves, myargs.operations, repertoire, archive)
+        nombre = myargs.releves * myargs.operations
+        print("{} relevés, {} opérations, {:.1f} Mo de CSV, {:.1f} Mo d'archive".format(
+            myargs.releves, nombre, sum(os.path.getsize(f) for f in fichiers) / 1e6,
+            sum(entry.stat().st_size for entry in os.scandir(archive)) / 1e6))
+        essais = [("CSV", charge_CSV, fichiers),
+                  ("ouverture", ouvre, archive),
+                  ("memoryview", parcours_memoryview, archive)]
+        try:
+            import numpy  # noqa: F401
+            essais.append(("numpy", parcours_numpy, archive))
+        except ImportError:
+            print("(NumPy absent : pas de mesure NumPy)")
+        totaux = set()
+        for nom, fonction, args in essais:
+            duree, total = chrono(fonction, myargs.repetitions, args)
+            if total is not None:
+                totaux.add(total)
+            print("{:10} : {:9.5f} s  {:12.0f} opérations/s".format(nom, duree, nombre / duree))
+        if len(totaux) != 1:
+            print("totaux des débits différents : {}".format(sorted(totaux)))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+#
+# nom                bench_demarrage.py
+# description        Mesure le temps de démarrage de convertBNP : durée d'import du
+#                    module (python -X importtime), modules les plus coûteux, et durée
+#                    totale de "convertBNP_5col.py --help"
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import argparse, os, subprocess, sys, time
+
+REPERTOIRE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(REPERTOIRE, "convertBNP_5col.py")
+
+
+def importtime():
+    """Importe convertBNP_5col dans un nouvel interpréteur avec -X importtime et renvoie
+    la liste (propre, cumulé, module) des imports, en microsecondes"""
+    sortie = subprocess.run([sys.executable, "-X", "importtime", "-c", "import convertBNP_5col"],
+                            cwd=REPERTOIRE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True).stderr
+    imports = []
+    for ligne in sortie.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not ligne.startswith("import time:"):
+            continue
+        champs = ligne[len("import time:"):].split('|')
+        if not champs[0].strip().isdigit():
+            continue
+        imports.append((int(champs[0]), int(champs[1]), champs[2].rstrip()))
+    return imports
+
+
+def chrono(commande, repetitions):
+    """Durée minimale (s) d'exécution de la commande, sur repetitions essais"""
+    meilleure = None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        subprocess.run(commande, cwd=REPERTOIRE, stdout=subprocess.DEVNULL, check=True)
+        duree = time.perf_counter() - debut
+        meilleure = duree if meilleure is None else min(meilleure, duree)
+    return meilleure
+
+
+def main():
+    parser = argparse.ArgumentParser(description="temps de démarrage de convertBNP")
+    parser.add_argument("--repetitions", type=int, default=10, help="nombre d'essais")
+    parser.add_argument("--modules", type=int, default=10,
+                        help="nombre de modules les plus coûteux à afficher")
+    myargs = parser.parse_args()
+
+    imports = importtime()
+    module = [cumul for propre, cumul, nom in imports if nom.strip() == "convertBNP_5col"]
+    print("import convertBNP_5col : {:7.1f} ms (-X importtime)".format(module[-1] / 1000))
+    print("modules les plus coûteux (temps propre) :")
+    for propre, cumul, nom in sorted(imports, reverse=True)[:myargs.modules]:
+        print("  {:7.1f} ms  {}".format(propre / 1000, nom.strip()))
+
+    vide = chrono([sys.executable, "-c", "pass"], myargs.repetitions)
+    bare = chrono([sys.executable, "-c", "import convertBNP_5col"], myargs.repetitions)
+    aide = chrono([sys.executable, SCRIPT, "--help"], myargs.repetitions)
+    print("interpréteur seul      : {:7.1f} ms".format(vide * 1000))
+    print("import convertBNP_5col : {:7.1f} ms".format(bare * 1000))
+    print("convertBNP_5col --help : {:7.1f} ms".format(aide * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+#
+# nom                bench_flux.py
+# description        Compare, sur un très long relevé synthétique (genere_releve.py), la
+#                    conversion habituelle (relevé en mémoire, trié, puis CSV) à l'écriture
+#                    au fil de l'eau (ecrit_flux) en CSV et NDJSON : durée et pic de mémoire
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import argparse, os, sys, tempfile, time, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import convertBNP_5col as bnp
+from genere_releve import genere_releve, nom_fichier
+
+
+def en_memoire(source, sortie):
+    releve = bnp.convert_pdf(source)
+    with open(sortie, 'w') as file:
+        file.writelines(releve.lignes_CSV())
+
+
+def mesure(fonction, *args):
+    """Durée (s) de fonction(*args), puis pic de mémoire (octets) d'un second appel"""
+    debut = time.perf_counter()
+    fonction(*args)
+    duree = time.perf_counter() - debut
+    tracemalloc.start()
+    fonction(*args)
+    pic = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duree, pic
+
+
+def main():
+    parser = argparse.ArgumentParser(description="conversion en mémoire / au fil de l'eau")
+    parser.add_argument("--operations", type=int, default=20000,
+                        help="nombre d'opérations du relevé")
+    myargs = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as repertoire:
+        # un TXT produit par pdftotext : pas besoin de pdftotext pour la mesure
+        source = os.path.join(repertoire, nom_fichier("3000400123", 2016, 3) + ".txt")
+        with open(source, 'w') as file:
+            file.write(genere_releve(myargs.operations, None, 2016, 3, graine=0))
+        sortie = os.path.join(repertoire, "sortie")
+        print("{} opérations, {:.1f} Mo de texte".format(myargs.operations,
+                                                         os.path.getsize(source) / 1e6))
+        essais = [("en mémoire", en_memoire, (source, sortie)),
+                  ("flux CSV", bnp.ecrit_flux, (source, sortie, 'csv')),
+                  ("flux CSV trié", bnp.ecrit_flux, (source, sortie, 'csv', None, None, None,
+                                                     None, True)),
+                  ("flux NDJSON", bnp.ecrit_flux, (source, sortie, 'ndjson'))]
+        for nom, fonction, args in essais:
+            duree, pic = mesure(fonction, *args)
+            print("{:14} : {:7.3f} s  {:10.0f} opérations/s  pic {:8.2f} Mo".format(
+                nom, duree, myargs.operations / duree, pic / 1e6))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
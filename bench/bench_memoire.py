@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+#
+# nom                bench_memoire.py
+# description        Mesure la mémoire occupée par un long historique d'opérations :
+#                    uneOperation compacte (__slots__, centimes, ordinaux, descriptifs
+#                    internés) contre l'ancienne représentation à __dict__
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import argparse, os, random, sys, time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import convertBNP_5col as bnp
+
+MARCHANDS = ["CARREFOUR MARKET", "SNCF INTERNET", "AMAZON EU SARL", "BOULANGERIE DU PARC",
+             "STATION TOTAL", "PHARMACIE CENTRALE", "FNAC DARTY", "LEROY MERLIN", "PICARD SURGELES",
+             "RESTAURANT LE MARAIS", "CINEMA GAUMONT", "IKEA FRANCE", "DECATHLON", "MONOPRIX"]
+ORGANISMES = ["EDF CLIENTS PARTICULIERS", "ORANGE SA", "MUTUELLE GENERALE", "FREE MOBILE",
+              "ASSURANCE HABITATION MAAF", "DGFIP IMPOT", "SAUR EAU POTABLE"]
+
+
+def en_datetime(texte):
+    """Un nouveau datetime pour chaque date, comme le faisait dt.strptime"""
+    return datetime(int(texte[6:]), int(texte[3:5]), int(texte[:2]))
+
+
+class ancienneOperation:
+    """L'opération telle qu'elle était stockée avant : un __dict__ de 11 attributs,
+    trois dates en chaîne, trois datetime, deux flottants"""
+
+    def __init__(self, date, date_valeur, date_oper, desc, debit, credit):
+        self.date = date
+        self.dt_date = en_datetime(date)
+        self.date_valeur = date_valeur
+        self.dt_valeur = en_datetime(date_valeur)
+        self.date_oper = date_oper
+        self.dt_oper = en_datetime(date_oper) if date_oper else None
+        self.desc = desc
+        self.value = ""
+        self.debit = debit
+        self.credit = credit
+        self.valide = True
+
+
+def historique(nombre, annees=15, graine=0):
+    """Génère les champs de nombre opérations réparties sur annees années :
+    (date, date valeur, date d'opération, descriptif, débit, crédit)"""
+    alea = random.Random(graine)
+    debut = date(2016 - annees, 1, 1)
+    jours = annees * 365
+    carte = "4974XXXXXXXX{:04d}".format(alea.randint(0, 9999))
+    for num in range(nombre):
+        jour = debut + timedelta(days=num * jours // nombre)
+        valeur = jour + timedelta(days=alea.randint(0, 3))
+        date_oper = ""
+        sorte = alea.random()
+        if sorte < 0.6:
+            achat = jour - timedelta(days=alea.randint(1, 4))
+            date_oper = achat.strftime('%d/%m/%Y')
+            mots = ["DU", achat.strftime('%d%m%y'), alea.choice(MARCHANDS), "CARTE", carte]
+            debit, credit = alea.randint(100, 25000), 0
+        elif sorte < 0.9:
+            # prélèvements mensuels : même libellé d'un mois sur l'autre
+            mots = ["PRLV", "SEPA", alea.choice(ORGANISMES),
+                    "ECH/{}".format(jour.strftime('%m%y'))]
+            debit, credit = alea.randint(1500, 150000), 0
+        else:
+            mots = ["VIR", "SEPA", "RECU", "/DE", "SOCIETE EXEMPLE SAS", "/MOTIF", "SALAIRE"]
+            debit, credit = 0, alea.randint(200000, 450000)
+        # chaque descriptif est une nouvelle chaîne, comme à la lecture d'un relevé
+        yield (jour.strftime('%d/%m/%Y'), valeur.strftime('%d/%m/%Y'), date_oper,
+               ' '.join(mots), debit, credit)
+
+
+def construit_ancienne(champs):
+    return [ancienneOperation(date, date_valeur, date_oper, desc, debit / 100, credit / 100)
+            for date, date_valeur, date_oper, desc, debit, credit in champs]
+
+
+def construit_compacte(champs):
+    liste = []
+    for date, date_valeur, date_oper, desc, debit, credit in champs:
+        Ope = bnp.uneOperation(date, desc, "", debit / 100, credit / 100)
+        Ope.date_valeur = date_valeur
+        Ope.date_oper = date_oper
+        liste.append(Ope)
+    return liste
+
+
+def taille_retenue(liste):
+    """Octets occupés par la liste, les opérations et leurs attributs ; les objets
+    partagés entre opérations (chaînes internées, dates mémorisées) comptent une fois"""
+    vus = set()
+    total = sys.getsizeof(liste)
+    for Ope in liste:
+        if hasattr(Ope, '__dict__'):
+            objets = [Ope, Ope.__dict__] + list(Ope.__dict__.values())
+        else:
+            objets = [Ope] + [getattr(Ope, nom) for nom in Ope.__slots__]
+        for objet in objets:
+            if id(objet) not in vus:
+                vus.add(id(objet))
+                total += sys.getsizeof(objet)
+    return total
+
+
+def mesure(construit, nombre):
+    """Renvoie (octets, secondes) pour construire l'historique de nombre opérations"""
+    champs = list(historique(nombre))
+    debut = time.perf_counter()
+    liste = construit(champs)
+    duree = time.perf_counter() - debut
+    return taille_retenue(liste), duree
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mémoire occupée par un historique d'opérations")
+    parser.add_argument("--operations", type=int, default=1000000, help="nombre d'opérations")
+    myargs = parser.parse_args()
+
+    resultats = {}
+    for nom, construit in (("ancienne", construit_ancienne), ("compacte", construit_compacte)):
+        taille, duree = mesure(construit, myargs.operations)
+        resultats[nom] = taille
+        print("{:9} : {:8.1f} Mo  {:6.1f} octets/opération  construit en {:.1f} s".format(
+            nom, taille / 2**20, taille / myargs.operations, duree))
+    print("gain      : x{:.1f}".format(resultats["ancienne"] / resultats["compacte"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
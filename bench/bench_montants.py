@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+#
+# nom                bench_montants.py
+# description        Compare la conversion des montants par en_centimes() (entiers,
+#                    sans locales) à l'ancienne conversion en flottant par mysafe_atof()
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import argparse, os, random, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import convertBNP_5col as bnp
+
+
+def montants(nombre, graine=0):
+    """Montants tels qu'ils sont lus dans les relevés : '1.234,56', '1234,56' ..."""
+    alea = random.Random(graine)
+    liste = []
+    for _ in range(nombre):
+        euros, cents = alea.randint(0, 250000), alea.randint(0, 99)
+        if alea.random() < 0.5:
+            # lignes d'opérations : les points sont déjà retirés par list2valeur()
+            liste.append("{},{:02d}".format(euros, cents))
+        else:
+            # totaux et soldes
+            liste.append("{:,}".format(euros).replace(',', '.') + ",{:02d}".format(cents))
+    return liste
+
+
+def mesure(fonction, valeurs, repetitions):
+    """Renvoie la meilleure durée (s) pour convertir toutes les valeurs"""
+    def boucle():
+        for valeur in valeurs:
+            fonction(valeur)
+    return min(timeit.repeat(boucle, number=1, repeat=repetitions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="microbenchmark en_centimes / mysafe_atof")
+    parser.add_argument("--nombre", type=int, default=100000, help="nombre de montants")
+    parser.add_argument("--repetitions", type=int, default=5)
+    myargs = parser.parse_args()
+
+    valeurs = montants(myargs.nombre)
+    duree = mesure(bnp.en_centimes, valeurs, myargs.repetitions)
+    print("en_centimes  : {:8.3f} s  {:10.0f} montants/s".format(duree, len(valeurs) / duree))
+
+    # les montants des relevés récents ont le point pour séparateur des milliers
+    bnp.ts = '.'
+    # vérifie au passage que les deux conversions donnent le même montant
+    for valeur in valeurs[:1000]:
+        assert round(bnp.mysafe_atof(valeur) * 100) == bnp.en_centimes(valeur), valeur
+    duree_atof = mesure(bnp.mysafe_atof, valeurs, myargs.repetitions)
+    print("mysafe_atof  : {:8.3f} s  {:10.0f} montants/s".format(duree_atof,
+                                                                len(valeurs) / duree_atof))
+    print("accélération : x{:.1f}".format(duree_atof / duree))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
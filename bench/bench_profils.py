@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+#
+# nom                bench_profils.py
+# description        Compare le calcul des positions de colonnes d'un en-tête de page
+#                    par sonde_entete() (expressions régulières) à la recherche du
+#                    profil dans le registre des profils de mise en page (RegistreProfils)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import argparse, io, os, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import convertBNP_5col as bnp
+from genere_releve import genere_releve
+
+
+def entetes(releves, operations):
+    """Lignes d'en-tête de page de releves relevés synthétiques, dans l'ordre de
+    lecture (marges des pages paires et impaires)"""
+    lignes = []
+    for num in range(releves):
+        annee, mois = 2016 + num // 12, 1 + num % 12
+        texte = genere_releve(operations, None, annee, mois, graine=num)
+        lignes.extend(ligne for ligne in io.StringIO(texte, newline=None)
+                      if bnp.classe_ligne(ligne) & bnp.LIGNE_ENTETE)
+    return lignes
+
+
+def mesure(fonction, valeurs, repetitions):
+    """Renvoie la meilleure durée (s) pour traiter toutes les valeurs"""
+    def boucle():
+        for valeur in valeurs:
+            fonction(valeur)
+    return min(timeit.repeat(boucle, number=1, repeat=repetitions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="microbenchmark sonde_entete / RegistreProfils")
+    parser.add_argument("--releves", type=int, default=120, help="nombre de relevés")
+    parser.add_argument("--operations", type=int, default=300,
+                        help="nombre d'opérations par relevé")
+    parser.add_argument("--repetitions", type=int, default=5)
+    myargs = parser.parse_args()
+
+    lignes = entetes(myargs.releves, myargs.operations)
+    registre = bnp.RegistreProfils()
+    # vérifie au passage que le registre donne les positions sondées
+    for ligne in lignes:
+        assert registre.profil(ligne) == bnp.sonde_entete(ligne), ligne
+    print("{} en-têtes de page, {} profils".format(len(lignes), len(registre.profils)))
+
+    duree = mesure(bnp.sonde_entete, lignes, myargs.repetitions)
+    print("sonde_entete : {:8.4f} s  {:10.0f} en-têtes/s".format(duree, len(lignes) / duree))
+    duree_registre = mesure(registre.profil, lignes, myargs.repetitions)
+    print("registre     : {:8.4f} s  {:10.0f} en-têtes/s".format(duree_registre,
+                                                                len(lignes) / duree_registre))
+    print("accélération : x{:.1f}".format(duree / duree_registre))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
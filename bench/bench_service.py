@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+#
+# nom                bench_service.py
+# description        Charge le service de conversion (convertBNP_5col.py --serve) avec
+#                    des relevés synthétiques (genere_releve.py) envoyés en parallèle :
+#                    débit, latences côté client, et statistiques du service (GET /stats)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import argparse, asyncio, json, os, subprocess, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import convertBNP_5col as bnp
+from genere_releve import genere_releve, nom_fichier
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "convertBNP_5col.py")
+
+
+async def requete(hote, port, methode, chemin, corps=b"", type_contenu="text/plain"):
+    """Une requête HTTP/1.1 sur une nouvelle connexion : renvoie (statut, corps)"""
+    reader, writer = await asyncio.open_connection(hote, port)
+    entete = ("{} {} HTTP/1.1\r\nHost: {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n"
+              "Connection: close\r\n\r\n").format(methode, chemin, hote, type_contenu, len(corps))
+    writer.write(entete.encode('latin-1') + corps)
+    await writer.drain()
+    reponse = await reader.read()
+    writer.close()
+    entete, _, contenu = reponse.partition(b"\r\n\r\n")
+    return int(entete.split()[1]), contenu
+
+
+async def charge(hote, port, releves, clients, sorte):
+    """Envoie les relevés avec clients requêtes simultanées : renvoie les latences (s)
+    des réussites et le nombre de réponses par statut"""
+    latences, statuts = [], {}
+    a_envoyer = iter(releves)
+
+    async def client():
+        for nom, corps in a_envoyer:
+            debut = time.perf_counter()
+            statut, _ = await requete(hote, port, "POST",
+                                      "/convert?format={}&nom={}".format(sorte, nom), corps)
+            statuts[statut] = statuts.get(statut, 0) + 1
+            if statut == 200:
+                latences.append(time.perf_counter() - debut)
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latences, statuts
+
+
+async def attend_service(hote, port, delai=10):
+    fin = time.monotonic() + delai
+    while True:
+        try:
+            return await requete(hote, port, "GET", "/stats")
+        except OSError:
+            if time.monotonic() > fin:
+                raise
+            await asyncio.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="charge du service de conversion")
+    parser.add_argument("--releves", type=int, default=200, help="nombre de relevés envoyés")
+    parser.add_argument("--operations", type=int, default=300,
+                        help="nombre d'opérations par relevé")
+    parser.add_argument("--clients", type=int, default=16, help="requêtes simultanées")
+    parser.add_argument("--jobs", type=int, default=0,
+                        help="processus du service (0: un par processeur)")
+    parser.add_argument("--queue", type=int, default=bnp.SERVICE_ATTENTE_MAX,
+                        help="conversions en attente au plus dans le service")
+    parser.add_argument("--format", default="json", choices=["json", "csv"])
+    parser.add_argument("--port", type=int, default=8765)
+    myargs = parser.parse_args()
+
+    hote = bnp.SERVICE_HOTE
+    releves = []
+    for num in range(myargs.releves):
+        annee, mois = 2016 + num // 12, 1 + num % 12
+        texte = genere_releve(myargs.operations, None, annee, mois, graine=num)
+        releves.append((nom_fichier("3000400123", annee, mois), texte.encode('utf-8')))
+
+    service = subprocess.Popen([sys.executable, SCRIPT, "--serve",
+                                "{}:{}".format(hote, myargs.port), "--jobs",
+                                str(myargs.jobs), "--queue", str(myargs.queue)],
+                               stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(attend_service(hote, myargs.port))
+        debut = time.perf_counter()
+        latences, statuts = asyncio.run(charge(hote, myargs.port, releves, myargs.clients,
+                                               myargs.format))
+        duree = time.perf_counter() - debut
+        _, stats = asyncio.run(requete(hote, myargs.port, "GET", "/stats"))
+    finally:
+        service.terminate()
+        service.wait()
+
+    print("{} relevés en {:.2f} s : {:.1f} relevés/s, {:.0f} opérations/s".format(
+        len(latences), duree, len(latences) / duree,
+        len(latences) * myargs.operations / duree))
+    print("statuts : {}".format(statuts))
+    print("latence client (ms) : {}".format(bnp.quantiles(latences)))
+    print("service : {}".format(json.dumps(json.loads(stats), indent=2, ensure_ascii=False)))
+    return 0 if set(statuts) == {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
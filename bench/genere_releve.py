@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+#
+# nom                genere_releve.py
+# description        Génère des relevés BNP synthétiques, au format produit par
+#                    "pdftotext -layout", pour mesurer les performances de convertBNP
+#                    sans avoir besoin de vrais relevés bancaires
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import argparse, calendar, random, sys
+from datetime import date, timedelta
+
+# en-tête de colonnes, tel qu'imprimé en haut de chaque page
+ENTETE = "Date       Nature des opérations" + ' '*43 + "Valeur" + ' '*10 + "Débit" + ' '*14 + "Crédit"
+# pages paires et impaires n'ont pas la même marge gauche (ni la même largeur)
+MARGES = (8, 3)
+
+PIED = "BNP PARIBAS SA au capital de 2.499.597.122 € - Siège social : 16 bd des Italiens 75009 PARIS"
+
+MARCHANDS = ["CARREFOUR MARKET", "SNCF INTERNET", "AMAZON EU SARL", "BOULANGERIE DU PARC",
+             "STATION TOTAL", "PHARMACIE CENTRALE", "FNAC DARTY", "LEROY MERLIN", "PICARD SURGELES",
+             "RESTAURANT LE MARAIS", "CINEMA GAUMONT", "IKEA FRANCE", "DECATHLON", "MONOPRIX"]
+ORGANISMES = ["EDF CLIENTS PARTICULIERS", "ORANGE SA", "MUTUELLE GENERALE", "FREE MOBILE",
+              "ASSURANCE HABITATION MAAF", "DGFIP IMPOT", "SAUR EAU POTABLE"]
+EMETTEURS = ["SOCIETE EXEMPLE SAS", "CAF DE PARIS", "CPAM PARIS", "M. DUPONT JEAN"]
+
+
+def montant(centimes, separateur='.'):
+    """Formatte un montant comme sur les relevés : 1.234,56 ou 1 234,56"""
+    euros, cents = divmod(centimes, 100)
+    groupes = "{:,}".format(euros).replace(',', separateur)
+    return "{},{:02d}".format(groupes, cents)
+
+
+def _operation(alea, jour, annee, mois):
+    """Tire une opération au hasard : (jour, valeur, lignes de description, débit ?, centimes)"""
+    premier = date(annee, mois, 1)
+    d_oper = premier + timedelta(days=jour - 1)
+    sorte = alea.random()
+    if sorte < 0.45:
+        # paiement carte, exécuté quelques jours après l'achat
+        achat = d_oper - timedelta(days=alea.randint(1, 4))
+        carte = "4974XXXXXXXX{:04d}".format(alea.randint(0, 9999))
+        if alea.random() < 0.5:
+            lignes = ["DU {} {}".format(achat.strftime('%d%m%y'), alea.choice(MARCHANDS)),
+                      "CARTE {}".format(carte)]
+        else:
+            lignes = ["FACTURE(S) CARTE {} DU {}".format(carte, achat.strftime('%d%m%y')),
+                      alea.choice(MARCHANDS)]
+        debit, centimes = True, alea.randint(100, 25000)
+    elif sorte < 0.6:
+        retrait = d_oper - timedelta(days=alea.randint(0, 2))
+        lignes = ["RETRAIT DAB {} {:02d}H{:02d} {}".format(
+            retrait.strftime('%d/%m/%y'), alea.randint(7, 22), alea.randint(0, 59),
+            alea.choice(["PARIS", "LYON", "NANTES", "LILLE"]))]
+        debit, centimes = True, alea.choice([2000, 4000, 6000, 10000])
+    elif sorte < 0.8:
+        lignes = ["PRLV SEPA {}".format(alea.choice(ORGANISMES)),
+                  "ECH/{} ID EMETTEUR/FR{:010d}".format(d_oper.strftime('%d%m%y'),
+                                                       alea.randint(0, 10**10 - 1)),
+                  "MDT/{:08d} REF/{:012d}".format(alea.randint(0, 10**8 - 1),
+                                                  alea.randint(0, 10**12 - 1))]
+        debit, centimes = True, alea.randint(1500, 150000)
+    elif sorte < 0.95:
+        lignes = ["VIR SEPA RECU /DE {}".format(alea.choice(EMETTEURS)),
+                  "/MOTIF {} /REF {:010d}".format(alea.choice(["SALAIRE", "REMBOURSEMENT", "LOYER"]),
+                                                  alea.randint(0, 10**10 - 1))]
+        debit, centimes = False, alea.randint(2000, 450000)
+    else:
+        lignes = ["REMISE CHEQUE N {:07d}".format(alea.randint(0, 10**7 - 1))]
+        debit, centimes = False, alea.randint(1000, 1200000)
+    valeur = d_oper + timedelta(days=alea.randint(0, 3))
+    return d_oper, valeur, lignes, debit, centimes
+
+
+def genere_releve(n_operations=60, n_pages=None, annee=2016, mois=3, graine=0,
+                  monnaie="euro", separateur='.', pages_annexes=0):
+    """Renvoie le texte d'un relevé synthétique, pages séparées par des sauts de page.
+
+    n_operations  : nombre d'opérations bancaires
+    n_pages       : nombre de pages du tableau (par défaut, environ 18 opérations par page)
+    separateur    : séparateur des milliers, '.' (relevés récents) ou ' ' (anciens relevés)
+    pages_annexes : pages de mentions légales ajoutées après le solde final"""
+    alea = random.Random(graine)
+    if n_pages is None:
+        n_pages = max(1, (n_operations + 17) // 18)
+    n_pages = max(1, min(n_pages, max(1, n_operations)))
+    nb_jours = calendar.monthrange(annee, mois)[1]
+
+    jours = sorted(alea.randint(1, nb_jours) for _ in range(n_operations))
+    operations = [_operation(alea, jour, annee, mois) for jour in jours]
+
+    debut = date(annee, mois, 1) - timedelta(days=1)
+    fin = date(annee, mois, nb_jours)
+    solde = alea.randint(-50000, 500000)
+
+    largeur = len(ENTETE)
+    col_valeur = ENTETE.index("Valeur")
+    col_debit = ENTETE.index("Débit") + len("Débit")
+    col_credit = ENTETE.index("Crédit") + len("Crédit")
+    col_nature = ENTETE.index("Nature")
+
+    def rangee(marge, gauche, valeur="", debit="", credit=""):
+        """Une ligne du tableau, les montants alignés à droite de leur colonne"""
+        ligne = gauche.ljust(col_valeur) + valeur
+        if debit:
+            ligne = ligne.ljust(col_debit - len(debit)) + debit
+        if credit:
+            ligne = ligne.ljust(col_credit - len(credit)) + credit
+        return (' '*marge + ligne).rstrip()
+
+    def ligne_solde(marge, jour, centimes):
+        sens = "CREDITEUR" if centimes >= 0 else "DEBITEUR"
+        texte = "SOLDE {} AU {}".format(sens, jour.strftime('%d.%m.%Y'))
+        if centimes >= 0:
+            return rangee(marge, ' '*col_nature + texte, credit=montant(centimes, separateur))
+        return rangee(marge, ' '*col_nature + texte, debit=montant(-centimes, separateur))
+
+    pages = []
+    lignes = ["{}BNP PARIBAS".format(' '*70),
+              "",
+              "   M. DUPONT JEAN",
+              "   12 RUE DES EXEMPLES",
+              "   75000 PARIS",
+              "",
+              "{}RELEVE DE COMPTE CHEQUES".format(' '*20),
+              "{}du {} au {}".format(' '*20, debut.strftime('%d/%m/%Y'), fin.strftime('%d/%m/%Y')),
+              "",
+              "   Monnaie du compte : {}".format(monnaie),
+              ""]
+    total_debit = total_credit = 0
+    par_page = -(-len(operations) // n_pages) if operations else 0
+    for num_page in range(n_pages):
+        marge = MARGES[num_page % 2]
+        if num_page:
+            lignes = ["",
+                      "{}RELEVE DE COMPTE CHEQUES{}P. {}/{}".format(
+                          ' '*20, ' '*40, num_page + 1, n_pages),
+                      ""]
+        lignes.append(' '*marge + ENTETE + ' '*(num_page % 2))
+        lignes.append("")
+        if num_page == 0:
+            lignes.append(ligne_solde(marge, debut, solde))
+        for d_oper, valeur, desc, debit, centimes in operations[num_page*par_page:
+                                                                (num_page+1)*par_page]:
+            gauche = d_oper.strftime('%d.%m').ljust(col_nature) + desc[0]
+            if debit:
+                total_debit += centimes
+                lignes.append(rangee(marge, gauche, valeur.strftime('%d.%m'),
+                                     debit=montant(centimes, separateur)))
+            else:
+                total_credit += centimes
+                lignes.append(rangee(marge, gauche, valeur.strftime('%d.%m'),
+                                     credit=montant(centimes, separateur)))
+            for suite in desc[1:]:
+                lignes.append(rangee(marge, ' '*col_nature + suite))
+            if alea.random() < 0.2:
+                lignes.append("")
+        if num_page < n_pages - 1:
+            lignes.append("")
+            lignes.append(' '*(marge + largeur - 10) + "{:010d}".format(alea.randint(0, 10**10-1)))
+            lignes.append("")
+            lignes.append(' '*marge + PIED)
+            pages.append('\n'.join(lignes) + '\n')
+
+    solde_final = solde - total_debit + total_credit
+    lignes.append(rangee(marge, ' '*col_nature + "TOTAL DES MONTANTS", "",
+                         montant(total_debit, separateur), montant(total_credit, separateur)))
+    lignes.append("")
+    lignes.append(ligne_solde(marge, fin, solde_final))
+    lignes.append("")
+    lignes.append(' '*marge + PIED)
+    pages.append('\n'.join(lignes) + '\n')
+
+    for num_annexe in range(pages_annexes):
+        texte = ["", "{}INFORMATIONS ET CONDITIONS TARIFAIRES ({})".format(' '*20, num_annexe + 1), ""]
+        for _ in range(50):
+            texte.append("   " + ' '.join(alea.choice(MARCHANDS + ORGANISMES).lower()
+                                          for _ in range(6)))
+        texte.append(' '*8 + PIED)
+        pages.append('\n'.join(texte) + '\n')
+
+    return '\f'.join(pages)
+
+
+def nom_fichier(compte, annee, mois):
+    """Nom de fichier tel que fourni par la banque pour le relevé du mois"""
+    return "RCHQ_101_{}_{:04d}{:02d}26_2153".format(compte, annee, mois)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="génère un relevé BNP synthétique "
+                                     "au format 'pdftotext -layout'")
+    parser.add_argument("--operations", type=int, default=60, help="nombre d'opérations")
+    parser.add_argument("--pages", type=int, help="nombre de pages du tableau")
+    parser.add_argument("--annexes", type=int, default=0, help="pages de mentions légales finales")
+    parser.add_argument("--annee", type=int, default=2016)
+    parser.add_argument("--mois", type=int, default=3)
+    parser.add_argument("--graine", type=int, default=0, help="graine du générateur aléatoire")
+    parser.add_argument("--separateur", default='.', help="séparateur des milliers ('.' ou ' ')")
+    parser.add_argument("--sortie", help="fichier de sortie (défaut : sortie standard)")
+    myargs = parser.parse_args()
+
+    texte = genere_releve(myargs.operations, myargs.pages, myargs.annee, myargs.mois,
+                          myargs.graine, separateur=myargs.separateur,
+                          pages_annexes=myargs.annexes)
+    if myargs.sortie:
+        with open(myargs.sortie, 'w') as f:
+            f.write(texte)
+    else:
+        sys.stdout.write(texte)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+#
+# nom                verifie_analyse.py
+# description        Vérifie que l'analyse des relevés donne toujours les mêmes CSV que
+#                    l'analyseur d'origine, en série (--jobs 1) comme page par page en
+#                    parallèle (--jobs N), sur des relevés synthétiques (genere_releve.py).
+#                    Les empreintes de référence (reference_analyse.json) ont été
+#                    calculées par l'analyseur d'origine, voir --reference
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+
+import argparse, contextlib, difflib, hashlib, io, json, os, sys, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import convertBNP_5col as bnp
+from genere_releve import genere_releve
+
+REFERENCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_analyse.json")
+
+
+def corpus():
+    """Liste (nom, annee, mois, texte) des relevés synthétiques : courts, d'une à
+    quatre pages, et longs, analysés page par page avec --jobs (au moins
+    PAGES_PARALLELES pages), avec ou sans pages de mentions légales après le solde"""
+    releves = []
+    for graine in range(12):
+        annee, mois = 2016, 1 + graine % 12
+        releves.append(("court-{:02d}".format(graine), annee, mois,
+                        genere_releve(5 + graine * 13, 1 + graine % 4, annee, mois,
+                                      graine=graine, separateur='.' if graine % 3 else ' ')))
+    for graine in range(6):
+        annee, mois = 2017, 1 + 2 * graine
+        releves.append(("long-{:02d}".format(graine), annee, mois,
+                        genere_releve(400 + 150 * graine, bnp.PAGES_PARALLELES + 2 * graine,
+                                      annee, mois, graine=100 + graine,
+                                      separateur=' ' if graine % 2 else '.',
+                                      pages_annexes=graine % 3)))
+    return releves
+
+
+def csv_analyse(texte, annee, mois, jobs):
+    """CSV produit par l'analyse du texte d'un relevé"""
+    releve = bnp.UnReleve(contexte=bnp.Contexte(sorties=('csv',), interactif=False))
+    releve.ajoute_from_lignes(io.StringIO(texte, newline=None).readlines(),
+                              "{:04d}".format(annee), "{:02d}".format(mois), jobs=jobs)
+    return ''.join(releve.lignes_CSV())
+
+
+def csv_origine(module, texte, annee, mois):
+    """CSV produit par l'analyseur d'origine (fichier TXT, puis genere_CSV)"""
+    with tempfile.TemporaryDirectory() as repertoire:
+        with open(os.path.join(repertoire, "releve.txt"), 'w') as file:
+            file.write(texte)
+        releve = module.UnReleve()
+        with contextlib.redirect_stdout(io.StringIO()):
+            releve.ajoute_from_TXT("releve.txt", "{:04d}".format(annee), "{:02d}".format(mois),
+                                   repertoire)
+            releve.genere_CSV("releve", repertoire, "{:02d}".format(mois))
+        with open(os.path.join(repertoire, "releve.csv")) as file:
+            return file.read()
+
+
+def charge_origine(script):
+    """Charge le script de l'analyseur d'origine (par exemple extrait par
+    'git show <commit>:convertBNP_5col.py'). Il lit les montants avec le locale
+    français, qui n'est pas forcément installé : seuls ses séparateurs sont simulés"""
+    import importlib.util, locale
+    conventions = locale.localeconv
+
+    def localeconv():
+        return dict(conventions(), decimal_point=',', thousands_sep=' ')
+    locale.localeconv = localeconv
+    locale.setlocale = lambda *args: 'fr_FR'
+    spec = importlib.util.spec_from_file_location("convertBNP_origine", script)
+    module = importlib.util.module_from_spec(spec)
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(module)
+    return module
+
+
+def empreinte(texte):
+    return hashlib.sha256(texte.encode('utf-8')).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="non-régression de l'analyse des relevés")
+    parser.add_argument("--jobs", type=int, default=2,
+                        help="processus de l'analyse page par page (défaut: %(default)s)")
+    parser.add_argument("--reference", metavar="SCRIPT",
+                        help="recalcule les empreintes de référence avec ce script de "
+                        "l'analyseur d'origine, au lieu de vérifier")
+    myargs = parser.parse_args()
+
+    releves = corpus()
+    if myargs.reference:
+        module = charge_origine(myargs.reference)
+        reference = {nom: empreinte(csv_origine(module, texte, annee, mois))
+                     for nom, annee, mois, texte in releves}
+        with open(REFERENCE, 'w') as file:
+            json.dump(reference, file, indent=1, sort_keys=True)
+            file.write('\n')
+        print("{} empreintes de référence écrites dans {}".format(len(reference), REFERENCE))
+        return 0
+
+    with open(REFERENCE) as file:
+        reference = json.load(file)
+    erreurs = 0
+    for nom, annee, mois, texte in releves:
+        serie = csv_analyse(texte, annee, mois, 1)
+        parallele = csv_analyse(texte, annee, mois, myargs.jobs)
+        resultats = []
+        if empreinte(serie) != reference.get(nom):
+            resultats.append("--jobs 1 différent de l'origine")
+        if parallele != serie:
+            resultats.append("--jobs {} différent de --jobs 1".format(myargs.jobs))
+            sys.stdout.writelines(list(difflib.unified_diff(
+                serie.splitlines(True), parallele.splitlines(True), "jobs-1",
+                "jobs-{}".format(myargs.jobs), n=1))[:20])
+        erreurs = erreurs + bool(resultats)
+        print("{:8} : {:4} lignes  {}".format(nom, serie.count('\n') - 1,
+                                              ', '.join(resultats) or "ok"))
+    bnp.ferme_executeur()
+    if erreurs:
+        print("{} relevés sur {} différents".format(erreurs, len(releves)))
+        return 1
+    print("{} relevés identiques à l'origine".format(len(releves)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
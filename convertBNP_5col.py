@@ -34,49 +34,121 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, see <http://www.gnu.org/licenses/>.
 
-import pdb
-
-import argparse, os, re, subprocess, shutil, sys
-import xlsxwriter
-import locale
-import importlib
+import collections, functools, heapq, io, itertools, os, re, sys, time
 from datetime import datetime as dt
-from calendar import month_name
 
-PDFTOTEXT_SPEC = importlib.util.find_spec("pdftotext")
-if PDFTOTEXT_SPEC is not None:
-    import pdftotext
+# pour un démarrage rapide, les autres modules (xlsxwriter, pdftotext, pdb,
+# sqlite3, subprocess ...) sont importés à la demande, là où ils servent : une
+# conversion en CSV seul ne charge jamais xlsxwriter, et --help ne charge presque rien
 
 # Le motif des fichiers à traiter, à remplacer ou a transmettre via le fichier
 # "prefixe_compte.txt" ou via l'argument --prefixe
 PREFIXE_COMPTE = "123456789"
 
 CSV_SEP        = ";"
-deja_en_csv    = ""
-deja_en_xlsx   = ""
 
 # make verbosity a global variable
 VERBOSITY = 0
+# faux en mode --watch : une erreur ne doit ni attendre l'utilisateur ni tout arrêter
+INTERACTIF = True
 PREFIXE_SCRIPT = ""
 NCOLS = 5
 
+# à incrémenter dès qu'une modification de l'analyse peut changer les relevés
+# obtenus (découpage, fin du relevé au solde final, lecture des dates ...) :
+# invalide le cache des relevés et les profils de mise en page
+# 4 : relevé arrêté au solde final qui suit les totaux (analyse page par page,
+#     conversion par lots de pages), dates 'JJ.MM' lues par jour_mois_pat
+VERSION_ANALYSE = 4
+CACHE_REP = ".convertBNP"
+CACHE_TAILLE_MAX = 64  # Mo
+MANIFESTE = ".convertBNP-manifeste.json"
+# profils de mise en page des en-têtes de page (voir RegistreProfils), enregistrés
+# dans le répertoire du cache, et nombre maximal de profils retenus
+PROFILS = None
+PROFILS_FICHIER = "profils-colonnes.json"
+PROFILS_MAX = 256
+# opérations gardées au plus pour remettre dans l'ordre des dates un relevé lu au fil
+# de l'eau (FluxReleve) : l'écart entre date d'opération et date de valeur est de
+# quelques jours
+TRI_FENETRE = 256
+# fichiers produits pour chaque relevé, voir --format ; 'ndjson' n'est pas un fichier
+# par relevé mais un flux unique pour toute l'exécution (FLUX, voir --output)
+SORTIES = ('csv', 'xlsx')
+FORMATS_FICHIERS = ('csv', 'xlsx')
+FLUX = None
+# archive en colonnes des opérations (--archive, voir ArchiveColonnes) : nom et code de
+# type (module array) de chaque colonne de taille fixe, index, version du format
+ARCHIVE_COLONNES = (('date', 'i'), ('date_valeur', 'i'), ('date_oper', 'i'),
+                    ('debit', 'q'), ('credit', 'q'), ('compte', 'i'), ('desc_fin', 'q'))
+ARCHIVE_DESCRIPTIFS = "desc.utf8"
+ARCHIVE_INDEX = "index.json"
+ARCHIVE_VERSION = 1
+# mesures de l'exécution (voir --report), None si elles ne sont pas demandées
+RAPPORT = None
+# nombre de pages à partir duquel un relevé est analysé page par page en parallèle
+PAGES_PARALLELES = 16
+# processus de conversion PDF -> texte (--jobs), partagés par tous les comptes
+EXECUTEUR = None
+# sans le module pdftotext : programmes pdftotext lancés par une boucle asyncio (--jobs),
+# et durée maximale de chacun (--timeout)
+EXTRACTEUR = None
+PDFTOTEXT_DELAI = 120  # s
+# pages converties à la fois par le programme pdftotext (-f/-l) : les pages qui suivent
+# le solde final (mentions légales, tarifs, publicités) ne sont pas converties
+PAGES_PAR_LOT = 4
+# mode --watch : période de scrutation du répertoire, délai de stabilité d'un PDF
+SURVEILLANCE_INTERVALLE = 0.25  # s
+SURVEILLANCE_DELAI = 0.3        # s
+# mode service (--serve) : conversions en attente au plus, taille maximale d'un envoi,
+# nombre de requêtes gardées pour les statistiques de latence
+SERVICE_HOTE = '127.0.0.1'
+SERVICE_ATTENTE_MAX = 64
+SERVICE_TAILLE_MAX = 32  # Mo
+SERVICE_LATENCES = 1000
+# inotify(7) : fichier fermé après écriture, fichier déplacé dans le répertoire
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+
 # quelques motifs qui seront cherchés ... souvent
 pattern = re.compile('(\W+)')
 monnaie_pat = re.compile('Monnaie du compte\s*: (\w*)')
 nature_pat = re.compile('D\s*ate\s+N\s*ature\s+des\s+')
 footer_pat = re.compile('BNP PARIBAS.*au capital')
-
-orig_loc = locale.getlocale()
-locale.setlocale(locale.LC_ALL, '')
-# the decimal point in use
-dp = locale.localeconv()['decimal_point']
-if dp != ',':
-    # we have a problem -- force locale to fr_FR
-    print("Le point décimal déterminé par l'environnement est incorrect\n")
-    print("La valeur des locale va être modifiée en 'fr_FR'\n")
-    locale.setlocale(locale.LC_ALL, 'fr_FR')
-    dp = locale.localeconv()['decimal_point']
-ts = locale.localeconv()['thousands_sep']
+total_pat = re.compile(r'total des (?:montants|operations)\s', re.IGNORECASE)
+solde_pat = re.compile(r'SOLDE\s+')
+# date d'opération ou de valeur 'JJ.MM' dans sa colonne
+jour_mois_pat = re.compile(r'(\w\w)\.(\w\w)')
+# fichier d'une entrée du cache des relevés : empreinte, version de l'analyse
+entree_cache_pat = re.compile(r'^[0-9a-f]{64}-v\d+\.(?:json|pickle)$')
+
+# formats de dates reconnus par decode_date() : motif, année sur deux chiffres
+# (mêmes expressions régulières que dt.strptime pour %d, %m, %y et %Y)
+_JOUR = r'(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])'
+_MOIS = '(1[0-2]|0[1-9]|[1-9])'
+FORMATS_DATE = {
+    '%d/%m/%y': (re.compile(_JOUR + '/' + _MOIS + r'/(\d\d)'), True),
+    '%d%m%y': (re.compile(_JOUR + _MOIS + r'(\d\d)'), True),
+    '%d/%m/%Y': (re.compile(_JOUR + '/' + _MOIS + r'/(\d\d\d\d)'), False),
+    '%d.%m.%Y': (re.compile(_JOUR + r'\.' + _MOIS + r'\.(\d\d\d\d)'), False),
+}
+MEMO_DATES = 1024
+
+# classes de lignes renvoyées par classe_ligne(), combinables entre elles
+LIGNE_TABLE   = 0    # ligne ordinaire : opération, suite de description, blabla
+LIGNE_VIDE    = 1    # ligne vide, trait du tableau
+LIGNE_MONNAIE = 2    # "Monnaie du compte : ..."
+LIGNE_ENTETE  = 4    # en-tête de page "Date Nature des opérations ..."
+LIGNE_PIED    = 8    # pied de page "BNP PARIBAS ... au capital"
+LIGNE_TOTAL   = 16   # "TOTAL DES MONTANTS" ou "TOTAL DES OPERATIONS"
+LIGNE_SOLDE   = 32   # "SOLDE ..."
+
+# the decimal point in use: les relevés BNP sont toujours au format 1.234,56
+dp = ','
+# séparateurs de milliers rencontrés dans les montants : point, espaces
+SANS_SEPARATEURS = str.maketrans('', '', '. \u00a0\u202f')
+# séparateur des milliers des anciens relevés, pour mysafe_atof()
+ts = ' '
 
 if os.name == 'nt':
     PDFTOTEXT = 'pdftotext.exe'
@@ -86,75 +158,192 @@ else:
     PREFIXE_CSV = "Relevé_BNP_"
 
 
+class ErreurConversion(Exception):
+    """Erreur de conversion d'un relevé, levée au lieu d'attendre l'utilisateur"""
+
+
+class PdftotextAbsent(ErreurConversion):
+    """Ni le module Python pdftotext ni le programme pdftotext ne sont disponibles"""
+
+
+class ReleveIllisible(ErreurConversion, ValueError):
+    """Le texte du relevé n'a pas la mise en forme attendue"""
+
+
+class SommesIncorrectes(ReleveIllisible):
+    """Les opérations lues ne correspondent pas aux totaux ou au solde final"""
+
+
+class DelaiDepasse(ErreurConversion):
+    """Le programme pdftotext n'a pas terminé dans le délai imparti"""
+
+
+class Contexte:
+    """Réglages d'une conversion, transmis du relevé à son analyse et à ses exports :
+    préfixe du compte, verbosité, nombre de colonnes, fichiers produits ... Les réglages
+    non précisés prennent la valeur des variables du module, celles de la ligne de
+    commande. La conversion ne modifie pas son contexte : des conversions aux réglages
+    différents peuvent se dérouler en même temps, dans des threads.
+
+        contexte = Contexte(prefixe_compte="3000400123", sorties=('csv',), interactif=False)
+        releve = UnReleve(contexte=contexte)
+    """
+    __slots__ = ('prefixe_compte', 'prefixe_csv', 'verbosity', 'interactif', 'ncols',
+                 'sorties', 'csv_sep', 'dp', 'ts', 'rapport', 'flux')
+
+    def __init__(self, **reglages):
+        inconnus = set(reglages) - set(self.__slots__)
+        if inconnus:
+            raise TypeError("réglages inconnus : {}".format(', '.join(sorted(inconnus))))
+        defauts = {'prefixe_compte': PREFIXE_COMPTE, 'prefixe_csv': PREFIXE_CSV,
+                   'verbosity': VERBOSITY, 'interactif': INTERACTIF, 'ncols': NCOLS,
+                   'sorties': SORTIES, 'csv_sep': CSV_SEP, 'dp': dp, 'ts': ts,
+                   'rapport': RAPPORT, 'flux': FLUX}
+        for nom in self.__slots__:
+            setattr(self, nom, reglages.get(nom, defauts[nom]))
+
+    def __repr__(self):
+        return 'Contexte : compte {} -- {} colonnes -- sorties {}'.format(
+            self.prefixe_compte, self.ncols, ','.join(self.sorties))
+
+    def remplace(self, **reglages):
+        """Renvoie une copie du contexte, avec les réglages donnés changés"""
+        return Contexte(**dict({nom: getattr(self, nom) for nom in self.__slots__}, **reglages))
+
+
 class uneOperation:
     """Une opération bancaire = une date, un descriptif,
-    une valeur de débit, une valeur de crédit et un interrupteur de validité"""
+    une valeur de débit, une valeur de crédit et un interrupteur de validité
+
+    L'opération est compacte pour tenir des années d'historique en mémoire :
+    pas de __dict__, descriptif interné, montants en centimes et dates stockées
+    en ordinal (voir code_date()). Les dates en chaîne ou en datetime et les
+    montants en euros sont recalculés à la demande, pour les exports."""
+
+    __slots__ = ('_date', '_valeur', '_oper', 'desc', 'value',
+                 'centimes_debit', 'centimes_credit', 'valide')
 
     def __init__(self, date="", desc="", value="", debit=0.0, credit=0.0):
         self.date   = date
-        self.dt_date = None
-        self.date_valeur = ""
-        self.dt_valeur = None
-        self.date_oper = ""
-        self.dt_oper = None
-        self.desc   = desc
+        self._valeur = ""
+        self._oper  = ""
+        self.desc   = sys.intern(desc)
         self.value  = value
         self.debit  = debit
         self.credit = credit
         self.valide = True
-        if not len(self.date) >= 10 or int(self.date[:2]) > 31 or int(self.date[3:4]) > 12:
+        if not len(date) >= 10 or int(date[:2]) > 31 or int(date[3:4]) > 12:
             self.valide = False
 
     def __repr__(self):
         return 'Date:{} -- desc:{} -- debit {} -- credit {}'.format(self.date, self.desc,
                                                                     self.debit, self.credit)
 
+    @property
+    def date(self):
+        return texte_date(self._date)
+
+    @date.setter
+    def date(self, texte):
+        self._date = code_date(texte)
+
+    @property
+    def date_valeur(self):
+        return texte_date(self._valeur)
+
+    @date_valeur.setter
+    def date_valeur(self, texte):
+        self._valeur = code_date(texte)
+
+    @property
+    def date_oper(self):
+        return texte_date(self._oper)
+
+    @date_oper.setter
+    def date_oper(self, texte):
+        self._oper = code_date(texte)
+
+    @property
+    def dt_date(self):
+        return jour_date(self._date)
+
+    @property
+    def dt_valeur(self):
+        """Date valeur, seulement si la date est valide"""
+        if self.dt_date is None:
+            return None
+        return jour_date(self._valeur)
+
+    @property
+    def dt_oper(self):
+        """Date d'opération, seulement si la date valeur est valide"""
+        if self.dt_valeur is None:
+            return None
+        return jour_date(self._oper)
+
+    @property
+    def debit(self):
+        return self.centimes_debit / 100
+
+    @debit.setter
+    def debit(self, valeur):
+        self.centimes_debit = round(valeur * 100)
+
+    @property
+    def credit(self):
+        return self.centimes_credit / 100
+
+    @credit.setter
+    def credit(self, valeur):
+        self.centimes_credit = round(valeur * 100)
+
+    def champs(self):
+        """Renvoie l'opération sous forme de tuple de types de base (pour le cache)"""
+        return (self._date, self._valeur, self._oper, self.centimes_debit,
+                self.centimes_credit, self.desc)
+
+    @classmethod
+    def depuis_champs(cls, champs):
+        """Reconstruit une opération à partir du résultat de champs()"""
+        Ope = cls.__new__(cls)
+        (Ope._date, Ope._valeur, Ope._oper, Ope.centimes_debit, Ope.centimes_credit,
+         desc) = champs
+        Ope.desc = sys.intern(desc)
+        Ope.value = ""
+        date = Ope.date
+        Ope.valide = len(date) >= 10 and int(date[:2]) <= 31 and int(date[3:4]) <= 12
+        return Ope
+
     def estRemplie(self, operation=[]):
         ## return len(self.date) >=10 and len(desc) > 0 and len(value) > 0 \
         ##    and (len(credit) > 0 or len(debit) > 0)
-        resu = len(self.date) >= 10 and (self.credit > 0.0 or self.debit > 0.0)
+        resu = len(self.date) >= 10 and (self.centimes_credit > 0 or self.centimes_debit > 0)
         if resu:
             # this one is OK, fill its description
             if len(operation):
                 if 0 == len(self.desc):
-                    self.desc = ' '.join(operation)
-                    for num, date in enumerate(operation):
-                        try:
-                            date_oper = dt.strptime(date, '%d/%m/%y').strftime('%d/%m/%Y')
-                            self.date_oper = date_oper
-                            break
-                        except ValueError as e:
-                            if 1 == num or 4 == num:
-                                # du 020316
-                                # facture(s) carte BLABLA du
-                                try:
-                                    date_oper = dt.strptime(date, '%d%m%y').strftime('%d/%m/%Y')
-                                    self.date_oper = date_oper
-                                    break
-                                except ValueError as e:
-                                    continue
-                            continue
+                    self.desc = sys.intern(' '.join(operation))
+                    jour = date_operation(operation)
+                    if jour is not None:
+                        self._oper = jour.toordinal()
         return resu
 
+    def _cle(self):
+        """Clé de tri : ordinal de la date d'opération, à défaut de la date valeur"""
+        if type(self._date) is int and type(self._valeur) is int:
+            # cas courant, sans passer par les datetime
+            if type(self._oper) is int:
+                return self._oper
+            if self._oper == "":
+                return self._valeur
+        jour = self.dt_oper or self.dt_valeur
+        return jour and jour.toordinal()
+
     def __eq__(self, other):
-        if self.dt_oper is None:
-            if other.dt_oper is None:
-                return self.dt_valeur == other.dt_valeur
-            else:
-                return self.dt_valeur == other.dt_oper
-        if other.dt_oper is None:
-            return self.dt_oper == other.dt_valeur
-        return self.dt_oper == other.dt_oper
+        return self._cle() == other._cle()
 
     def __lt__(self, other):
-        if self.dt_oper is None:
-            if other.dt_oper is None:
-                return self.dt_valeur < other.dt_valeur
-            else:
-                return self.dt_valeur < other.dt_oper
-        if other.dt_oper is None:
-            return self.dt_oper < other.dt_valeur
-        return self.dt_oper < other.dt_oper
+        return self._cle() < other._cle()
 
         # This is another sorting where "date_valeur" has priority
         # if self.dt_oper is None or other.dt_oper is None:
@@ -172,8 +361,9 @@ class uneOperation:
 class UnReleve:
     """Un relevé de compte est une liste d'opérations bancaires
     sur une durée définie"""
-    def __init__(self, nom="inconnu"):
+    def __init__(self, nom="inconnu", contexte=None):
         self.nom = nom
+        self.contexte = contexte if contexte is not None else Contexte()
         self.head = []
         self.liste = []
         self.tail = []
@@ -185,26 +375,29 @@ class UnReleve:
     def ajoute(self, Ope, where=''):
         """Ajoute une opération à la fin de la liste du relevé bancaire"""
         if 'head' in where:
-            try:
-                Ope.dt_date = dt.strptime(Ope.date, "%d/%m/%Y")
-            except ValueError as e:
-                pass
             return self.head.append(Ope)
         if 'tail' in where:
-            try:
-                Ope.dt_date = dt.strptime(Ope.date, "%d/%m/%Y")
-            except ValueError as e:
-                pass
             return self.tail.append(Ope)
-        try:
-            Ope.dt_date = dt.strptime(Ope.date, "%d/%m/%Y")
-            Ope.dt_valeur = dt.strptime(Ope.date_valeur, "%d/%m/%Y")
-            Ope.dt_oper = dt.strptime(Ope.date_oper, "%d/%m/%Y")
-        except ValueError as e:
-            pass
         return self.liste.append(Ope)
 
-    def ajoute_from_TXT(self, fichier_txt, annee, mois, basedir=None):
+    def vers_donnees(self):
+        """Renvoie le contenu du relevé sous forme de types de base (pour le cache)"""
+        def ops(liste):
+            return [Ope.champs() for Ope in liste]
+        return {'nom': self.nom, 'monnaie': self.monnaie, 'head': ops(self.head),
+                'liste': ops(self.liste), 'tail': ops(self.tail)}
+
+    @classmethod
+    def depuis_donnees(cls, donnees, contexte=None):
+        """Reconstruit un relevé à partir du résultat de vers_donnees()"""
+        releve = cls(donnees['nom'], contexte)
+        releve.monnaie = donnees['monnaie']
+        for where in ('head', 'liste', 'tail'):
+            for champs in donnees[where]:
+                releve.ajoute(uneOperation.depuis_champs(champs), where)
+        return releve
+
+    def ajoute_from_TXT(self, fichier_txt, annee, mois, basedir=None, jobs=1):
         """Parse un fichier TXT pour en extraire les
         opérations bancaires et les mettre dans le relevé"""
         print('[txt->    ] Lecture    : '+fichier_txt)
@@ -213,516 +406,2441 @@ class UnReleve:
             fichier_txt = os.path.join(basedir, fichier_txt)
 
         with open(fichier_txt, 'r') as file:
-            Table = False
-            vide = 0
-            page_width = 0
-            num = 0
+            return self.ajoute_from_lignes(file, annee, mois, fichier_txt, jobs)
+
+    def ajoute_from_lignes(self, lignes, annee, mois, nom="", jobs=1):
+        """Parse un itérable de lignes (fichier TXT, texte produit par pdftotext,
+        sortie standard de 'pdftotext -layout fichier -', ...) pour en extraire
+        les opérations bancaires et les mettre dans le relevé. Renvoie le nombre de
+        lignes lues. Avec jobs > 1, un relevé d'au moins PAGES_PARALLELES pages est
+        analysé par morceaux dans les processus de executeur_PDF(), avec le même
+        résultat qu'en série"""
+        if self.contexte.interactif and self.contexte.verbosity > 1:
+            import pdb; pdb.set_trace()
+
+        analyse = AnalyseReleve(self, annee, mois, nom)
+        lignes = iter(lignes)
+        if jobs > 1 and not self.contexte.verbosity:
+            pages = decoupe_pages(lignes)
+            if len(pages) >= PAGES_PARALLELES:
+                analyse.pousse_pages(pages, executeur_PDF(jobs), 4 * jobs)
+                pages = []
+            lignes = itertools.chain(itertools.chain.from_iterable(pages), lignes)
+        # les lignes qui suivent le solde final ne sont pas lues
+        if analyse.phase != analyse.FINI:
+            for ligne in lignes:
+                if analyse.pousse(ligne):
+                    break
+        analyse.termine()
+        return analyse.num
+
+    def entete_CSV(self):
+        """Première ligne du CSV du relevé, fin de ligne comprise"""
+        return self.contexte.csv_sep.join(["Date", "Date_Valeur", "Date_Oper",
+                                           "Débit ({})".format(self.monnaie),
+                                           "Crédit ({})".format(self.monnaie),
+                                           "Opération"]) + "\n"
+
+    def ligne_CSV(self, Ope, where=''):
+        """Ligne du CSV d'une opération du relevé (where : voir ajoute()), fin de
+        ligne comprise"""
+        sep = self.contexte.csv_sep
+        if 'head' in where:
+            return sep.join([Ope.date, "", "", str(Ope.debit), str(Ope.credit), Ope.desc]) + "\n"
+        if 'tail' in where:
+            return sep.join([Ope.date, "", "", '{:.2f}'.format(Ope.debit),
+                             '{:.2f}'.format(Ope.credit), Ope.desc]) + "\n"
+        return sep.join([Ope.date, Ope.date_valeur, Ope.date_oper, str(Ope.debit),
+                         str(Ope.credit), Ope.desc]) + "\n"
+
+    def lignes_CSV(self):
+        """Itérateur sur les lignes du CSV du relevé, fin de ligne comprise"""
+        yield self.entete_CSV()
+        for where, liste in (('head', self.head), ('', self.liste), ('tail', self.tail)):
+            for Ope in liste:
+                yield self.ligne_CSV(Ope, where)
+
+    def lignes_NDJSON(self, compte=None, identifiant=None):
+        """Itérateur sur les lignes NDJSON du relevé : un objet JSON par ligne du CSV
+        hors en-tête, voir enregistrement_JSON()"""
+        import json
+        for where, liste in (('head', self.head), ('', self.liste), ('tail', self.tail)):
+            for Ope in liste:
+                yield json.dumps(enregistrement_JSON(Ope, where, compte, identifiant),
+                                 ensure_ascii=False) + "\n"
+
+    def genere_NDJSON(self, annee, mois, compte=None):
+        """Ajoute les lignes NDJSON du relevé au flux de l'exécution (contexte.flux) ;
+        compte est celui du nom du fichier (voir compte_fichier()), le préfixe du
+        compte à défaut"""
+        contexte = self.contexte
+        if 'ndjson' not in contexte.sorties or contexte.flux is None:
+            return
+        compte = compte or contexte.prefixe_compte
+        identifiant = identifiant_releve(compte, annee, mois)
+        print('[   ->json] Flux       : '+identifiant)
+        with chrono('ndjson', identifiant, contexte):
+            contexte.flux.writelines(self.lignes_NDJSON(compte, identifiant))
+            # les lecteurs du flux reçoivent chaque relevé dès qu'il est écrit
+            contexte.flux.flush()
 
-            if VERBOSITY > 1:
-                import pdb; pdb.set_trace()
+    def genere_CSV(self, filename="", basedir=None, mois=None):
+        """crée les fichiers CSV et XLSX (contexte.sorties) qui contiendront les
+        opérations du relevé ; les relevés déjà convertis sont écartés avant, par
+        a_convertir()"""
+        contexte = self.contexte
+        if filename == "":
+            filename = self.nom
+        filename_csv = filename + ".csv"
+        if 'csv' in contexte.sorties:
+            print('[   ->csv ] Export     : '+filename_csv)
+            mesure = chrono('csv', filename_csv, contexte)
+            if basedir:
+                filename_csv = os.path.join(basedir, filename_csv)
+            with mesure, open(filename_csv, "w") as file:
+                file.writelines(self.lignes_CSV())
+            mesure.ecrit(filename_csv)
+        filename_xlsx = filename + ".xlsx"
+        if 'xlsx' in contexte.sorties:
+            print('[   ->xlsx] Export     : '+filename_xlsx)
+            # pdb.set_trace()
+            mesure = chrono('xlsx', filename_xlsx, contexte)
+            if basedir:
+                filename_xlsx = os.path.join(basedir, filename_xlsx)
+            with mesure:
+                import xlsxwriter
+                workbook = xlsxwriter.Workbook(filename_xlsx)
+                if mois:
+                    worksheet = workbook.add_worksheet(nom_mois(mois))
+                else:
+                    worksheet = workbook.add_worksheet()
+                self.ecrit_feuille(worksheet, formats_XLSX(workbook))
+                workbook.close()
+            mesure.ecrit(filename_xlsx)
+
+    def ecrit_feuille(self, worksheet, formats):
+        """Écrit les opérations du relevé dans une feuille XLSX, ligne après ligne
+        (compatible avec le mode constant_memory de xlsxwriter)"""
+        currency_form, date_form, string_form, cell_format = formats
+        worksheet.set_column(0, 2, 12)
+        if 5 == self.contexte.ncols:
+            desc_col = 5
+        else:
+            desc_col = 9
+        worksheet.set_column(3, desc_col-1, 10, currency_form)
+        worksheet.set_column(desc_col, desc_col, 64)
 
-            # ignore les lignes avec les coordonnées et le blabla
-            for ligne in file:
-                num = num + 1
-                monnaie = monnaie_pat.search(ligne)
-                if monnaie:
-                    self.monnaie = monnaie.group(1)
-                    break
+        if 5 == self.contexte.ncols:
+            worksheet.write_row('A1', ["Date", "Date_Valeur", "Date_Oper", "Débit",
+                                       "Crédit", "Opération"], cell_format)
+        else:
+            worksheet.write_row('A1', ["Date", "Date_Valeur", "Date_Oper", "Débit",
+                                       "Crédit", "Net", "Rubrique", "Dépenses", "Remb.",
+                                       "Opération"], cell_format)
+        row = 1
+        for Ope in self.head:
+            worksheet.write_datetime(row, 0, Ope.dt_date, date_form)
+            worksheet.write_number(row, 3, Ope.debit, currency_form)
+            worksheet.write_number(row, 4, Ope.credit, currency_form)
+            if self.contexte.ncols > 5:
+                worksheet.write_formula(row, 5, "=E{}-D{}".format(row+1, row+1),
+                                        currency_form, Ope.credit-Ope.debit)
+            worksheet.write_string(row, desc_col, Ope.desc, string_form)
+            row = row + 1
 
-            # detect bad pdf->txt conversions and abort
-            if len(self.monnaie) < 1:
-                print("Le fichier {} semble mal formatté !".format(fichier_txt))
-                input("Bye bye :(")
-                exit()
+        for Ope in self.liste:
+            worksheet.write_datetime(row, 0, Ope.dt_date, date_form)
+            if Ope.dt_valeur:
+                worksheet.write_datetime(row, 1, Ope.dt_valeur, date_form)
+            if Ope.dt_oper:
+                worksheet.write_datetime(row, 2, Ope.dt_oper, date_form)
+            worksheet.write_number(row, 3, Ope.debit, currency_form)
+            worksheet.write_number(row, 4, Ope.credit, currency_form)
+            if self.contexte.ncols > 5:
+                worksheet.write_formula(row, 5, "=E{}-D{}".format(row+1, row+1),
+                                        currency_form, Ope.credit-Ope.debit)
+            worksheet.write_string(row, desc_col, Ope.desc, string_form)
+            row = row + 1
 
-            # à présent, en-tête et SOLDE  / Date / valeur
-            for ligne in file:
-                num = num + 1
-                # this is a cut-and-paste of lines 239 -- 245
-                if nature_pat.search(ligne):
-                    Table = True        # where back analysing data
-                    Date_pos = re.search('D\s*ate', ligne).start()
-                    Nature_pos = re.search('N\s*ature', ligne).start()
-                    dernier = re.search('V\s*aleur', ligne)
-                    Valeur_pos = dernier.start()
-                    Debit_pos = dernier.end() + 1
-                    Credit_pos = re.search('D\s*ébit  ', ligne).end() + 1
-                    page_width = len(ligne)
-                    continue
-                if re.search('SOLDE\s+', ligne):
-                    break
+        # generate a control formula
+        Ope = self.tail[0]
+        worksheet.write(row, 0, Ope.dt_date, date_form)
+        # EXELL formula are stored in english but displayed in locale
+        worksheet.write_formula(row, 3, '=SUM(D3:D'+str(row)+')', currency_form, Ope.debit)
+        worksheet.write_formula(row, 4, '=SUM(E3:E'+str(row)+')', currency_form, Ope.credit)
+        if self.contexte.ncols > 5:
+            worksheet.write_formula(row, 5, "=E{}-D{}".format(row+1, row+1),
+                                    currency_form, Ope.credit-Ope.debit)
+        worksheet.write(row, desc_col, Ope.desc, string_form)
+        row = row + 1
+        for Ope in self.tail[1:]:
+            worksheet.write_datetime(row, 0, Ope.dt_date, date_form)
+            worksheet.write_number(row, 3, Ope.debit, currency_form)
+            worksheet.write_number(row, 4, Ope.credit, currency_form)
+            if self.contexte.ncols > 5:
+                worksheet.write_formula(row, 5, "=E{}-D{}".format(row+1, row+1),
+                                        currency_form, Ope.credit-Ope.debit)
+            worksheet.write_string(row, desc_col, Ope.desc, string_form)
+            row = row + 1
 
-            operation = ligne.split()
-            for Ope, date in enumerate(operation):
-                try:
-                    basedate = dt.strptime(date, '%d.%m.%Y').strftime('%d/%m/%Y')
-                    break
-                except ValueError as e:
-                    continue
 
-            # montant ?
-            la_valeur = mysafe_atof(''.join(operation[Ope+1:]))
-            ligne = ' '.join(operation[:Ope+1])
-
-            # dans quel sens ?
-            if re.match('crediteur', operation[1], re.IGNORECASE):
-                Ope = uneOperation(basedate, ligne, "", 0.0, la_valeur)
-                solde_init = la_valeur
-            elif re.match('debiteur', operation[1], re.IGNORECASE):
-                Ope = uneOperation(basedate, ligne, "", la_valeur, 0.0)
-                solde_init = -la_valeur
-            else:
-                raise ValueError(ligne+"ne peut pas être interprétée")
+# attributs de AnalyseReleve calculés à chaque en-tête de page
+POSITIONS_COLONNES = ('Date_pos', 'Nature_pos', 'Valeur_pos', 'Debit_pos', 'Credit_pos',
+                      'page_width')
+# champs() d'une opération neuve, uneOperation()
+OPERATION_VIDE = ("", "", "", 0, 0, "")
 
-            # crée une entrée avec le solde initial
-            self.ajoute(Ope, 'head')
-            if VERBOSITY:
-                print('{}({}): {}'.format(num, len(ligne), ligne))
-                print('Solde initial: {}  au {}'.format(solde_init, basedate))
-                print(Ope)
 
-            if VERBOSITY > 1:
-                import pdb; pdb.set_trace()
+class AnalyseReleve:
+    """Automate d'analyse d'un relevé : les lignes lui sont transmises une à une
+    par pousse(), avec la classe calculée par classe_ligne(), et les opérations
+    reconnues sont ajoutées au relevé au fur et à mesure"""
+    PREAMBULE, ENTETE, TABLE, SOLDE, FINI = range(5)
 
-            Ope = uneOperation()
-            date = ""
-            operation = []
-            la_date = ""
+    def __init__(self, releve, annee, mois, nom=""):
+        self.releve = releve
+        self.contexte = releve.contexte
+        self.annee = annee
+        self.mois = mois
+        self.nom = nom
+        self.phase = self.PREAMBULE
+        self.num = 0
+        self.derniere = ""
+        # état du tableau : position des colonnes de la page courante
+        self.Table = False
+        self.vide = 0
+        self.page_width = 0
+        self.profils = registre_profils()
+        # opération en cours de lecture
+        self.Ope = uneOperation()
+        self.operation = []
+        self.basedate = None
+        # tous les montants de contrôle sont en centimes, donc exacts
+        self.solde_init = 0
+        self.somme_cred = 0  # To check sum of cred
+        self.somme_deb = 0   # To check sum of deb
+        self.le_debit = 0
+        self.le_credit = 0
 
-            somme_cred = 0.0  # To check sum of cred
-            somme_deb = 0.0   # To check sum of deb
+    def __repr__(self):
+        return 'Analyse : {} -- phase {} -- ligne {}'.format(self.nom, self.phase, self.num)
 
-            ## pdb.set_trace()
-            for ligne in file:
-                num = num+1
-                if len(ligne) < 2:           # ligne vide, trait du tableau
-                    vide = vide + 1
-                    if vide < 5:
-                        continue
+    def pousse(self, ligne):
+        """Traite une ligne ; renvoie True une fois le solde final lu"""
+        self.num = self.num + 1
+        self.derniere = ligne
+        classe = classe_ligne(ligne)
 
-                if Table:
-                    # detect footer
-                    if (vide > 4):
-                        eot = True
-                    else:
-                        eot = footer_pat.search(ligne)
-                        if eot is None:
-                            # This is one of the strange lines with a numeric code at the end
-                            eot = (0 == len(ligne[:Debit_pos].split()))
-                    if (eot):
-                        if VERBOSITY > 1:
-                            pdb.set_trace()
-                        Table = False
-                        if len(operation) > 0:
-                            if Ope.estRemplie(operation):  # on ajoute la précédente
-                                self.ajoute(Ope)           # opération si elle est valide
-                                if VERBOSITY:
-                                    print(Ope)
-                                Ope = uneOperation()
-                                date = ""
-                                la_date = ""
-                                operation = []
-                        continue
-                    if len(ligne) > 1:
-                        vide = 0
-
-                if Table is False:
-                    # search for new page header -- compute actual page width
-                    if nature_pat.search(ligne):
-                        Table = True        # where back analysing data
-                        vide = 0
-                        Date_pos = re.search('D\s*ate', ligne).start()
-                        Nature_pos = re.search('N\s*ature', ligne).start()
-                        dernier = re.search('V\s*aleur', ligne)
-                        Valeur_pos = dernier.start()
-                        Debit_pos = dernier.end() + 1
-                        Credit_pos = re.search('D\s*ébit  ', ligne).end() + 1
-                        page_width = len(ligne)
+        if self.phase == self.TABLE:
+            self._table(ligne, classe)
+        elif self.phase == self.PREAMBULE:
+            # ignore les lignes avec les coordonnées et le blabla
+            if classe & LIGNE_MONNAIE:
+                self.releve.monnaie = monnaie_pat.search(ligne).group(1)
+                # detect bad pdf->txt conversions and abort
+                if len(self.releve.monnaie) < 1:
+                    self._mal_formatte()
+                self.phase = self.ENTETE
+        elif self.phase == self.ENTETE:
+            # à présent, en-tête et SOLDE  / Date / valeur
+            if classe & LIGNE_ENTETE:
+                self._entete(ligne)
+            elif classe & LIGNE_SOLDE:
+                self._solde_initial(ligne)
+        elif self.phase == self.SOLDE:
+            # here, we have "solde .. au
+            if classe & LIGNE_SOLDE:
+                self._solde_final(ligne)
+        return self.phase == self.FINI
+
+    def reprise_possible(self):
+        """Vrai entre deux pages du tableau, hors de tout tableau et sans opération
+        commencée : l'analyse de la page suivante ne dépend alors pas des pages
+        précédentes (les positions des colonnes seront lues dans son en-tête)"""
+        return (self.phase == self.TABLE and not self.Table and not self.operation
+                and self.Ope.champs() == OPERATION_VIDE and not self.Ope.value)
+
+    def etat(self):
+        """Résultat de l'analyse de morceau de tableau, pour adopte() : opérations,
+        sommes, et état de l'automate à la fin du morceau"""
+        positions = tuple(getattr(self, nom, None) for nom in POSITIONS_COLONNES)
+        return {'operations': [Ope.champs() for Ope in self.releve.liste],
+                'somme_deb': self.somme_deb, 'somme_cred': self.somme_cred,
+                'num': self.num, 'derniere': self.derniere, 'Table': self.Table,
+                'vide': self.vide, 'positions': positions, 'operation': self.operation,
+                'Ope': (self.Ope.champs(), self.Ope.value, self.Ope.valide)}
+
+    def adopte(self, etat):
+        """Reprend le résultat de l'analyse d'un morceau commencé avec
+        reprise_possible() vrai, comme si ses lignes avaient été poussées ici"""
+        for champs in etat['operations']:
+            self.releve.ajoute(uneOperation.depuis_champs(champs))
+        self.somme_deb += etat['somme_deb']
+        self.somme_cred += etat['somme_cred']
+        self.num += etat['num']
+        self.derniere = etat['derniere']
+        self.Table = etat['Table']
+        self.vide = etat['vide']
+        for nom, position in zip(POSITIONS_COLONNES, etat['positions']):
+            if position is not None:
+                setattr(self, nom, position)
+        self.operation = etat['operation']
+        champs, value, valide = etat['Ope']
+        self.Ope = uneOperation.depuis_champs(champs)
+        self.Ope.value, self.Ope.valide = value, valide
+
+    def pousse_pages(self, pages, executeur, morceaux):
+        """Pousse les pages d'un long relevé : la première en série, les suivantes
+        réparties en morceaux analysés en parallèle, chacun comme s'il commençait
+        entre deux pages. Le résultat d'un morceau n'est adopté que si l'analyse en
+        série arrive au même état à son début ; sinon (opération à cheval sur deux
+        pages, fin du tableau, ...), ses lignes sont poussées ici"""
+        taille = -(-(len(pages) - 1) // morceaux)
+        decoupe = [list(itertools.chain.from_iterable(pages[debut:debut+taille]))
+                   for debut in range(1, len(pages), taille)]
+        contexte = self.contexte.remplace(rapport=None, flux=None, verbosity=0,
+                                          interactif=False)
+        futurs = [executeur.submit(analyse_morceau, lignes, self.annee, self.mois, contexte)
+                  for lignes in decoupe]
+        try:
+            for ligne in pages[0]:
+                if self.pousse(ligne):
+                    return
+            for lignes, futur in zip(decoupe, futurs):
+                etat = futur.result()
+                if etat is not None and self.reprise_possible():
+                    self.adopte(etat)
                     continue
+                for ligne in lignes:
+                    if self.pousse(ligne):
+                        return
+        finally:
+            for futur in futurs:
+                futur.cancel()
+
+    def termine(self):
+        """Fin des lignes : termine l'analyse avec la dernière ligne lue, comme
+        lorsque le fichier s'arrête avant le solde final"""
+        if self.phase == self.PREAMBULE:
+            self._mal_formatte()
+        if self.phase == self.ENTETE:
+            self._solde_initial(self.derniere)
+        if self.phase == self.TABLE:
+            self._fin_table(self.derniere)
+        if self.phase == self.SOLDE:
+            self._solde_final(self.derniere)
+
+    def _pas_a_pas(self):
+        """Mode pas-à-pas de la ligne de commande (--verbosity 2), jamais en mode
+        non interactif"""
+        if self.contexte.interactif and self.contexte.verbosity > 1:
+            import pdb; pdb.set_trace()
+
+    def _mal_formatte(self):
+        if not self.contexte.interactif:
+            raise ReleveIllisible("le fichier {} semble mal formatté".format(self.nom))
+        print("Le fichier {} semble mal formatté !".format(self.nom))
+        input("Bye bye :(")
+        exit()
 
-                # this line ends the table
-                if re.match('.*?total des montants\s', ligne, re.IGNORECASE):
-                    if VERBOSITY:
-                        print('{}({}): {}'.format(num, len(ligne), ligne))
-                    if VERBOSITY > 1:
-                        pdb.set_trace()
-                    break
-                if re.match('.*?total des operations\s', ligne, re.IGNORECASE):
-                    if VERBOSITY:
-                        print('{}({}): {}'.format(num, len(ligne), ligne))
-                    if VERBOSITY > 1:
-                        pdb.set_trace()
-                    break
+    def _entete(self, ligne):
+        """En-tête de page : position des colonnes, d'après le profil de l'en-tête"""
+        self.Table = True        # where back analysing data
+        (self.Date_pos, self.Nature_pos, self.Valeur_pos, self.Debit_pos, self.Credit_pos,
+         self.page_width) = self.profils.profil(ligne)
+
+    def _solde_initial(self, ligne):
+        operation = ligne.split()
+        for Ope, date in enumerate(operation):
+            jour = decode_date(date, '%d.%m.%Y')
+            if jour is not None:
+                self.basedate = jour.strftime('%d/%m/%Y')
+                break
+
+        # montant ?
+        la_valeur = en_centimes(''.join(operation[Ope+1:]))
+        ligne = ' '.join(operation[:Ope+1])
+
+        # dans quel sens ?
+        if len(operation) < 2:
+            raise ReleveIllisible(ligne+" ne peut pas être interprétée")
+        if re.match('crediteur', operation[1], re.IGNORECASE):
+            Ope = uneOperation(self.basedate, ligne, "", 0.0, la_valeur / 100)
+            self.solde_init = la_valeur
+        elif re.match('debiteur', operation[1], re.IGNORECASE):
+            Ope = uneOperation(self.basedate, ligne, "", la_valeur / 100, 0.0)
+            self.solde_init = -la_valeur
+        else:
+            raise ReleveIllisible(ligne+" ne peut pas être interprétée")
+
+        # crée une entrée avec le solde initial
+        self.releve.ajoute(Ope, 'head')
+        if self.contexte.verbosity:
+            print('{}({}): {}'.format(self.num, len(ligne), ligne))
+            print('Solde initial: {}  au {}'.format(self.solde_init / 100, self.basedate))
+            print(Ope)
+
+        self._pas_a_pas()
+        self.phase = self.TABLE
+
+    def _sauve(self):
+        """Ajoute l'opération en cours au relevé si elle est complète"""
+        if self.Ope.estRemplie(self.operation):
+            self.releve.ajoute(self.Ope)   # opération si elle est valide
+            if self.contexte.verbosity:
+                print(self.Ope)
+            self.Ope = uneOperation()
+            return True
+        return False
 
-                if VERBOSITY:
-                    print('{}({}): {}'.format(num, len(ligne), ligne))
-
-                date_ou_pas = ligne[:Nature_pos].split()  # premier caractères de la ligne (date?)
-                if 1 == len(date_ou_pas):
-                    date_ou_pas = pattern.split(date_ou_pas[0])
-
-                # si une ligne se termine par un montant, il faut l'extraire pour qu'il reste la
-                # date valeur
-                dernier = pattern.split(ligne[Debit_pos:].strip())
-                # this was
-                # dernier = ligne[-22:].split()    # derniers caractères (valeur?)
-                if 1 == len(dernier):
-                    dernier = pattern.split(dernier[0])
-                # put your debug code here
-                # if "MUTUELLE GENERALE" in ligne:
-                #     if verbosity:
-                #         pdb.set_trace()
-
-                if estArgent(dernier):
-                    # si l'operation précédente est complète, on la sauve
-                    if Ope.estRemplie(operation):
-                        self.ajoute(Ope)          # opération si elle est valide
-                        if VERBOSITY:
-                            print(Ope)
-                        Ope = uneOperation()
-                        operation = []                # we are on a new op
-                    la_valeur = list2valeur(dernier)
-                    try:
-                        # there are odd and even pages. That's odd !
-                        if dp in ligne[Debit_pos:Credit_pos]:
-                            Ope.debit = mysafe_atof(la_valeur)
-                            somme_deb += Ope.debit
-                        else:
-                            Ope.credit = mysafe_atof(la_valeur)
-                            somme_cred += Ope.credit
-                            
-                    except ValueError as e:
-                        print('Failed to convert {} to a float: {}'.format(la_valeur, e))
-                    previous_ligne = ligne
-                    ligne = ligne[:Debit_pos]     # truncate the money amount
-
-                if estDate(date_ou_pas):          # est-ce une date
-                    # il y a aussi une date valeur
-                    date_valeur = ligne[Valeur_pos:Debit_pos].split() 
-                    if 1 == len(date_valeur):
-                        date_valeur = pattern.split(date_valeur[0])
-                    if Ope.estRemplie(operation):          # on ajoute la précédente
-                        self.ajoute(Ope)          # opération si elle est valide
-                        if VERBOSITY:
-                            print(Ope)
-                        Ope = uneOperation()
-
-                    operation = []                # we are on a new op
-                    la_date = ''
-                    date = date_ou_pas
-
-                operation.extend(ligne[Nature_pos:Valeur_pos].split())
-
-                if date:  # si on a deja trouvé une date
-                    la_date = list2date(date, annee, mois)
-                    date = ""
-                    if (len(date_valeur) < 3):
-                        date_valeur = dernier
-
-                    if (len(date_valeur) < 3):
-                        print('line 223')
-                        print(ligne)
-                        print(ligne[85:91])
-                        print(ligne[109:114])
-                        print(date_valeur)
-                        pdb.set_trace()
-
-                    la_date_valeur = list2date(date_valeur, annee, mois)
-                    Ope.date = la_date
-                    Ope.date_valeur = la_date_valeur
-
-            # end of main table
-            if Ope.estRemplie(operation):         # on ajoute la précédente
-                if VERBOSITY:
-                    print(Ope)
-                self.ajoute(Ope)          # opération si elle est valide
-
-            if VERBOSITY:
-                print('Exited main loop')
-                print('{}({}): {}'.format(num, len(ligne), ligne))
-                if VERBOSITY > 1:
-                    pdb.set_trace()
-
-            # this part may fail if there is no "Débit" field
-            operation = ligne.split()
-            start = 3
-            count = 3
-            for num, elem in enumerate(operation[count:]):
-                # pre-increment count as [start:count] goes one element
-                # before count
+    def _table(self, ligne, classe):
+        if classe == LIGNE_VIDE:        # ligne vide, trait du tableau
+            self.vide = self.vide + 1
+            if self.vide < 5:
+                return
+
+        if self.Table:
+            # detect footer
+            if (self.vide > 4):
+                eot = True
+            else:
+                eot = classe & LIGNE_PIED
+                if not eot:
+                    # This is one of the strange lines with a numeric code at the end
+                    eot = not ligne[:self.Debit_pos].strip()
+            if (eot):
+                self._pas_a_pas()
+                self.Table = False
+                if len(self.operation) > 0:
+                    if self._sauve():   # on ajoute la précédente
+                        self.operation = []
+                return
+            if len(ligne) > 1:
+                self.vide = 0
+
+        if self.Table is False:
+            # search for new page header -- compute actual page width
+            if classe & LIGNE_ENTETE:
+                self._entete(ligne)
+                self.vide = 0
+            return
+
+        # this line ends the table
+        if classe & LIGNE_TOTAL:
+            if self.contexte.verbosity:
+                print('{}({}): {}'.format(self.num, len(ligne), ligne))
+            self._pas_a_pas()
+            self._fin_table(ligne)
+            return
+
+        if self.contexte.verbosity:
+            print('{}({}): {}'.format(self.num, len(ligne), ligne))
+
+        Nature_pos = self.Nature_pos
+        Debit_pos = self.Debit_pos
+        # premiers caractères de la ligne : date 'JJ.MM' ?
+        date = jour_mois_pat.fullmatch(ligne[:Nature_pos].strip())
+
+        # si une ligne se termine par un montant, il faut l'extraire pour qu'il reste la
+        # date valeur
+        fin_ligne = ligne[Debit_pos:].strip()
+        dernier = pattern.split(fin_ligne)
+        if 1 == len(dernier):
+            dernier = pattern.split(dernier[0])
+
+        if estArgent(dernier, self.contexte):
+            # si l'operation précédente est complète, on la sauve
+            if self._sauve():
+                self.operation = []           # we are on a new op
+            la_valeur = list2valeur(dernier)
+            try:
+                # there are odd and even pages. That's odd !
+                if self.contexte.dp in ligne[Debit_pos:self.Credit_pos]:
+                    cents = en_centimes(la_valeur)
+                    self.Ope.centimes_debit = cents
+                    self.somme_deb += cents
+                else:
+                    cents = en_centimes(la_valeur)
+                    self.Ope.centimes_credit = cents
+                    self.somme_cred += cents
+
+            except ValueError as e:
+                if not self.contexte.interactif:
+                    raise ReleveIllisible("ligne {} : montant {} illisible".format(
+                        self.num, la_valeur)) from e
+                print('Failed to convert {} to a float: {}'.format(la_valeur, e))
+            ligne = ligne[:Debit_pos]     # truncate the money amount
+            self.derniere = ligne
+
+        if date:                          # est-ce une date
+            # il y a aussi une date valeur
+            date_valeur = jour_mois_pat.match(ligne[self.Valeur_pos:Debit_pos].strip())
+            self._sauve()                 # on ajoute la précédente
+            self.operation = []           # we are on a new op
+
+        self.operation.extend(ligne[Nature_pos:self.Valeur_pos].split())
+
+        if date:  # si on a deja trouvé une date
+            if date_valeur is None:
+                # date valeur décalée dans la colonne des débits (marges des pages)
+                date_valeur = jour_mois_pat.match(fin_ligne)
+            if date_valeur is None:
+                if not self.contexte.interactif:
+                    raise ReleveIllisible("ligne {} : date de valeur illisible".format(self.num))
+                print('line 223')
+                print(ligne)
+                print(fin_ligne)
+                import pdb; pdb.set_trace()
+                return
+
+            self.Ope.date = date_releve(*date.groups(), self.annee, self.mois)
+            self.Ope.date_valeur = date_releve(*date_valeur.groups(), self.annee, self.mois)
+
+    def _fin_table(self, ligne):
+        """Ligne des totaux : dernière opération, puis montants totaux"""
+        # end of main table
+        if self.Ope.estRemplie(self.operation):   # on ajoute la précédente
+            if self.contexte.verbosity:
+                print(self.Ope)
+            self.releve.ajoute(self.Ope)          # opération si elle est valide
+
+        if self.contexte.verbosity:
+            print('Exited main loop')
+            print('{}({}): {}'.format(self.num, len(ligne), ligne))
+            self._pas_a_pas()
+
+        # this part may fail if there is no "Débit" field
+        operation = ligne.split()
+        start = 3
+        count = 3
+        for num, elem in enumerate(operation[count:]):
+            # pre-increment count as [start:count] goes one element
+            # before count
+            count = count + 1
+            if self.contexte.dp in elem:
+                if (1 == len(elem)):        # in the old listing, there were extraneous spaces
+                    count = count + 1
+                break
+        dernier = pattern.split(ligne[self.Debit_pos:self.Credit_pos].strip())
+        # check it's really a debit field
+        if (estArgent(dernier, self.contexte)):
+            le_debit = ''.join(operation[start:count])
+            start = count
+            count = start
+            for elem in operation[count:]:
                 count = count + 1
-                if dp in elem:
-                    if (1 == len(elem)):        # in the old listing, there were extraneous spaces
+                if self.contexte.dp in elem:
+                    if (1 == len(elem)):
+                        # in the old listings, there were extraneous spaces
                         count = count + 1
                     break
-            dernier = pattern.split(ligne[Debit_pos:Credit_pos].strip())
-            # check it's really a debit field
-            if (estArgent(dernier)):
-                le_debit = ''.join(operation[start:count])
-                start = count
-                count = start
-                for elem in operation[count:]:
-                    count = count + 1
-                    if dp in elem:
-                        if (1 == len(elem)):
-                            # in the old listings, there were extraneous spaces
-                            count = count + 1
-                        break
 
-                le_credit = ''.join(operation[start:count])
-            else:
-                le_debit = ''
-                le_credit = ''.join(operation[start:count])
+            le_credit = ''.join(operation[start:count])
+        else:
+            le_debit = ''
+            le_credit = ''.join(operation[start:count])
 
-            # convert both data, if present
-            if (len(le_debit) > 0):
-                le_debit = mysafe_atof(le_debit)
-            else:
-                le_debit = 0.0
+        # convert both data, if present
+        if (len(le_debit) > 0):
+            self.le_debit = en_centimes(le_debit)
+        else:
+            self.le_debit = 0
 
-            if (len(le_credit) > 0):
-                le_credit = mysafe_atof(le_credit)
+        if (len(le_credit) > 0):
+            self.le_credit = en_centimes(le_credit)
+        else:
+            self.le_credit = 0
+        self.phase = self.SOLDE
+
+    def _solde_final(self, ligne):
+        """Solde final : contrôle des sommes et lignes de fin du relevé"""
+        operation = ligne.split()
+        num = 0
+        for num, date in enumerate(operation):
+            jour = decode_date(date, '%d.%m.%Y')
+            if jour is not None:
+                self.basedate = jour.strftime('%d/%m/%Y')
+                break
+        basedate = self.basedate
+
+        # montant ?
+        la_valeur = en_centimes(''.join(operation[num+1:]))
+
+        ligne = ' '.join(operation[:num+1])
+        # dans quel sens ?
+        if len(operation) < 2:
+            raise ReleveIllisible(ligne+" ne peut pas être interprétée")
+        if re.match('crediteur', operation[1], re.IGNORECASE):
+            Ope = uneOperation(basedate, ligne, "", 0.0, la_valeur / 100)
+            solde_final = la_valeur
+        elif re.match('debiteur', operation[1], re.IGNORECASE):
+            Ope = uneOperation(basedate, ligne, "", la_valeur / 100, 0.0)
+            solde_final = -la_valeur
+        else:
+            raise ReleveIllisible(ligne+" ne peut pas être interprétée")
+
+        somme_deb, somme_cred = self.somme_deb, self.somme_cred
+        le_debit, le_credit = self.le_debit, self.le_credit
+        # check that solde_deb = le_debit;
+        if somme_deb != le_debit:
+            if self.contexte.verbosity and self.contexte.interactif:
+                print("La somme des débits {} n'est pas égale au débit totat {}".format(
+                    somme_deb / 100, le_debit / 100))
+                import pdb; pdb.set_trace()
             else:
-                le_credit = 0.0
+                raise SommesIncorrectes(
+                    'La somme des débits {} n''est pas égale au débit total {}'.format(
+                        somme_deb / 100, le_debit / 100))
+
+        # check that solde_cred = le_credit;
+        if somme_cred != le_credit:
+            if self.contexte.verbosity and self.contexte.interactif:
+                print("La somme des crédits {} n'est pas égale au crédit total {}".format(
+                    somme_cred / 100, le_credit / 100))
+                import pdb; pdb.set_trace()
+            else:
+                raise SommesIncorrectes(
+                    'La somme des crédits {} n''est pas égale au crédit totat {}'.format(
+                        somme_cred / 100, le_credit / 100))
+        # check that solde_init - le_credit + le_debit == solde_final
+        mouvements = self.solde_init - le_debit + le_credit
+        if solde_final != mouvements:
+            if self.contexte.verbosity and self.contexte.interactif:
+                print("La somme des mouvements {} n'arrive pas au solde final {}".format(
+                    mouvements / 100, solde_final / 100))
+                import pdb; pdb.set_trace()
+            else:
+                raise SommesIncorrectes(
+                    'La somme des mouvements {} n''arrive pas au solde final {}'.format(
+                        mouvements / 100, solde_final / 100))
+
+        # create the control line with computed sum of amounts
+        OpeCont = uneOperation(basedate, "SOMME DE CONTROLE", "", somme_deb / 100,
+                               somme_cred / 100)
+        self.releve.ajoute(OpeCont, 'tail')
+        # duplicate the current operation
+        OpeTot = uneOperation(basedate, "TOTAL DES MONTANTS", "", le_debit / 100,
+                              le_credit / 100)
+        # dump it
+        self.releve.ajoute(OpeTot, 'tail')
+
+        # crée une entrée avec le solde final
+        self.releve.ajoute(Ope, 'tail')
+        if self.contexte.verbosity:
+            print('{}({}): {}'.format(self.num, len(ligne), ligne))
+            print('Solde final: {}  au {}'.format(solde_final / 100, basedate))
+        # put entries in a more relevant order
+        self.releve.liste.sort()
+        self.phase = self.FINI
+
+
+def sonde_entete(ligne):
+    """Calcule le profil d'un en-tête de page "Date Nature des opérations ...",
+    c'est-à-dire les POSITIONS_COLONNES : colonnes de la date, du descriptif et de la
+    date de valeur, bornes de la colonne des débits, largeur de la page"""
+    Date_pos = re.search('D\s*ate', ligne).start()
+    Nature_pos = re.search('N\s*ature', ligne).start()
+    dernier = re.search('V\s*aleur', ligne)
+    Credit_pos = re.search('D\s*ébit  ', ligne).end() + 1
+    return (Date_pos, Nature_pos, dernier.start(), dernier.end() + 1, Credit_pos, len(ligne))
+
+
+def registre_profils(fichier=None):
+    """Renvoie le registre des profils de mise en page, partagé par toutes les
+    analyses du processus ; avec fichier, le registre enregistré dans ce fichier"""
+    global PROFILS
+    if PROFILS is None or (fichier and PROFILS.fichier != fichier):
+        PROFILS = RegistreProfils(fichier)
+    return PROFILS
+
+
+def decoupe_pages(lignes):
+    """Découpe les lignes d'un relevé en pages : pdftotext commence chaque page,
+    sauf la première, par un saut de page. S'arrête au premier solde qui suit une
+    ligne de totaux, probablement le solde final : les lignes suivantes (pages de
+    mentions légales, ...) restent dans l'itérateur lignes"""
+    pages = [[]]
+    totaux = False
+    for ligne in lignes:
+        if ligne.startswith('\f') and pages[-1]:
+            pages.append([])
+        pages[-1].append(ligne)
+        classe = classe_ligne(ligne)
+        if classe & LIGNE_TOTAL:
+            totaux = True
+        elif totaux and classe & LIGNE_SOLDE:
+            break
+    return pages
+
+
+def analyse_morceau(lignes, annee, mois, contexte):
+    """Analyse un morceau du tableau d'un relevé comme s'il commençait entre deux
+    pages, dans un processus de executeur_PDF(). Renvoie AnalyseReleve.etat(), ou
+    None si le morceau sort du tableau ou ne se laisse pas analyser seul"""
+    analyse = AnalyseReleve(UnReleve(contexte=contexte), annee, mois)
+    analyse.phase = analyse.TABLE
+    analyse.page_width = None
+    try:
+        for ligne in lignes:
+            analyse.pousse(ligne)
+            if analyse.phase != analyse.TABLE:
+                return None
+    except (ValueError, IndexError, AttributeError):
+        return None
+    return analyse.etat()
+
+
+class Catalogue:
+    """Contenu du répertoire des relevés, lu en un seul os.scandir : les PDF et TXT
+    du compte indexés par (compte, annee, mois), et l'ensemble des noms de fichiers
+    pour savoir en temps constant si un CSV ou un XLSX existe déjà. Les fichiers
+    exclus (PDF en cours de copie, par exemple) sont ignorés"""
+
+    def __init__(self, repertoire, exclus=(), prefixe=None, entries=None):
+        self.repertoire = repertoire
+        self.noms = set()
+        self.pdf = {}
+        self.txt = {}
+        if entries is None:
+            with os.scandir(repertoire) as it:
+                entries = list(it)
+        for entry in entries:
+            self.noms.add(entry.name)
+            extension = entry.name.rpartition('.')[2].lower()
+            if (extension == 'pdf' or extension == 'txt') and entry.name not in exclus:
+                cle = cle_releve(entry.name, prefixe)
+                if cle is None:
+                    continue
+                index = self.pdf if extension == 'pdf' else self.txt
+                # deux fichiers pour le même mois : le dernier l'emporte, comme avant
+                if cle not in index or index[cle].name < entry.name:
+                    index[cle] = entry
 
-            # here, we have "solde .. au
-            for ligne in file:
-                if re.search('SOLDE\s+', ligne):
-                    break
+    def __repr__(self):
+        return 'Catalogue : {} -- {} PDF, {} TXT'.format(self.repertoire, len(self.pdf),
+                                                        len(self.txt))
+
+    def cles(self):
+        """Les (compte, annee, mois) des relevés, PDF ou TXT, dans l'ordre chronologique"""
+        return sorted(set(self.pdf) | set(self.txt), key=lambda cle: (cle[1], cle[2], cle[0]))
+
+    def releves(self):
+        """Liste (nom, annee, mois) de tous les relevés du compte, dans l'ordre
+        chronologique : le TXT s'il existe, le PDF sinon"""
+        liste = []
+        for cle in self.cles():
+            entry = self.txt.get(cle) or self.pdf[cle]
+            liste.append((entry.name, cle[1], cle[2]))
+        return liste
+
+    def mois_disponibles(self):
+        """Les mois des relevés PDF, au format de mois_dispos()"""
+        liste_tout = {}
+        for compte, annee, mois in self.pdf:
+            liste_tout.setdefault(annee, []).append(mois)
+        return sorted([annee] + sorted(mois) for annee, mois in liste_tout.items())
+
+
+class Manifeste:
+    """Fichier MANIFESTE du répertoire des relevés : pour chaque PDF traité, sa
+    taille, sa date de modification, son empreinte SHA-256 et les fichiers produits.
+    Un PDF inchangé n'est plus relu pour calculer son empreinte, et un PDF remplacé
+    depuis sa conversion est converti à nouveau"""
+
+    def __init__(self, repertoire):
+        self.repertoire = repertoire
+        self.fichier = os.path.join(repertoire, MANIFESTE)
+        self.entrees = {}
+        self.modifie = False
+        try:
+            import json
+            with open(self.fichier, 'r') as f:
+                self.entrees = json.load(f)
+        except (OSError, ValueError):
+            pass
 
-            operation = ligne.split()
-            for num, date in enumerate(operation):
-                try:
-                    basedate = dt.strptime(date, '%d.%m.%Y').strftime('%d/%m/%Y')
-                    break
-                except ValueError as e:
-                    continue
+    def __repr__(self):
+        return 'Manifeste : {} -- {} PDF'.format(self.fichier, len(self.entrees))
+
+    def _entree(self, nom):
+        """Entrée à jour du PDF : remise à zéro si le fichier a changé"""
+        st = os.stat(os.path.join(self.repertoire, nom))
+        entree = self.entrees.get(nom)
+        if entree is None or entree['taille'] != st.st_size or entree['mtime'] != st.st_mtime_ns:
+            entree = {'taille': st.st_size, 'mtime': st.st_mtime_ns}
+            self.entrees[nom] = entree
+            self.modifie = True
+        return entree
+
+    def a_change(self, entry):
+        """Vrai si le PDF (un os.DirEntry) a changé depuis sa dernière conversion ;
+        un PDF jamais vu est considéré comme inchangé"""
+        entree = self.entrees.get(entry.name)
+        if entree is None or 'sorties' not in entree:
+            return False
+        st = entry.stat()
+        return entree['taille'] != st.st_size or entree['mtime'] != st.st_mtime_ns
+
+    def empreinte(self, nom):
+        """Empreinte SHA-256 du PDF, calculée seulement s'il a changé"""
+        entree = self._entree(nom)
+        if 'empreinte' not in entree:
+            entree['empreinte'] = empreinte_PDF(os.path.join(self.repertoire, nom))
+            self.modifie = True
+        return entree['empreinte']
+
+    def note(self, nom, sorties):
+        """Enregistre les fichiers produits à partir du PDF"""
+        self._entree(nom)['sorties'] = sorties
+        self.modifie = True
+
+    def sauve(self):
+        if not self.modifie:
+            return
+        import json
+        temp = self.fichier + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.entrees, f, indent=1, sort_keys=True)
+        os.replace(temp, self.fichier)
+        self.modifie = False
+
+
+class RegistreProfils:
+    """Profils de mise en page connus, indexés par la ligne d'en-tête de page, qui
+    leur sert d'empreinte : même en-tête (marge des pages paires ou impaires,
+    variantes de 2012 à 2018 ...), mêmes positions de colonnes. Un profil est le
+    tuple des POSITIONS_COLONNES, dont les bornes de la colonne des débits : un
+    montant dont la virgule tombe entre Debit_pos et Credit_pos est un débit, au-delà
+    un crédit. Un en-tête connu coûte une recherche dans un dictionnaire ; un en-tête
+    inconnu est sondé par sonde_entete(), puis retenu (au plus taille_max profils).
+    Le registre est enregistré dans le fichier, s'il y en a un, et relu à
+    l'exécution suivante"""
+
+    def __init__(self, fichier=None, taille_max=PROFILS_MAX):
+        self.fichier = fichier
+        self.taille_max = taille_max
+        self.profils = {}
+        self.modifie = False
+        if fichier:
+            self.charge()
 
-            # montant ?
-            la_valeur = mysafe_atof(''.join(operation[num+1:]))
-
-            ligne = ' '.join(operation[:num+1])
-            # dans quel sens ?
-            if re.match('crediteur', operation[1], re.IGNORECASE):
-                Ope = uneOperation(basedate, ligne, "", 0.0, la_valeur)
-                solde_final = la_valeur
-            elif re.match('debiteur', operation[1], re.IGNORECASE):
-                Ope = uneOperation(basedate, ligne, "", la_valeur, 0.0)
-                solde_final = -la_valeur
-            else:
-                raise ValueError(ligne+" ne peut pas être interprétée")
-            # check that solde_deb = le_debit;
-            if abs(somme_deb - le_debit) > .01:
-                if VERBOSITY:
-                    print("La somme des débits {} n'est pas égale au débit totat {}".format(
-                        somme_deb, le_debit))
-                    pdb.set_trace()
-                else:
-                    raise ValueError(
-                        'La somme des débits {} n''est pas égale au débit total {}'.format(
-                            somme_deb, le_debit))
-
-            # check that solde_cred = le_credit;
-            if abs(somme_cred - le_credit) > .01:
-                if VERBOSITY:
-                    print("La somme des crédits {} n'est pas égale au crédit total {}".format(
-                        somme_cred, le_credit))
-                    pdb.set_trace()
-                else:
-                    raise ValueError(
-                        'La somme des crédits {} n''est pas égale au crédit totat {}'.format(
-                            somme_cred, le_credit))
-            # check that solde_init - le_credit + le_debit == solde_final
-            mouvements = solde_init - le_debit + le_credit
-            if abs(solde_final - mouvements) > .01:
-                if VERBOSITY:
-                    print("La somme des mouvements {} n'arrive pas au solde final {}".format(
-                        mouvements, solde_final))
-                    pdb.set_trace()
-                else:
-                    raise ValueError(
-                        'La somme des mouvements n''arrive pas au solde final {}'.format(
-                            mouvements, solde_final))
-
-            # create the control line with computed sum of amounts
-            OpeCont = uneOperation(basedate, "SOMME DE CONTROLE", "", somme_deb, somme_cred)
-            self.ajoute(OpeCont, 'tail')
-            # duplicate the current operation
-            OpeTot = uneOperation(basedate, "TOTAL DES MONTANTS", "", le_debit, le_credit)
-            # dump it
-            self.ajoute(OpeTot, 'tail')
-
-            # crée une entrée avec le solde final
-            self.ajoute(Ope, 'tail')
-            if VERBOSITY:
-                print('{}({}): {}'.format(num, len(ligne), ligne))
-                print('Solde final: {}  au {}'.format(solde_final, basedate))
-            # put entries in a more relevant order
-            self.liste.sort()
+    def __repr__(self):
+        return 'Profils : {} -- {} profils'.format(self.fichier, len(self.profils))
+
+    def profil(self, ligne):
+        """Profil de la ligne d'en-tête de page"""
+        profil = self.profils.get(ligne)
+        if profil is None:
+            profil = sonde_entete(ligne)
+            if len(self.profils) < self.taille_max:
+                self.profils[ligne] = profil
+                self.modifie = True
+        return profil
+
+    def charge(self):
+        """Lit les profils enregistrés par la même version de l'analyse ; un fichier
+        absent, illisible ou d'une autre version est ignoré"""
+        import json
+        try:
+            with open(self.fichier, 'r', encoding='utf-8') as f:
+                donnees = json.load(f)
+            if donnees['version'] != VERSION_ANALYSE:
+                return
+            profils = {}
+            for ligne, profil in donnees['profils'].items():
+                profil = tuple(profil)
+                if (len(profil) != len(POSITIONS_COLONNES)
+                        or not all(isinstance(position, int) for position in profil)):
+                    return
+                profils[ligne] = profil
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            return
+        self.profils.update(profils)
+
+    def sauve(self):
+        if not self.modifie or not self.fichier:
+            return
+        import json
+        os.makedirs(os.path.dirname(self.fichier) or '.', exist_ok=True)
+        temp = self.fichier + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'version': VERSION_ANALYSE, 'profils': self.profils}, f, indent=1,
+                      sort_keys=True, ensure_ascii=False)
+        os.replace(temp, self.fichier)
+        self.modifie = False
+
+
+class Surveillance:
+    """Attend l'arrivée de fichiers PDF dans un répertoire : par inotify sous Linux,
+    sinon en regardant la date de modification du répertoire toutes les
+    intervalle secondes. Un fichier n'est signalé qu'une fois stable (taille et
+    date inchangées depuis delai secondes), pour ne pas lire un PDF en cours de copie"""
+
+    def __init__(self, repertoire, intervalle=SURVEILLANCE_INTERVALLE,
+                 delai=SURVEILLANCE_DELAI):
+        self.repertoire = repertoire
+        self.intervalle = intervalle
+        self.delai = delai
+        self.en_attente = {}              # nom -> (taille, mtime, heure du dernier changement)
+        self.connus = self._pdfs()        # nom -> (taille, mtime)
+        self.mtime = os.stat(repertoire).st_mtime_ns
+        self.inotify = None
+        if sys.platform.startswith('linux'):
+            try:
+                self.inotify = inotify_PDF(repertoire)
+            except (OSError, AttributeError):
+                pass
+        self.methode = 'inotify' if self.inotify is not None else 'scandir'
 
-    def genere_CSV(self, filename="", basedir=None, mois=None):
-        """crée un fichier CSV qui contiendra les opérations du relevé
-        si ce CSV n'existe pas deja"""
-        if filename == "":
-            filename = self.nom
-        filename_csv = filename + ".csv"
-        if filename_csv not in deja_en_csv:
-            print('[   ->csv ] Export     : '+filename_csv)
-            if basedir:
-                filename_csv = os.path.join(basedir, filename_csv)
-            with open(filename_csv, "w") as file:
-                _ = CSV_SEP.join(["Date", "Date_Valeur", "Date_Oper",
-                                  "Débit ({})".format(self.monnaie),
-                                  "Crédit ({})".format(self.monnaie), "Opération"])
-                file.write(_+"\n")
-                for Ope in self.head:
-                    _ = CSV_SEP.join([Ope.date, "", "", str(Ope.debit), str(Ope.credit), Ope.desc])
-                    file.write(_+"\n")
-                for Ope in self.liste:
-                    _ = CSV_SEP.join([Ope.date, Ope.date_valeur, Ope.date_oper, str(Ope.debit),
-                                      str(Ope.credit), Ope.desc])
-                    file.write(_+"\n")
-                for Ope in self.tail:
-                    _ = CSV_SEP.join([Ope.date, "", "", '{:.2f}'.format(Ope.debit),
-                                      '{:.2f}'.format(Ope.credit), Ope.desc])
-                    file.write(_+"\n")
-                file.close()
+    def __repr__(self):
+        return 'Surveillance : {} -- {}'.format(self.repertoire, self.methode)
+
+    def _pdfs(self):
+        etats = {}
+        with os.scandir(self.repertoire) as it:
+            for entry in it:
+                if entry.name.lower().endswith('.pdf'):
+                    st = entry.stat()
+                    etats[entry.name] = (st.st_size, st.st_mtime_ns)
+        return etats
+
+    def _etat(self, nom):
+        try:
+            st = os.stat(os.path.join(self.repertoire, nom))
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _attend(self):
+        """Attend un évènement et renvoie les noms des PDF peut-être nouveaux. Sans
+        fichier en attente, l'attente par inotify ne consomme rien"""
+        if self.en_attente:
+            delai = self.delai / 3
+        else:
+            delai = None if self.inotify is not None else self.intervalle
+        if self.inotify is not None:
+            import select, struct
+            if not select.select([self.inotify], [], [], delai)[0]:
+                return []
+            evenements = os.read(self.inotify, 65536)
+            noms = []
+            pos = 0
+            while pos < len(evenements):
+                # struct inotify_event : wd, mask, cookie, len, puis le nom
+                longueur = struct.unpack_from('iIII', evenements, pos)[3]
+                nom = os.fsdecode(evenements[pos+16:pos+16+longueur].rstrip(b'\0'))
+                pos = pos + 16 + longueur
+                if nom.lower().endswith('.pdf'):
+                    noms.append(nom)
+            return noms
+        time.sleep(delai)
+        mtime = os.stat(self.repertoire).st_mtime_ns
+        if mtime == self.mtime:
+            return []
+        self.mtime = mtime
+        return [nom for nom, etat in self._pdfs().items() if self.connus.get(nom) != etat]
+
+    def nouveaux(self):
+        """Attend puis renvoie la liste triée des nouveaux PDF prêts à être lus"""
+        while True:
+            candidats = self._attend()
+            maintenant = time.monotonic()
+            for nom in candidats:
+                etat = self._etat(nom)
+                if etat is not None and etat != self.connus.get(nom) \
+                   and self.en_attente.get(nom, (None, None))[:2] != etat:
+                    self.en_attente[nom] = etat + (maintenant,)
+            prets = []
+            for nom, (taille, mtime, depuis) in list(self.en_attente.items()):
+                etat = self._etat(nom)
+                if etat is None:
+                    del self.en_attente[nom]
+                elif etat != (taille, mtime):
+                    self.en_attente[nom] = etat + (maintenant,)
+                elif maintenant - depuis >= self.delai:
+                    del self.en_attente[nom]
+                    self.connus[nom] = etat
+                    prets.append(nom)
+            if prets:
+                return sorted(prets)
+
+    def ferme(self):
+        if self.inotify is not None:
+            os.close(self.inotify)
+            self.inotify = None
+
+
+class CacheReleves:
+    """Cache persistant des relevés déjà analysés, indexé par l'empreinte SHA-256
+    du PDF et par la version de l'analyseur. Les entrées les moins récemment
+    utilisées sont effacées dès que la taille totale dépasse taille_max.
+
+    Les entrées sont en JSON, et non en pickle : le cache peut se trouver dans un
+    répertoire partagé ou synchronisé, et lire un pickle qui vient d'ailleurs peut
+    exécuter n'importe quel code."""
+
+    def __init__(self, repertoire, taille_max=CACHE_TAILLE_MAX*1024*1024):
+        self.repertoire = repertoire
+        self.taille_max = taille_max
+        self.suffixe = '-v{}.json'.format(VERSION_ANALYSE)
+
+    def __repr__(self):
+        return 'Cache : {} -- taille max : {}'.format(self.repertoire, self.taille_max)
+
+    def chemin(self, empreinte):
+        return os.path.join(self.repertoire, empreinte + self.suffixe)
+
+    def contient(self, empreinte):
+        return os.path.isfile(self.chemin(empreinte))
+
+    def charge(self, empreinte, contexte=None):
+        """Renvoie le relevé correspondant à l'empreinte, ou None"""
+        entree = self._lit(self.chemin(empreinte))
+        if entree is None:
+            return None
+        releve = self._releve(entree, contexte)
+        if releve is None:
+            return None
+        try:
+            # l'heure de modification sert à trouver les entrées les moins utilisées
+            os.utime(self.chemin(empreinte))
+        except OSError:
+            pass
+        return releve
+
+    def sauve(self, empreinte, releve, annee, mois, pdf_file):
+        """Enregistre un relevé analysé, puis fait de la place si nécessaire"""
+        os.makedirs(self.repertoire, exist_ok=True)
+        entree = {'pdf': os.path.basename(pdf_file), 'annee': annee, 'mois': mois,
+                  'releve': releve.vers_donnees()}
+        import json
+        temp = self.chemin(empreinte) + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(entree, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp, self.chemin(empreinte))
+        self.purge()
+
+    def entrees(self, contexte=None):
+        """Itérateur sur les entrées (pdf, annee, mois, relevé) de la version courante,
+        dans l'ordre chronologique"""
+        if not os.path.isdir(self.repertoire):
+            return
+        tout = []
+        for nom in os.listdir(self.repertoire):
+            if nom.endswith(self.suffixe):
+                entree = self._lit(os.path.join(self.repertoire, nom))
+                if entree is not None:
+                    tout.append((entree['annee'], entree['mois'], entree['pdf'], entree))
+        tout.sort(key=lambda x: x[:3])
+        for annee, mois, pdf, entree in tout:
+            releve = self._releve(entree, contexte)
+            if releve is not None:
+                yield pdf, annee, mois, releve
+
+    def purge(self):
+        """Efface les entrées les plus anciennes jusqu'à revenir sous taille_max"""
+        fichiers = []
+        total = 0
+        with os.scandir(self.repertoire) as it:
+            for entry in it:
+                # entrées de toutes les versions (pickle pour les plus anciennes),
+                # mais pas les profils de mise en page rangés à côté
+                if entree_cache_pat.search(entry.name) and entry.is_file():
+                    st = entry.stat()
+                    fichiers.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+        fichiers.sort()
+        for mtime, taille, chemin in fichiers:
+            if total <= self.taille_max:
+                break
+            try:
+                os.remove(chemin)
+                total -= taille
+            except OSError:
+                pass
+
+    def _lit(self, chemin):
+        import json
+        try:
+            with open(chemin, 'r', encoding='utf-8') as f:
+                entree = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entree, dict) or not all(
+                isinstance(entree.get(cle), str) for cle in ('pdf', 'annee', 'mois')):
+            return None
+        return entree
+
+    @staticmethod
+    def _releve(entree, contexte=None):
+        """Le relevé d'une entrée lue par _lit(), None si elle est mal formée"""
+        try:
+            return UnReleve.depuis_donnees(entree['releve'], contexte)
+        except (KeyError, TypeError, ValueError, AttributeError, OverflowError):
+            return None
+
+
+class ClasseurConsolide:
+    """Classeur XLSX regroupant plusieurs relevés : une feuille de synthèse, puis une
+    feuille par mois. Il est écrit en mode constant_memory de xlsxwriter : chaque
+    ligne part sur le disque dès que la suivante commence, la mémoire utilisée ne
+    dépend pas de la longueur de l'historique"""
+
+    def __init__(self, filename, basedir=None, par='annee', contexte=None):
+        self.nom = filename
+        self.par = par
+        self.contexte = contexte if contexte is not None else Contexte()
         filename_xlsx = filename + ".xlsx"
-        if filename_xlsx not in deja_en_xlsx:
-            print('[   ->xlsx] Export     : '+filename_xlsx)
-            # pdb.set_trace()
-            if basedir:
-                filename_xlsx = os.path.join(basedir, filename_xlsx)
-            workbook = xlsxwriter.Workbook(filename_xlsx)
-            if mois:
-                worksheet = workbook.add_worksheet(month_name[int(mois)-1])
+        print('[   ->xlsx] Export     : '+filename_xlsx)
+        if basedir:
+            filename_xlsx = os.path.join(basedir, filename_xlsx)
+        self.fichier = filename_xlsx
+        import xlsxwriter
+        self.workbook = xlsxwriter.Workbook(filename_xlsx, {'constant_memory': True})
+        self.formats = formats_XLSX(self.workbook)
+        currency_form, date_form, string_form, cell_format = self.formats
+        # la synthèse est la première feuille, remplie d'une ligne par relevé ajouté
+        self.synthese = self.workbook.add_worksheet("Synthèse")
+        self.synthese.set_column(0, 0, 12)
+        self.synthese.set_column(1, 4, 14, currency_form)
+        self.synthese.set_column(5, 5, 12)
+        self.synthese.write_row('A1', ["Mois", "Solde initial", "Débits", "Crédits",
+                                       "Solde final", "Opérations"], cell_format)
+        self.row = 1
+        self.feuilles = set()
+        self.cumul = [0, 0, 0]        # débits, crédits (centimes), opérations
+        self.solde_final = 0
+
+    def ajoute(self, annee, mois, releve):
+        """Ajoute la feuille du relevé et sa ligne de synthèse"""
+        currency_form, date_form, string_form, cell_format = self.formats
+        if self.par == 'annee':
+            nom = nom_mois(mois)
+        else:
+            nom = annee+'-'+mois
+        # deux relevés pour le même mois : la feuille doit avoir un nom unique
+        feuille, num = nom, 1
+        while feuille in self.feuilles:
+            num = num + 1
+            feuille = '{} ({})'.format(nom, num)
+        self.feuilles.add(feuille)
+        releve.ecrit_feuille(self.workbook.add_worksheet(feuille), self.formats)
+
+        solde_init = sum(Ope.centimes_credit - Ope.centimes_debit for Ope in releve.head)
+        debits = sum(Ope.centimes_debit for Ope in releve.liste)
+        credits = sum(Ope.centimes_credit for Ope in releve.liste)
+        self.solde_final = solde_init - debits + credits
+        if releve.tail:
+            self.solde_final = releve.tail[-1].centimes_credit - releve.tail[-1].centimes_debit
+        self.synthese.write_string(self.row, 0, annee+'-'+mois)
+        self.synthese.write_number(self.row, 1, solde_init / 100, currency_form)
+        self.synthese.write_number(self.row, 2, debits / 100, currency_form)
+        self.synthese.write_number(self.row, 3, credits / 100, currency_form)
+        self.synthese.write_number(self.row, 4, self.solde_final / 100, currency_form)
+        self.synthese.write_number(self.row, 5, len(releve.liste))
+        self.cumul = [self.cumul[0] + debits, self.cumul[1] + credits,
+                      self.cumul[2] + len(releve.liste)]
+        self.row = self.row + 1
+
+    def ferme(self):
+        """Écrit la ligne des totaux de la synthèse et ferme le classeur"""
+        currency_form, date_form, string_form, cell_format = self.formats
+        row = self.row
+        mesure = chrono('classeur', self.nom + ".xlsx", self.contexte)
+        with mesure:
+            self.synthese.write_string(row, 0, "Total", cell_format)
+            self.synthese.write_formula(row, 2, '=SUM(C2:C{})'.format(row), currency_form,
+                                        self.cumul[0] / 100)
+            self.synthese.write_formula(row, 3, '=SUM(D2:D{})'.format(row), currency_form,
+                                        self.cumul[1] / 100)
+            self.synthese.write_formula(row, 4, '=E{}'.format(row), currency_form,
+                                        self.solde_final / 100)
+            self.synthese.write_formula(row, 5, '=SUM(F2:F{})'.format(row), None, self.cumul[2])
+            self.workbook.close()
+        mesure.ecrit(self.fichier)
+
+
+class GrandLivre:
+    """Base SQLite regroupant les opérations de tous les relevés importés : une ligne
+    par relevé (compte, mois) dans la table releves, une ligne par opération dans la
+    table operations, avec les dates au format ISO et les montants en centimes.
+    Réimporter un relevé remplace ses opérations."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS releves (
+            compte TEXT NOT NULL,
+            mois TEXT NOT NULL,
+            fichier TEXT,
+            monnaie TEXT,
+            solde_initial INTEGER,
+            solde_final INTEGER,
+            PRIMARY KEY (compte, mois)
+        );
+        CREATE TABLE IF NOT EXISTS operations (
+            compte TEXT NOT NULL,
+            mois TEXT NOT NULL,
+            rang INTEGER NOT NULL,
+            dt_date TEXT,
+            dt_valeur TEXT,
+            dt_oper TEXT,
+            debit INTEGER NOT NULL,
+            credit INTEGER NOT NULL,
+            description TEXT,
+            PRIMARY KEY (compte, mois, rang)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS operations_date ON operations (dt_date);
+        CREATE INDEX IF NOT EXISTS operations_compte ON operations (compte, dt_date);
+        PRAGMA user_version = 1;
+    """
+
+    def __init__(self, fichier):
+        self.fichier = fichier
+        import sqlite3
+        self.connexion = sqlite3.connect(fichier)
+        self.connexion.execute("PRAGMA journal_mode = WAL")
+        self.connexion.execute("PRAGMA synchronous = NORMAL")
+        self.connexion.executescript(self.SCHEMA)
+
+    def __repr__(self):
+        return 'Grand livre : {}'.format(self.fichier)
+
+    def mois_importes(self, compte):
+        """Renvoie l'ensemble des mois 'AAAA-MM' déjà importés pour le compte"""
+        curseur = self.connexion.execute("SELECT mois FROM releves WHERE compte = ?", (compte,))
+        return set(mois for mois, in curseur)
+
+    def importe(self, releve, compte, annee, mois, fichier=""):
+        """Importe (ou réimporte) un relevé, en une seule transaction"""
+        mois = annee+'-'+mois
+        solde_initial = sum(Ope.centimes_credit - Ope.centimes_debit for Ope in releve.head)
+        solde_final = None
+        if releve.tail:
+            solde_final = releve.tail[-1].centimes_credit - releve.tail[-1].centimes_debit
+        lignes = [(compte, mois, rang, iso_date(Ope.dt_date), iso_date(Ope.dt_valeur),
+                   iso_date(Ope.dt_oper), Ope.centimes_debit, Ope.centimes_credit, Ope.desc)
+                  for rang, Ope in enumerate(releve.liste)]
+        with chrono('sqlite', os.path.basename(fichier) or None, releve.contexte), self.connexion:
+            self.connexion.execute("DELETE FROM operations WHERE compte = ? AND mois = ?",
+                                   (compte, mois))
+            self.connexion.execute("INSERT OR REPLACE INTO releves VALUES (?, ?, ?, ?, ?, ?)",
+                                   (compte, mois, os.path.basename(fichier), releve.monnaie,
+                                    solde_initial, solde_final))
+            self.connexion.executemany("INSERT INTO operations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                       lignes)
+
+    def ferme(self):
+        self.connexion.close()
+
+
+def fichier_colonne(nom, code):
+    """Nom du fichier d'une colonne de l'archive : 'debit.i64' par exemple"""
+    from array import array
+    return '{}.i{}'.format(nom, 8 * array(code).itemsize)
+
+
+def index_archive(repertoire):
+    """Index d'une archive en colonnes (voir ArchiveColonnes), None si elle n'existe
+    pas. ValueError si elle a été écrite dans un autre format ou par une machine d'un
+    autre ordre des octets"""
+    import json
+    try:
+        with open(os.path.join(repertoire, ARCHIVE_INDEX), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    if index.get('version') != ARCHIVE_VERSION or index.get('ordre') != sys.byteorder:
+        raise ValueError("{} : archive d'un autre format (version {}, octets {})".format(
+            repertoire, index.get('version'), index.get('ordre')))
+    return index
+
+
+class ArchiveColonnes:
+    """Archive en colonnes des opérations de tous les relevés importés, pour l'analyse :
+    un répertoire avec un fichier par colonne de taille fixe (voir ARCHIVE_COLONNES :
+    dates en ordinal, 0 pour une date absente, montants en centimes, numéro du compte
+    dans la liste des comptes, fin du descriptif dans desc.utf8 où les descriptifs sont
+    mis bout à bout en UTF-8), dans l'ordre des octets de la machine, et un index JSON
+    (comptes, relevés avec leurs soldes et leurs lignes).
+
+    Les colonnes ne font que s'allonger : réimporter un relevé ajoute ses opérations à
+    la fin, l'index ne désigne plus que les nouvelles. L'index est réécrit après chaque
+    relevé, une fois les colonnes écrites : les lignes d'un import interrompu ne sont
+    pas référencées, et sont écrasées à l'ouverture suivante. Voir LectureArchive."""
+
+    def __init__(self, repertoire):
+        self.repertoire = repertoire
+        os.makedirs(repertoire, exist_ok=True)
+        self.index = index_archive(repertoire) or {
+            'version': ARCHIVE_VERSION, 'ordre': sys.byteorder, 'lignes': 0, 'octets': 0,
+            'remplacees': 0, 'comptes': [], 'releves': []}
+        self.numeros = {compte: numero for numero, compte in enumerate(self.index['comptes'])}
+        self.fichiers = {}
+        tailles = [(nom, fichier_colonne(nom, code), self.index['lignes'] * self.largeur(code))
+                   for nom, code in ARCHIVE_COLONNES]
+        tailles.append(('desc', ARCHIVE_DESCRIPTIFS, self.index['octets']))
+        for nom, fichier, taille in tailles:
+            file = open(os.path.join(repertoire, fichier), 'ab')
+            if file.tell() < taille:
+                file.close()
+                raise ValueError("{} : colonne {} tronquée".format(repertoire, fichier))
+            # fin d'un import interrompu
+            file.truncate(taille)
+            self.fichiers[nom] = file
+
+    def __repr__(self):
+        return 'Archive : {} ({} opérations)'.format(self.repertoire, self.index['lignes'])
+
+    @staticmethod
+    def largeur(code):
+        from array import array
+        return array(code).itemsize
+
+    def mois_importes(self, compte):
+        """Renvoie l'ensemble des mois 'AAAA-MM' déjà importés pour le compte"""
+        return set(entree['mois'] for entree in self.index['releves']
+                   if entree['compte'] == compte)
+
+    def importe(self, releve, compte, annee, mois, fichier=""):
+        """Ajoute (ou réajoute) les opérations d'un relevé, puis réécrit l'index"""
+        from array import array
+        mois = annee+'-'+mois
+        index = self.index
+        with chrono('archive', os.path.basename(fichier) or None, releve.contexte):
+            if compte not in self.numeros:
+                self.numeros[compte] = len(index['comptes'])
+                index['comptes'].append(compte)
+            numero = self.numeros[compte]
+            colonnes = {nom: array(code) for nom, code in ARCHIVE_COLONNES}
+            descriptifs = []
+            fin = index['octets']
+            for Ope in releve.liste:
+                for nom, jour in (('date', Ope.dt_date), ('date_valeur', Ope.dt_valeur),
+                                  ('date_oper', Ope.dt_oper)):
+                    colonnes[nom].append(jour.toordinal() if jour is not None else 0)
+                colonnes['debit'].append(Ope.centimes_debit)
+                colonnes['credit'].append(Ope.centimes_credit)
+                colonnes['compte'].append(numero)
+                desc = Ope.desc.encode('utf-8')
+                descriptifs.append(desc)
+                fin = fin + len(desc)
+                colonnes['desc_fin'].append(fin)
+            for nom, colonne in colonnes.items():
+                colonne.tofile(self.fichiers[nom])
+            self.fichiers['desc'].write(b''.join(descriptifs))
+            for file in self.fichiers.values():
+                file.flush()
+
+            solde_initial = sum(Ope.centimes_credit - Ope.centimes_debit for Ope in releve.head)
+            solde_final = None
+            if releve.tail:
+                solde_final = releve.tail[-1].centimes_credit - releve.tail[-1].centimes_debit
+            anciens = [entree for entree in index['releves']
+                       if entree['compte'] == compte and entree['mois'] == mois]
+            for entree in anciens:
+                index['releves'].remove(entree)
+                index['remplacees'] = index['remplacees'] + entree['fin'] - entree['debut']
+            debut = index['lignes']
+            index['releves'].append({'compte': compte, 'mois': mois,
+                                     'fichier': os.path.basename(fichier),
+                                     'monnaie': releve.monnaie, 'solde_initial': solde_initial,
+                                     'solde_final': solde_final, 'debut': debut,
+                                     'fin': debut + len(releve.liste)})
+            index['lignes'] = debut + len(releve.liste)
+            index['octets'] = fin
+            self.sauve()
+
+    def sauve(self):
+        import json
+        fichier = os.path.join(self.repertoire, ARCHIVE_INDEX)
+        temp = fichier + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=1, ensure_ascii=False)
+        os.replace(temp, fichier)
+
+    def ferme(self):
+        for file in self.fichiers.values():
+            file.close()
+
+
+class LectureArchive:
+    """Lecture d'une archive écrite par ArchiveColonnes. L'ouverture ne lit que l'index :
+    chaque colonne est projetée en mémoire (mmap) à la première demande, puis vue sans
+    copie, en memoryview d'entiers ou, si NumPy est installé, en tableau NumPy. Le
+    système charge les pages au fil des accès.
+
+        with LectureArchive("archive") as archive:
+            debits = archive.colonne('debit')        # memoryview, centimes
+            dates = archive.numpy('date')            # numpy.ndarray d'ordinaux
+            for debut, fin in archive.tranches():
+                total = sum(debits[debut:fin])
+
+    Les lignes d'un relevé réimporté restent dans les colonnes : tranches() donne les
+    lignes des relevés de l'index (toutes, tant que remplacees vaut 0). Les vues ne
+    sont plus valables après ferme()."""
+
+    def __init__(self, repertoire):
+        index = index_archive(repertoire)
+        if index is None:
+            raise FileNotFoundError("{} : pas d'archive ({} absent)".format(repertoire,
+                                                                          ARCHIVE_INDEX))
+        self.repertoire = repertoire
+        self.index = index
+        self.lignes = index['lignes']
+        self.remplacees = index['remplacees']
+        self.comptes = index['comptes']
+        self.releves = index['releves']
+        self.codes = dict(ARCHIVE_COLONNES, desc='B')
+        self.vues = {}
+        self.projections = []
+
+    def __repr__(self):
+        return 'Archive : {} ({} opérations)'.format(self.repertoire, self.lignes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.ferme()
+        return False
+
+    def colonne(self, nom):
+        """memoryview, sans copie, de la colonne nom (voir ARCHIVE_COLONNES), ou des
+        descriptifs en UTF-8 pour 'desc'"""
+        if nom not in self.vues:
+            code = self.codes[nom]
+            if nom == 'desc':
+                fichier, taille = ARCHIVE_DESCRIPTIFS, self.index['octets']
             else:
-                worksheet = workbook.add_worksheet()
-            currency_form = workbook.add_format()
-            currency_form.set_num_format(8)  # currency
-            date_form = workbook.add_format({'num_format': 'DD/MM/YYYY'})
-            string_form = workbook.add_format()
-            worksheet.set_column(0, 2, 12)
-            if 5 == NCOLS:
-                desc_col = 5
+                fichier = fichier_colonne(nom, code)
+                taille = self.lignes * ArchiveColonnes.largeur(code)
+            if taille == 0:
+                # mmap refuse un fichier vide
+                self.vues[nom] = memoryview(b'').cast(code)
             else:
-                desc_col = 9
-            worksheet.set_column(3, desc_col-1, 10, currency_form)
-            worksheet.set_column(desc_col, desc_col, 64)
-            cell_format = workbook.add_format({'bold': True})
-            cell_format.set_center_across()
-            string_form.set_indent(1)
-
-            if 5 == NCOLS:
-                worksheet.write_row('A1', ["Date", "Date_Valeur", "Date_Oper", "Débit",
-                                           "Crédit", "Opération"], cell_format)
+                import mmap
+                with open(os.path.join(self.repertoire, fichier), 'rb') as f:
+                    projection = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # la vue de toute la projection est gardée, pour être libérée avant
+                # la fermeture du mmap par ferme()
+                vue = memoryview(projection)
+                self.projections.append((projection, vue))
+                self.vues[nom] = vue[:taille].cast(code)
+        return self.vues[nom]
+
+    def numpy(self, nom):
+        """Tableau NumPy, sans copie et en lecture seule, de la colonne nom
+        (ImportError sans NumPy)"""
+        import numpy
+        return numpy.frombuffer(self.colonne(nom), dtype=self.codes[nom])
+
+    def tableau(self, nom):
+        """Copie de la colonne nom dans un array.array, modifiable"""
+        from array import array
+        tableau = array(self.codes[nom])
+        tableau.frombytes(self.colonne(nom).cast('B'))
+        return tableau
+
+    def description(self, rang):
+        """Descriptif de l'opération de la ligne rang"""
+        fins = self.colonne('desc_fin')
+        debut = fins[rang - 1] if rang > 0 else 0
+        return str(self.colonne('desc')[debut:fins[rang]], 'utf-8')
+
+    def releve(self, compte, mois):
+        """Entrée de l'index du relevé du compte pour le mois 'AAAA-MM', ou None"""
+        for entree in self.releves:
+            if entree['compte'] == compte and entree['mois'] == mois:
+                return entree
+        return None
+
+    def tranches(self):
+        """Liste triée des lignes (début, fin) des relevés de l'index, les tranches
+        contiguës réunies"""
+        tranches = []
+        for debut, fin in sorted((entree['debut'], entree['fin']) for entree in self.releves):
+            if debut == fin:
+                continue
+            if tranches and tranches[-1][1] == debut:
+                tranches[-1] = (tranches[-1][0], fin)
             else:
-                worksheet.write_row('A1', ["Date", "Date_Valeur", "Date_Oper", "Débit",
-                                           "Crédit", "Net", "Rubrique", "Dépenses", "Remb.",
-                                           "Opération"], cell_format)
-            row = 1
-            for Ope in self.head:
-                worksheet.write_datetime(row, 0, Ope.dt_date, date_form)
-                worksheet.write_number(row, 3, Ope.debit, currency_form)
-                worksheet.write_number(row, 4, Ope.credit, currency_form)
-                if NCOLS > 5:
-                    worksheet.write_formula(row, 5, "=E{}-D{}".format(row+1, row+1),
-                                            currency_form, Ope.credit-Ope.debit)
-                worksheet.write_string(row, desc_col, Ope.desc, string_form)
-                row = row + 1
-
-            for Ope in self.liste:
-                worksheet.write_datetime(row, 0, Ope.dt_date, date_form)
-                if Ope.dt_valeur:
-                    worksheet.write_datetime(row, 1, Ope.dt_valeur, date_form)
-                if Ope.dt_oper:
-                    worksheet.write_datetime(row, 2, Ope.dt_oper, date_form)
-                worksheet.write_number(row, 3, Ope.debit, currency_form)
-                worksheet.write_number(row, 4, Ope.credit, currency_form)
-                if NCOLS > 5:
-                    worksheet.write_formula(row, 5, "=E{}-D{}".format(row+1, row+1),
-                                            currency_form, Ope.credit-Ope.debit)
-                worksheet.write_string(row, desc_col, Ope.desc, string_form)
-                row = row + 1
-
-            # generate a control formula
-            Ope = self.tail[0]
-            worksheet.write(row, 0, Ope.dt_date, date_form)
-            # EXELL formula are stored in english but displayed in locale
-            worksheet.write_formula(row, 3, '=SUM(D3:D'+str(row)+')', currency_form, Ope.debit)
-            worksheet.write_formula(row, 4, '=SUM(E3:E'+str(row)+')', currency_form, Ope.credit)
-            if NCOLS > 5:
-                worksheet.write_formula(row, 5, "=E{}-D{}".format(row+1, row+1),
-                                        currency_form, Ope.credit-Ope.debit)
-            worksheet.write(row, desc_col, Ope.desc, string_form)
-            row = row + 1
-            for Ope in self.tail[1:]:
-                worksheet.write_datetime(row, 0, Ope.dt_date, date_form)
-                worksheet.write_number(row, 3, Ope.debit, currency_form)
-                worksheet.write_number(row, 4, Ope.credit, currency_form)
-                if NCOLS > 5:
-                    worksheet.write_formula(row, 5, "=E{}-D{}".format(row+1, row+1),
-                                            currency_form, Ope.credit-Ope.debit)
-                worksheet.write_string(row, desc_col, Ope.desc, string_form)
-                row = row + 1
-            workbook.close()
-
-
-def extraction_PDF(pdf_file, deja_en_txt, temp, basedir=None):
-    """Lit un relevé PDF et le convertit en fichier TXT du même nom
-    s'il n'existe pas deja"""
-    txt_file = pdf_file[:-3]+"txt"
-
-    if basedir:
-        pdf_file = os.path.join(basedir, pdf_file)
-        abs_file = os.path.join(basedir, txt_file)
-    else:
-        abs_file = txt_file
+                tranches.append((debut, fin))
+        return tranches
 
-    if txt_file not in deja_en_txt:
-        print('[pdf->txt ] Conversion : '+pdf_file)
-        if PDFTOTEXT_SPEC is None:
-            subprocess.call([PDFTOTEXT, '-layout', pdf_file, abs_file])
-        else:
-            with open(pdf_file, "rb") as f:
-                pdf = pdftotext.PDF(f)
-            with open(abs_file, 'w') as f:
-                f.write(''.join(pdf))
-      
-        print('[pdf->txt ]              terminée, taille  ' +
-              str(os.path.getsize(abs_file)) + ' octets')
-        temp.append(txt_file)
-
-
-def estDate(liste):
-    """ Attend un format ['JJ', '.' 'MM']"""
-    if len(liste) != 3:
+    def ferme(self):
+        """Libère les projections ; celles dont une vue est encore utilisée (tableau
+        NumPy, tranche de memoryview ...) le sont quand elle disparaît"""
+        for vue in self.vues.values():
+            try:
+                vue.release()
+            except BufferError:
+                pass
+        for projection, vue in self.projections:
+            try:
+                vue.release()
+                projection.close()
+            except BufferError:
+                pass
+        self.vues = {}
+        self.projections = []
+
+
+class Chrono:
+    """Mesure la durée d'une étape (horloge et CPU) pour le rapport d'exécution :
+
+        with chrono('csv', fichier) as mesure:
+            ...
+
+    Sans rapport, la mesure est faite mais n'est pas enregistrée"""
+    __slots__ = ('rapport', 'etape', 'fichier', 'horloge', 'cpu', 'exclu')
+
+    def __init__(self, rapport, etape, fichier=None):
+        self.rapport = rapport
+        self.etape = etape
+        self.fichier = fichier
+        # temps passé dans une autre étape pendant celle-ci (voir Rapport.lignes)
+        self.exclu = [0.0, 0.0]
+
+    def __enter__(self):
+        self.horloge = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        if self.rapport is not None:
+            self.rapport.ajoute(self.etape, self.fichier,
+                                time.perf_counter() - self.horloge - self.exclu[0],
+                                time.process_time() - self.cpu - self.exclu[1])
         return False
-    if len(liste[0]) == 2 and liste[1] == '.' and len(liste[2]) == 2:
-        return True
-    return False
 
+    def compte(self, **compteurs):
+        if self.rapport is not None:
+            self.rapport.compte(self.fichier, **compteurs)
+
+    def lu(self, chemin):
+        """Compte la taille du fichier lu"""
+        if self.rapport is not None:
+            self.rapport.compte(self.fichier, octets_lus=os.path.getsize(chemin))
+
+    def ecrit(self, chemin):
+        """Compte la taille du fichier écrit"""
+        if self.rapport is not None:
+            self.rapport.compte(self.fichier, octets_ecrits=os.path.getsize(chemin))
+
+
+class Rapport:
+    """Mesures d'une exécution, écrites en JSON par --report : durées (horloge et CPU)
+    de chaque étape, lignes et opérations lues, octets lus et écrits, par fichier et
+    au total"""
+    COMPTEURS = ('lignes', 'operations', 'octets_lus', 'octets_ecrits')
+
+    def __init__(self):
+        self.debut = dt.now()
+        self.horloge = time.perf_counter()
+        self.cpu = time.process_time()
+        self.etapes = {}
+        self.totaux = dict.fromkeys(self.COMPTEURS, 0)
+        self.fichiers = {}
+
+    def __repr__(self):
+        return 'Rapport : {} fichiers, étapes {}'.format(len(self.fichiers), list(self.etapes))
+
+    def _fichier(self, fichier):
+        if fichier not in self.fichiers:
+            self.fichiers[fichier] = {'etapes': {}}
+        return self.fichiers[fichier]
+
+    def ajoute(self, etape, fichier, horloge, cpu, nombre=1):
+        """Ajoute la durée d'une étape, pour le fichier (s'il y en a un) et au total"""
+        mesures = [self.etapes]
+        if fichier is not None:
+            mesures.append(self._fichier(fichier)['etapes'])
+        for etapes in mesures:
+            duree = etapes.setdefault(etape, {'horloge': 0.0, 'cpu': 0.0, 'nombre': 0})
+            duree['horloge'] += horloge
+            duree['cpu'] += cpu
+            duree['nombre'] += nombre
+
+    def compte(self, fichier, **compteurs):
+        entree = self._fichier(fichier)
+        for nom, valeur in compteurs.items():
+            entree[nom] = entree.get(nom, 0) + valeur
+            self.totaux[nom] += valeur
+
+    def lignes(self, lignes, fichier, mesure):
+        """Itérateur sur les lignes dont le temps de lecture (pdftotext) est compté dans
+        l'étape 'extraction' du fichier, et retiré de la mesure en cours"""
+        horloge = cpu = 0.0
+        lignes = iter(lignes)
+        try:
+            while True:
+                debut, debut_cpu = time.perf_counter(), time.process_time()
+                ligne = next(lignes, None)
+                horloge += time.perf_counter() - debut
+                cpu += time.process_time() - debut_cpu
+                if ligne is None:
+                    return
+                yield ligne
+        finally:
+            self.ajoute('extraction', fichier, horloge, cpu, nombre=0)
+            mesure.exclu[0] += horloge
+            mesure.exclu[1] += cpu
+
+    def ecrit(self, fichier):
+        """Écrit le rapport au format JSON"""
+        import json
+        horloge = time.perf_counter() - self.horloge
+        enfants = os.times()
+        rapport = {
+            'debut': self.debut.isoformat(timespec='seconds'),
+            'duree': {'horloge': horloge, 'cpu': time.process_time() - self.cpu,
+                      # pdftotext et processus de --jobs, une fois terminés
+                      'cpu_enfants': enfants.children_user + enfants.children_system},
+            'operations_par_seconde': self.totaux['operations'] / horloge if horloge else 0,
+            'totaux': dict(self.totaux, fichiers=len(self.fichiers)),
+            'etapes': self.etapes,
+            'fichiers': self.fichiers,
+        }
+        with open(fichier, 'w') as f:
+            json.dump(rapport, f, indent=1, ensure_ascii=False)
+        print('[rapport  ] Export     : '+fichier)
+
+
+def chrono(etape, fichier=None, contexte=None):
+    """Renvoie la mesure d'une étape, enregistrée dans le rapport du contexte (RAPPORT
+    par défaut) s'il y en a un"""
+    return Chrono(RAPPORT if contexte is None else contexte.rapport, etape, fichier)
+
+
+def empreinte_PDF(pdf_file):
+    """Renvoie l'empreinte SHA-256 (hexadécimale) du contenu d'un fichier"""
+    import hashlib
+    sha = hashlib.sha256()
+    with open(pdf_file, 'rb') as f:
+        for bloc in iter(lambda: f.read(1 << 16), b''):
+            sha.update(bloc)
+    return sha.hexdigest()
+
+
+def regenere_depuis_cache(cache, basedir=None, contexte=None):
+    """Régénère tous les CSV/XLSX (et le flux NDJSON) du compte à partir du seul cache,
+    renvoie leur nombre"""
+    contexte = contexte if contexte is not None else Contexte()
+    nombre = 0
+    for pdf_file, annee, mois, releve in cache.entrees(contexte):
+        if contexte.prefixe_compte not in pdf_file:
+            continue
+        print('[cache->  ] Lecture    : '+pdf_file)
+        releve.genere_CSV(contexte.prefixe_csv+annee+'-'+mois, basedir, mois)
+        releve.genere_NDJSON(annee, mois, compte_fichier(pdf_file, contexte.prefixe_compte))
+        nombre = nombre + 1
+    return nombre
+
+
+def formats_XLSX(workbook):
+    """Formats des feuilles de relevé : monétaire, date, texte et titre"""
+    currency_form = workbook.add_format()
+    currency_form.set_num_format(8)  # currency
+    date_form = workbook.add_format({'num_format': 'DD/MM/YYYY'})
+    string_form = workbook.add_format()
+    string_form.set_indent(1)
+    cell_format = workbook.add_format({'bold': True})
+    cell_format.set_center_across()
+    return currency_form, date_form, string_form, cell_format
+
+
+def genere_classeurs(releves, par='annee', basedir=None, contexte=None):
+    """Exporte les relevés (annee, mois, relevé), fournis dans l'ordre chronologique,
+    dans des classeurs consolidés : un par année (par='annee') ou un seul pour le
+    compte (par='compte'). Renvoie le nombre de classeurs écrits"""
+    contexte = contexte if contexte is not None else Contexte()
+    nombre = 0
+    classeur = None
+    for annee, mois, releve in releves:
+        if par == 'annee':
+            filename = contexte.prefixe_csv+annee
+        else:
+            filename = contexte.prefixe_csv+contexte.prefixe_compte
+        if classeur is None or classeur.nom != filename:
+            if classeur is not None:
+                classeur.ferme()
+            with chrono('classeur', filename + ".xlsx", contexte):
+                classeur = ClasseurConsolide(filename, basedir, par, contexte)
+            nombre = nombre + 1
+        with chrono('classeur', filename + ".xlsx", contexte):
+            classeur.ajoute(annee, mois, releve)
+    if classeur is not None:
+        classeur.ferme()
+    return nombre
+
+
+@functools.lru_cache(maxsize=None)
+def module_pdftotext():
+    """Renvoie le module Python pdftotext s'il est installé, None sinon
+    (le programme pdftotext est alors utilisé)"""
+    try:
+        import pdftotext
+    except ImportError:
+        return None
+    return pdftotext
+
+
+def pages_PDF(pdf_file):
+    """Itérateur sur les textes des pages d'un relevé PDF, chemin ou contenu (bytes),
+    avec le module pdftotext : chaque page n'est convertie qu'au moment d'être lue"""
+    if isinstance(pdf_file, bytes):
+        pdf = module_pdftotext().PDF(io.BytesIO(pdf_file))
+    else:
+        with open(pdf_file, "rb") as f:
+            pdf = module_pdftotext().PDF(f)
+    for num in range(len(pdf)):
+        yield pdf[num]
+
+
+def lignes_pages(pages):
+    """Itérateur sur les lignes d'une suite de textes de pages, les mêmes que celles
+    de leur concaténation"""
+    reste = ''
+    for page in pages:
+        lignes = io.StringIO(reste + page, newline=None).readlines()
+        reste = lignes.pop() if lignes and not lignes[-1].endswith('\n') else ''
+        yield from lignes
+    if reste:
+        yield reste
+
+
+def analyse_PDF(pdf_file, annee='2000', mois='01', contexte=None, nom=""):
+    """Analyse un relevé PDF, chemin ou contenu (bytes), au fur et à mesure de la
+    conversion de ses pages (lignes_PDF()), sans interaction ni affichage : les pages qui suivent celle du
+    solde final ne sont pas converties. Renvoie (texte lu, relevé, lignes lues), le
+    relevé au format de UnReleve.vers_donnees(). Si l'analyse n'arrive pas au solde
+    final, le relevé vaut None et tout le texte est converti : son analyse signalera
+    l'erreur. Sans annee ni mois, les dates du relevé sont fausses et seul le texte
+    sert. Peut être exécutée dans un processus séparé"""
+    contexte = (contexte if contexte is not None else Contexte()).remplace(
+        rapport=None, flux=None, verbosity=0, interactif=False)
+    analyse = AnalyseReleve(UnReleve(contexte=contexte), annee, mois, nom)
+    lues = []
+    lignes = lignes_PDF(pdf_file)
+    try:
+        try:
+            for ligne in lignes:
+                lues.append(ligne)
+                if analyse.pousse(ligne):
+                    return ''.join(lues), analyse.releve.vers_donnees(), analyse.num
+        except DelaiDepasse:
+            raise
+        except Exception:
+            pass
+        lues.extend(lignes)
+    finally:
+        lignes.close()
+    return ''.join(lues), None, analyse.num
+
+
+def lignes_PDF(pdf_file):
+    """Itérateur sur les lignes d'un relevé PDF, chemin ou contenu (bytes), page par
+    page : les pages ne sont converties qu'au fur et à mesure de la lecture des lignes.
+    Avec le programme pdftotext, par lots de PAGES_PAR_LOT pages (-f/-l) lus au fil
+    de l'eau sur sa sortie standard ; un lot qui dépasse PDFTOTEXT_DELAI secondes est
+    arrêté, et la lecture lève DelaiDepasse. Un contenu n'est écrit dans un fichier
+    temporaire que pour le programme"""
+    if module_pdftotext() is not None:
+        yield from lignes_pages(pages_PDF(pdf_file))
+        return
+    if isinstance(pdf_file, bytes):
+        import tempfile
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+            f.write(pdf_file)
+        try:
+            yield from lignes_PDF(f.name)
+        finally:
+            os.remove(f.name)
+        return
+    import subprocess, threading
+    reste = ''
+    for premiere in itertools.count(1, PAGES_PAR_LOT):
+        pages = 0
+        depasse = threading.Event()
+        # un groupe de processus à part, pour arrêter aussi ses éventuels enfants
+        with subprocess.Popen([PDFTOTEXT, '-layout', '-f', str(premiere),
+                               '-l', str(premiere + PAGES_PAR_LOT - 1), pdf_file, '-'],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True,
+                              start_new_session=(os.name == 'posix')) as proc:
+            def arrete():
+                depasse.set()
+                arrete_processus(proc)
+            # le pdftotext arrêté ferme sa sortie : la lecture des lignes s'arrête
+            minuteur = threading.Timer(PDFTOTEXT_DELAI, arrete)
+            minuteur.daemon = True
+            minuteur.start()
+            try:
+                for ligne in proc.stdout:
+                    # pdftotext termine chaque page par un saut de page
+                    pages += ligne.count('\f')
+                    # le saut de page de la fin du lot commence la première ligne du
+                    # lot suivant
+                    ligne, reste = reste + ligne, ''
+                    if not ligne.endswith('\n'):
+                        reste = ligne
+                        continue
+                    yield ligne
+            finally:
+                minuteur.cancel()
+                if proc.poll() is None:
+                    arrete_processus(proc)
+        if depasse.is_set() and proc.returncode != 0:
+            raise DelaiDepasse("{} : pdftotext arrêté après {} s".format(pdf_file,
+                                                                        PDFTOTEXT_DELAI))
+        if pages < PAGES_PAR_LOT:
+            break
+    if reste:
+        yield reste
+
+
+def arrete_processus(proc):
+    """Arrête un pdftotext lancé dans son propre groupe de processus (start_new_session),
+    avec ses éventuels enfants"""
+    try:
+        if os.name == 'posix':
+            import signal
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        # terminé entre-temps
+        pass
+
+
+# marque de fin de lot de ExtracteurPdftotext : le lecteur demande le lot suivant
+SUITE = object()
+
+
+class ExtracteurPdftotext:
+    """Conversions PDF -> texte par le programme pdftotext, sans le module python :
+    une boucle asyncio, dans un thread, lance les pdftotext (create_subprocess_exec),
+    jobs à la fois au plus, et passe leurs lignes au fil de l'eau au thread principal,
+    qui les analyse pendant que les conversions suivantes avancent. Un pdftotext
+    qui dépasse delai secondes est arrêté, et la lecture de ses lignes lève
+    DelaiDepasse"""
+
+    def __init__(self, jobs=1, delai=PDFTOTEXT_DELAI):
+        import asyncio, threading
+        self.jobs = jobs
+        self.delai = delai
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.semaphore = asyncio.run_coroutine_threadsafe(self._semaphore(),
+                                                          self.loop).result()
+
+    def __repr__(self):
+        return 'Extracteur : {} pdftotext à la fois -- délai {} s'.format(self.jobs,
+                                                                          self.delai)
+
+    async def _semaphore(self):
+        import asyncio
+        return asyncio.Semaphore(self.jobs)
 
-def estArgent(liste):
+    async def _extrait(self, pdf_file, file, suite):
+        """Convertit le PDF par lots de PAGES_PAR_LOT pages ; le lot suivant n'est
+        lancé qu'une fois le précédent lu, à la demande du lecteur (suite)"""
+        import asyncio
+        try:
+            for premiere in itertools.count(1, PAGES_PAR_LOT):
+                if premiere > 1:
+                    file.put(SUITE)
+                    await suite.wait()
+                    suite.clear()
+                async with self.semaphore:
+                    pages = await self._lot(pdf_file, premiere, file)
+                if pages < PAGES_PAR_LOT:
+                    break
+        except asyncio.TimeoutError:
+            file.put(DelaiDepasse("{} : pdftotext arrêté après {} s".format(pdf_file,
+                                                                           self.delai)))
+        except BaseException as e:
+            file.put(e)
+            raise
+        else:
+            file.put(None)
+
+    async def _lot(self, pdf_file, premiere, file):
+        """Un pdftotext pour les pages premiere à premiere+PAGES_PAR_LOT-1 ; renvoie le
+        nombre de pages converties"""
+        import asyncio
+        # un groupe de processus à part, pour arrêter aussi ses éventuels enfants
+        proc = await asyncio.create_subprocess_exec(
+            PDFTOTEXT, '-layout', '-f', str(premiere), '-l', str(premiere + PAGES_PAR_LOT - 1),
+            pdf_file, '-', stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=(os.name == 'posix'))
+        try:
+            pages = await asyncio.wait_for(self._lit(proc, file), self.delai)
+            await proc.wait()
+            return pages
+        finally:
+            if proc.returncode is None:
+                arrete_processus(proc)
+                await proc.wait()
+
+    async def _lit(self, proc, file):
+        pages = 0
+        async for ligne in proc.stdout:
+            # fins de ligne universelles, comme en mode texte
+            ligne = ligne.decode('utf-8', 'replace')
+            if ligne.endswith('\r\n'):
+                ligne = ligne[:-2] + '\n'
+            # pdftotext termine chaque page par un saut de page
+            pages += ligne.count('\f')
+            file.put(ligne)
+        return pages
+
+    def lance(self, pdf_file):
+        """Lance la conversion (elle attend son tour) et renvoie l'itérateur de ses
+        lignes. Fermer l'itérateur avant la fin arrête pdftotext"""
+        import asyncio, queue
+        file = queue.SimpleQueue()
+        suite = asyncio.run_coroutine_threadsafe(self._evenement(), self.loop).result()
+        tache = asyncio.run_coroutine_threadsafe(self._extrait(pdf_file, file, suite),
+                                                 self.loop)
+        return self._lignes(file, tache, suite)
+
+    async def _evenement(self):
+        import asyncio
+        return asyncio.Event()
+
+    def _lignes(self, file, tache, suite):
+        reste = ''
+        try:
+            while True:
+                ligne = file.get()
+                if ligne is None:
+                    if reste:
+                        yield reste
+                    return
+                if ligne is SUITE:
+                    self.loop.call_soon_threadsafe(suite.set)
+                    continue
+                if isinstance(ligne, BaseException):
+                    raise ligne
+                # le saut de page de la fin d'un lot commence la première ligne du
+                # lot suivant
+                ligne, reste = reste + ligne, ''
+                if not ligne.endswith('\n'):
+                    reste = ligne
+                    continue
+                yield ligne
+        finally:
+            tache.cancel()
+
+    async def _annule(self):
+        import asyncio
+        taches = [tache for tache in asyncio.all_tasks() if tache is not asyncio.current_task()]
+        for tache in taches:
+            tache.cancel()
+        await asyncio.gather(*taches, return_exceptions=True)
+
+    def ferme(self):
+        """Arrête les pdftotext encore en cours, puis la boucle et son thread"""
+        import asyncio
+        asyncio.run_coroutine_threadsafe(self._annule(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+def textes_PDFs(a_extraire, basedir=None, jobs=1, contexte=None):
+    """Renvoie, dans l'ordre de la liste des relevés (nom, annee, mois), les triplets
+    (chemin du PDF, lignes du PDF, analyse), avec au plus 'jobs' conversions
+    simultanées. analyse vaut (relevé, lignes lues) si le relevé a déjà été analysé
+    pendant sa conversion, voir analyse_PDF(), None sinon"""
+    contexte = contexte if contexte is not None else Contexte()
+    pdf_files = [os.path.join(basedir or '', nom) for nom, annee, mois in a_extraire]
+
+    if module_pdftotext() is None:
+        # au plus 2*jobs relevés d'avance : la mémoire ne dépend pas du nombre de PDF
+        extracteur = extracteur_PDF(jobs)
+        a_lancer = iter(pdf_files)
+        lances = collections.deque((pdf_file, extracteur.lance(pdf_file), None)
+                                   for pdf_file in itertools.islice(a_lancer, 2 * jobs))
+        while lances:
+            yield lances.popleft()
+            for pdf_file in itertools.islice(a_lancer, 1):
+                lances.append((pdf_file, extracteur.lance(pdf_file), None))
+        return
+
+    if jobs < 2 or len(pdf_files) < 2:
+        for pdf_file in pdf_files:
+            yield pdf_file, lignes_PDF(pdf_file), None
+        return
+
+    # chaque processus analyse le relevé qu'il convertit : le texte n'est analysé à
+    # nouveau que si cette analyse n'aboutit pas
+    contexte = contexte.remplace(rapport=None, flux=None, verbosity=0, interactif=False)
+    resultats = executeur_PDF(jobs).map(
+        analyse_PDF, pdf_files, [annee for nom, annee, mois in a_extraire],
+        [mois for nom, annee, mois in a_extraire], itertools.repeat(contexte), pdf_files)
+    for pdf_file, (texte, donnees, nombre) in zip(pdf_files, resultats):
+        yield (pdf_file, io.StringIO(texte, newline=None),
+               None if donnees is None else (donnees, nombre))
+
+
+def extracteur_PDF(jobs):
+    """Comme executeur_PDF(), pour les pdftotext de ExtracteurPdftotext"""
+    global EXTRACTEUR
+    if EXTRACTEUR is None:
+        EXTRACTEUR = ExtracteurPdftotext(jobs, PDFTOTEXT_DELAI)
+    return EXTRACTEUR
+
+
+def executeur_PDF(jobs):
+    """Renvoie les processus de conversion PDF -> texte, créés au premier appel puis
+    partagés par tous les relevés, de tous les comptes, jusqu'à ferme_executeur()"""
+    global EXECUTEUR
+    if EXECUTEUR is None:
+        from concurrent.futures import ProcessPoolExecutor
+        EXECUTEUR = ProcessPoolExecutor(max_workers=jobs)
+    return EXECUTEUR
+
+
+def ferme_executeur():
+    global EXECUTEUR, EXTRACTEUR
+    if EXECUTEUR is not None:
+        EXECUTEUR.shutdown()
+        EXECUTEUR = None
+    if EXTRACTEUR is not None:
+        EXTRACTEUR.ferme()
+        EXTRACTEUR = None
+
+
+def lit_releves(a_lire, chemin, basedir=None, cache=None, jobs=1, manifeste=None,
+                contexte=None):
+    """Itérateur (nom, annee, mois, relevé) sur les relevés (nom, annee, mois) de
+    a_lire, PDF ou TXT, dans le même ordre. Les PDF déjà analysés sont lus dans le
+    cache, les autres sont extraits par jobs processus et ajoutés au cache. Les
+    empreintes des PDF inchangés sont prises dans le manifeste"""
+    contexte = contexte if contexte is not None else Contexte()
+    # les PDF déjà analysés sont lus dans le cache
+    empreintes = {}
+    a_extraire = []
+    for nom, annee, mois in a_lire:
+        if nom[-3:].lower() != 'pdf':
+            continue
+        if cache:
+            if manifeste:
+                empreintes[nom] = manifeste.empreinte(nom)
+            else:
+                empreintes[nom] = empreinte_PDF(os.path.join(chemin, nom))
+            if cache.contient(empreintes[nom]):
+                continue
+        a_extraire.append((nom, annee, mois))
+
+    # PDF -> CSV, sans fichier TXT intermédiaire
+    textes = textes_PDFs(a_extraire, basedir, jobs, contexte)
+    a_extraire = set(nom for nom, annee, mois in a_extraire)
+    for nom, annee, mois in a_lire:
+        if nom[-3:].lower() == 'pdf':
+            releve = None
+            if nom not in a_extraire:
+                with chrono('cache', nom, contexte):
+                    releve = cache.charge(empreintes[nom], contexte)
+            if releve is None:
+                analyse = None
+                if nom in a_extraire:
+                    with chrono('extraction', nom, contexte):
+                        pdf_file, lignes, analyse = next(textes)
+                else:
+                    # entrée du cache illisible
+                    pdf_file = os.path.join(chemin, nom)
+                    lignes = lignes_PDF(pdf_file)
+                print('[pdf->    ] Lecture    : '+nom)
+                releve = UnReleve(contexte=contexte)
+                lues = lignes
+                try:
+                    with chrono('analyse', nom, contexte) as mesure:
+                        if analyse is not None and not contexte.verbosity:
+                            # déjà analysé pendant la conversion (analyse_PDF())
+                            releve = UnReleve.depuis_donnees(analyse[0], contexte)
+                            nombre = analyse[1]
+                        else:
+                            if contexte.rapport:
+                                lues = contexte.rapport.lignes(lignes, nom, mesure)
+                            nombre = releve.ajoute_from_lignes(lues, annee, mois, pdf_file,
+                                                               jobs)
+                except DelaiDepasse as e:
+                    # le relevé sera repris à la prochaine exécution
+                    print('[pdf->    ] Abandon    : {}'.format(e))
+                    continue
+                finally:
+                    # l'analyse s'arrête au solde final, avant la fin des lignes : les
+                    # pages suivantes ne sont pas converties ; sur une erreur, l'extraction
+                    # en cours est arrêtée aussi
+                    lues.close()
+                    lignes.close()
+                mesure.lu(pdf_file)
+                mesure.compte(lignes=nombre, operations=len(releve.liste))
+                if cache:
+                    with chrono('cache', nom, contexte):
+                        cache.sauve(empreintes[nom], releve, annee, mois, pdf_file)
+                        # nouvelles mises en page rencontrées par l'analyse
+                        registre_profils().sauve()
+            else:
+                print('[cache->  ] Lecture    : '+nom)
+        else:
+            releve = UnReleve(contexte=contexte)
+            with chrono('analyse', nom, contexte) as mesure:
+                nombre = releve.ajoute_from_TXT(nom, annee, mois, basedir, jobs)
+            mesure.lu(os.path.join(basedir or '', nom))
+            mesure.compte(lignes=nombre, operations=len(releve.liste))
+        yield nom, annee, mois, releve
+
+
+def inotify_PDF(repertoire):
+    """Renvoie un descripteur inotify signalant les fichiers écrits ou déplacés dans
+    le répertoire (Linux seulement)"""
+    import ctypes, ctypes.util
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1")
+    if libc.inotify_add_watch(fd, os.fsencode(repertoire), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+        erreur = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(erreur, "inotify_add_watch")
+    return fd
+
+
+def a_convertir(catalogue, manifeste, contexte=None):
+    """Renvoie les relevés (nom, annee, mois) à lire pour produire les CSV/XLSX
+    manquants ; tous les relevés si aucun fichier n'est demandé (flux NDJSON seul)"""
+    contexte = contexte if contexte is not None else Contexte()
+    a_lire = []
+    # on analyse tous les nouveaux relevés PDF sauf si CSV deja dispo,
+    # un fichier TXT déjà présent étant lu à la place du PDF
+    for cle in catalogue.cles():
+        compte, annee, mois = cle
+        pdf, txt = catalogue.pdf.get(cle), catalogue.txt.get(cle)
+        sorties = [contexte.prefixe_csv+annee+'-'+mois+'.'+ext for ext in contexte.sorties
+                   if ext in FORMATS_FICHIERS]
+        if sorties and all(sortie in catalogue.noms for sortie in sorties):
+            # sauf si le PDF a été remplacé depuis sa conversion
+            if pdf is None or not manifeste.a_change(pdf):
+                continue
+        a_lire.append(((txt or pdf).name, annee, mois))
+    return a_lire
+
+
+def convertit(a_lire, chemin, myargs, cache, manifeste, bases=(), contexte=None):
+    """Lit les relevés de a_lire, en génère les CSV/XLSX et le flux NDJSON, et les
+    importe dans les bases (base SQLite, archive en colonnes) demandées. Renvoie le nombre de relevés
+    convertis, sans ceux dont l'extraction a été abandonnée"""
+    contexte = contexte if contexte is not None else Contexte()
+    prefixe_csv = contexte.prefixe_csv
+    convertis = 0
+    for nom, annee, mois, releve in lit_releves(a_lire, chemin, myargs.dir, cache, myargs.jobs,
+                                                manifeste, contexte):
+        compte = compte_fichier(nom, contexte.prefixe_compte)
+        releve.genere_CSV(prefixe_csv+annee+'-'+mois, myargs.dir, mois)
+        # le flux reçoit chaque relevé dès son analyse
+        releve.genere_NDJSON(annee, mois, compte)
+        if nom[-3:].lower() == 'pdf':
+            manifeste.note(nom, [prefixe_csv+annee+'-'+mois+'.'+ext for ext in contexte.sorties
+                                 if ext in FORMATS_FICHIERS])
+        for base in bases:
+            base.importe(releve, compte, annee, mois, nom)
+        convertis = convertis + 1
+    return convertis
+
+
+def complete(catalogue, a_lire, chemin, myargs, cache, manifeste, bases=(), contexte=None):
+    """Sorties qui portent sur tout le compte, une fois les relevés de a_lire convertis :
+    import des relevés absents des bases, classeurs consolidés, et avec --tout, flux
+    NDJSON des relevés que la conversion n'a pas diffusés"""
+    contexte = contexte if contexte is not None else Contexte()
+    prefixe_csv, prefixe_compte = contexte.prefixe_csv, contexte.prefixe_compte
+    # relevés déjà convertis mais absents d'une des bases, lus une seule fois ; le
+    # compte est celui du nom du fichier, pas le préfixe, qui peut changer
+    if bases:
+        comptes = {nom: compte_fichier(nom, prefixe_compte)
+                   for nom, annee, mois in catalogue.releves()}
+        importes = {(num, compte): base.mois_importes(compte)
+                    for num, base in enumerate(bases) for compte in set(comptes.values())}
+        manquants = {nom: [base for num, base in enumerate(bases)
+                           if annee+'-'+mois not in importes[num, comptes[nom]]]
+                     for nom, annee, mois in catalogue.releves()}
+        a_importer = [(nom, annee, mois) for nom, annee, mois in catalogue.releves()
+                      if manquants[nom]]
+        for nom, annee, mois, releve in lit_releves(a_importer, chemin, myargs.dir, cache,
+                                                    myargs.jobs, manifeste, contexte):
+            for base in manquants[nom]:
+                base.importe(releve, comptes[nom], annee, mois, nom)
+
+    # classeurs consolidés : ceux qui contiennent un nouveau relevé, ou qui manquent
+    if myargs.classeur:
+        a_consolider = catalogue.releves()
+        if myargs.classeur == 'annee':
+            nouvelles = set(annee for nom, annee, mois in a_lire)
+            a_consolider = [(nom, annee, mois) for nom, annee, mois in a_consolider
+                            if annee in nouvelles
+                            or prefixe_csv+annee+".xlsx" not in catalogue.noms]
+        elif not a_lire and prefixe_csv+prefixe_compte+".xlsx" in catalogue.noms:
+            a_consolider = []
+        releves = lit_releves(a_consolider, chemin, myargs.dir, cache, myargs.jobs, manifeste,
+                              contexte)
+        genere_classeurs(((annee, mois, releve) for nom, annee, mois, releve in releves),
+                         myargs.classeur, myargs.dir, contexte)
+
+    # flux NDJSON : convertit() y a écrit les relevés de a_lire ; avec --tout, les autres
+    # relevés du compte suivent, lus dans le cache s'ils y sont
+    if 'ndjson' in contexte.sorties and contexte.flux is not None and myargs.tout:
+        convertis = set(nom for nom, annee, mois in a_lire)
+        a_diffuser = [(nom, annee, mois) for nom, annee, mois in catalogue.releves()
+                      if nom not in convertis]
+        for nom, annee, mois, releve in lit_releves(a_diffuser, chemin, myargs.dir, cache,
+                                                    myargs.jobs, manifeste, contexte):
+            releve.genere_NDJSON(annee, mois, compte_fichier(nom, prefixe_compte))
+
+
+def message_erreur(e):
+    """Message d'une erreur de conversion ; le type de l'erreur s'il est inattendu"""
+    if isinstance(e, ErreurConversion):
+        return str(e)
+    return '{}: {}'.format(type(e).__name__, e)
+
+
+def surveille(chemin, myargs, cache, manifeste, bases=()):
+    """Mode --watch : convertit les nouveaux relevés PDF dès leur arrivée dans le
+    répertoire, jusqu'à l'interruption par Ctrl-C"""
+    surveillance = Surveillance(chemin)
+    echecs = set()
+    print('[watch    ] Surveillance : {} ({}), Ctrl-C pour arrêter'.format(
+        chemin, surveillance.methode))
+    try:
+        while True:
+            prets = surveillance.nouveaux()
+            # un relevé en échec n'est retenté que si son PDF change
+            echecs.difference_update(prets)
+            catalogue = Catalogue(chemin, set(surveillance.en_attente) | echecs)
+            a_lire = a_convertir(catalogue, manifeste)
+            convertis = []
+            for releve in a_lire:
+                try:
+                    nombre = convertit([releve], chemin, myargs, cache, manifeste, bases)
+                except Exception as e:
+                    # relevé illisible, PDF disparu ou erreur inattendue de l'analyse :
+                    # un PDF ne doit pas arrêter la surveillance
+                    print('[erreur   ] {} : {}'.format(releve[0], message_erreur(e)))
+                    echecs.add(releve[0])
+                else:
+                    if nombre:
+                        convertis.append(releve)
+                    else:
+                        # extraction abandonnée (--timeout) : pas de nouvel essai à chaque
+                        # tour, le relevé sera repris au prochain lancement
+                        echecs.add(releve[0])
+            try:
+                complete(catalogue, convertis, chemin, myargs, cache, manifeste, bases)
+            except Exception as e:
+                print('[erreur   ] {}'.format(message_erreur(e)))
+            manifeste.sauve()
+    except KeyboardInterrupt:
+        print("\nFin de la surveillance.")
+    finally:
+        manifeste.sauve()
+        surveillance.ferme()
+
+
+def parcours(racine, recursif=False):
+    """Itérateur (répertoire, entrées) sur le répertoire racine et, si recursif, sur
+    ses sous-répertoires : un seul os.scandir par répertoire. Les répertoires cachés
+    (le cache, par exemple) sont ignorés"""
+    a_parcourir = [racine]
+    while a_parcourir:
+        repertoire = a_parcourir.pop(0)
+        try:
+            with os.scandir(repertoire) as it:
+                entries = list(it)
+        except OSError as e:
+            print('[erreur   ] {} : {}'.format(repertoire, e))
+            continue
+        yield repertoire, entries
+        if recursif:
+            a_parcourir[0:0] = sorted(entry.path for entry in entries
+                                      if entry.is_dir() and not entry.name.startswith('.'))
+
+
+def lots_releves(racine, prefixes=None, recursif=False):
+    """Liste (répertoire, préfixe, entrées, partagé) des comptes à traiter dans chaque
+    répertoire. Sans prefixes, les comptes sont ceux trouvés dans les noms des relevés.
+    partagé est vrai si plusieurs comptes (traités ou non) ont leurs relevés dans le
+    même répertoire"""
+    lots = []
+    for repertoire, entries in parcours(racine, recursif):
+        comptes = set()
+        for entry in entries:
+            if entry.name.rpartition('.')[2].lower() in ('pdf', 'txt'):
+                comptes.add(compte_releve(entry.name))
+        comptes.discard(None)
+        if prefixes is None:
+            trouves = sorted(comptes)
+        else:
+            trouves = [prefixe for prefixe in prefixes
+                       if any(prefixe in compte for compte in comptes)]
+        for prefixe in trouves:
+            lots.append((repertoire, prefixe, entries, len(comptes) > 1))
+    return lots
+
+
+def convertit_lots(racine, myargs, cache, bases=()):
+    """Mode lot (--comptes, --recursif) : convertit en une seule exécution les relevés
+    de plusieurs comptes, dans toute l'arborescence si demandé. Les fichiers produits
+    sont rangés à côté des relevés ; si plusieurs comptes partagent un répertoire, leur
+    nom comporte le préfixe du compte. Renvoie (relevés convertis, comptes traités)"""
+    import copy
+
+    prefixes = None
+    if myargs.comptes != 'auto':
+        prefixes = [prefixe.strip() for prefixe in (myargs.comptes or PREFIXE_COMPTE).split(',')
+                    if prefixe.strip()]
+    with chrono('decouverte'):
+        lots = lots_releves(racine, prefixes, myargs.recursif)
+
+    contexte = Contexte()
+    manifestes = {}
+    touch = 0
+    try:
+        for repertoire, prefixe, entries, partage in lots:
+            prefixe_csv = contexte.prefixe_csv + prefixe + '_' if partage else contexte.prefixe_csv
+            compte = contexte.remplace(prefixe_compte=prefixe, prefixe_csv=prefixe_csv)
+            lot = copy.copy(myargs)
+            lot.dir = repertoire
+            with chrono('decouverte'):
+                catalogue = Catalogue(repertoire, prefixe=prefixe, entries=entries)
+                if repertoire not in manifestes:
+                    manifestes[repertoire] = Manifeste(repertoire)
+                manifeste = manifestes[repertoire]
+                a_lire = a_convertir(catalogue, manifeste, compte)
+            print('[lot      ] Compte     : {} -- {}'.format(prefixe, repertoire))
+            affiche(catalogue.mois_disponibles())
+            touch = touch + convertit(a_lire, repertoire, lot, cache, manifeste, bases, compte)
+            complete(catalogue, a_lire, repertoire, lot, cache, manifeste, bases, compte)
+    finally:
+        for manifeste in manifestes.values():
+            manifeste.sauve()
+    return touch, len(set(prefixe for repertoire, prefixe, entries, partage in lots))
+
+
+def classe_ligne(ligne):
+    """Renvoie la classe d'une ligne, combinaison des LIGNE_*. Chaque motif
+    n'est cherché que si la ligne contient le mot-clé correspondant"""
+    if len(ligne) < 2:
+        return LIGNE_VIDE
+    classe = LIGNE_TABLE
+    if 'ature' in ligne and nature_pat.search(ligne):
+        classe |= LIGNE_ENTETE
+    if 'BNP PARIBAS' in ligne and footer_pat.search(ligne):
+        classe |= LIGNE_PIED
+    if 'SOLDE' in ligne and solde_pat.search(ligne):
+        classe |= LIGNE_SOLDE
+    if 'total' in ligne.lower() and total_pat.search(ligne):
+        classe |= LIGNE_TOTAL
+    if 'Monnaie du compte' in ligne and monnaie_pat.search(ligne):
+        classe |= LIGNE_MONNAIE
+    return classe
+
+
+def decode_date(chaine, sorte):
+    """Décode une date selon l'un des formats de FORMATS_DATE, avec les mêmes
+    règles que dt.strptime, mais renvoie None au lieu de lever une exception"""
+    motif, siecle = FORMATS_DATE[sorte]
+    trouve = motif.match(chaine)
+    if trouve is None or trouve.end() != len(chaine):
+        return None
+    return fabrique_date(*trouve.groups(), siecle=siecle)
+
+
+@functools.lru_cache(maxsize=MEMO_DATES)
+def fabrique_date(jour, mois, annee, siecle=False):
+    """Renvoie le datetime correspondant, ou None si la date n'existe pas.
+    Un relevé ne contient qu'une trentaine de dates différentes : elles sont
+    mémorisées"""
+    jour, mois, annee = int(jour), int(mois), int(annee)
+    if siecle:
+        # même convention que strptime pour %y
+        annee += 2000 if annee <= 68 else 1900
+    import calendar
+    if annee < 1 or jour > calendar.monthrange(annee, mois)[1]:
+        return None
+    return dt(annee, mois, jour)
+
+
+@functools.lru_cache(maxsize=MEMO_DATES)
+def code_date(texte):
+    """Forme compacte d'une date 'JJ/MM/AAAA' : son ordinal si elle est valide et
+    s'écrit exactement ainsi, sinon la chaîne telle quelle ("" par exemple)"""
+    jour = decode_date(texte, '%d/%m/%Y')
+    if jour is not None and texte_date(jour.toordinal()) == texte:
+        return jour.toordinal()
+    return texte
+
+
+@functools.lru_cache(maxsize=MEMO_DATES)
+def texte_date(code):
+    """Inverse de code_date() : la date en chaîne 'JJ/MM/AAAA'"""
+    if isinstance(code, int):
+        return dt.fromordinal(code).strftime('%d/%m/%Y')
+    return code
+
+
+@functools.lru_cache(maxsize=MEMO_DATES)
+def jour_date(code):
+    """Le datetime d'une date produite par code_date(), None si elle est invalide"""
+    if isinstance(code, int):
+        return dt.fromordinal(code)
+    return decode_date(code, '%d/%m/%Y')
+
+
+def nom_mois(mois):
+    """Nom de la feuille XLSX du mois 'MM' : 'January' pour '01'"""
+    from calendar import month_name
+    return month_name[int(mois)]
+
+
+def iso_date(jour):
+    """Date au format ISO 'AAAA-MM-JJ' (pour SQLite), None si jour est None"""
+    if jour is None:
+        return None
+    return jour.date().isoformat()
+
+
+def date_operation(operation):
+    """Cherche la date d'opération parmi les mots d'une description :
+    'JJ/MM/AA' n'importe où, 'JJMMAA' en 2ème ou 5ème position
+    ('DU 020316 ...', 'FACTURE(S) CARTE BLABLA DU 020316')"""
+    for num, date in enumerate(operation):
+        jour = decode_date(date, '%d/%m/%y')
+        if jour is None and (1 == num or 4 == num):
+            jour = decode_date(date, '%d%m%y')
+        if jour is not None:
+            return jour
+    return None
+
+
+def estArgent(liste, contexte=None):
     """ Attend un format ['[0-9]*', ',', '[0-9][0-9]'] """
     if len(liste) < 3:
         return False
-    if dp in liste[-2]:
+    if (dp if contexte is None else contexte.dp) in liste[-2]:
         return True
     return False
 
 
-def list2date(liste, annee, mois):
-    """renvoie un string"""
-    if (len(liste) < 3):
-        print('line 297')
-        print(liste)
-        pdb.set_trace()
-
-    if mois == '01' and liste[2] == '12':
-        return liste[0]+'/'+liste[2]+'/'+str(int(annee)-1)
-    else:
-        return liste[0]+'/'+liste[2]+'/'+annee
+def date_releve(jour, mois_date, annee, mois):
+    """Date 'JJ/MM/AAAA' d'une date 'JJ.MM' lue dans le relevé du mois mois de
+    l'année annee : en janvier, une date de décembre est de l'année précédente"""
+    if mois == '01' and mois_date == '12':
+        annee = str(int(annee) - 1)
+    return jour + '/' + mois_date + '/' + annee
 
 
 def list2valeur(liste):
@@ -738,6 +2856,47 @@ def filtrer(liste, filetype):
     return files
 
 
+def cle_releve(nom, prefixe=None):
+    """Renvoie (compte, annee, mois) d'un relevé du compte (PREFIXE_COMPTE par défaut)
+    d'après le nom du fichier, None si le fichier n'est pas un relevé du compte"""
+    if prefixe is None:
+        prefixe = PREFIXE_COMPTE
+    operation = nom.split('.')   # strip the extension
+    operation = operation[0].split('_')   # get chunks
+    if "FRAIS" in operation[0]:
+        return None
+    for num, val in enumerate(operation[1:-1]):
+        if prefixe in val:
+            # the next element contains the date
+            return val, operation[num+2][0:4], operation[num+2][4:6]
+    return None
+
+
+def compte_fichier(nom, prefixe=None):
+    """Numéro de compte d'un relevé du compte (PREFIXE_COMPTE par défaut) d'après le
+    nom du fichier : le champ qui contient le préfixe. Il identifie le compte dans
+    les bases et le flux NDJSON, quel que soit le préfixe donné. Le préfixe si le
+    nom n'est pas celui d'un relevé"""
+    cle = cle_releve(os.path.basename(nom), prefixe)
+    if cle is None:
+        return prefixe if prefixe is not None else PREFIXE_COMPTE
+    return cle[0]
+
+
+def compte_releve(nom):
+    """Renvoie le compte d'un relevé d'après le nom du fichier, quel que soit le compte
+    ('RCHQ_101_<compte>_<AAAAMMJJ>...' : le champ qui précède la date), None si le
+    fichier n'est pas un relevé"""
+    operation = nom.split('.')[0].split('_')
+    if "FRAIS" in operation[0]:
+        return None
+    for num, val in enumerate(operation[1:-1]):
+        date = operation[num+2]
+        if len(date) == 8 and date.isdigit():
+            return val
+    return None
+
+
 def mois_dispos(liste):
     """Renvoie une liste des relevés disponibles de la forme
     [['2012', '10', '11', '12']['2013', '01', '02', '03', '04']]"""
@@ -789,30 +2948,55 @@ def affiche(liste):
     print("")
 
 
-def mysafe_atof(valeur):
-    """Réalise atof avec prise en compte de plusieurs erreurs"""
+def en_centimes(valeur):
+    """Convertit un montant '1.234,56', '1 234,56' ou '1234,56' en un nombre entier
+    de centimes, sans passer par les locales ni par un flottant"""
+    entier, virgule, decimales = valeur.strip().rpartition(',')
+    if not virgule:
+        # pas de virgule : le point n'est décimal que suivi d'un ou deux chiffres
+        entier, virgule, decimales = decimales.rpartition('.')
+        if not virgule or len(decimales) > 2:
+            entier, decimales = valeur.strip(), ''
+    signe = 1
+    if entier[:1] in ('-', '+'):
+        if entier[0] == '-':
+            signe = -1
+        entier = entier[1:]
+    entier = entier.translate(SANS_SEPARATEURS)
+    decimales = decimales.strip()
+    if (entier and not entier.isdecimal()) or (decimales and not decimales.isdecimal()) \
+       or len(decimales) > 2 or not (entier or decimales):
+        raise ValueError("montant invalide : '{}'".format(valeur))
+    return signe * (int(entier or 0) * 100 + int(decimales.ljust(2, '0')))
+
+
+def mysafe_atof(valeur, contexte=None):
+    """Réalise atof avec prise en compte de plusieurs erreurs, avec le point décimal
+    (dp) et le séparateur des milliers (ts) du contexte, sans toucher aux locales du
+    processus. Remplacée par en_centimes() dans l'analyse des relevés"""
+    contexte = contexte if contexte is not None else Contexte()
+    dp, ts = contexte.dp, contexte.ts
     la_valeur = None
     my_e = None
     my_f = None
     try:
-        la_valeur = locale.atof(valeur)
+        la_valeur = float(valeur.strip().replace(ts, '').replace(dp, '.'))
     except ValueError as e:
         # see https://stackoverflow.com/questions/24271752/except-clause-deletes-local-variable
         my_e = e
         my_e.__traceback__ = None
         if dp != '.':
             try:
-                la_valeur = locale.atof(valeur.replace('.', ts))
+                la_valeur = float(valeur.strip().replace('.', '').replace(ts, '')
+                                  .replace(dp, '.'))
             except ValueError as f:
                 my_f = f
                 my_f.__traceback__ = None
-                print('Failed to convert {} to a float: {}'.format(valeur, my_f))
+                if contexte.interactif:
+                    print('Failed to convert {} to a float: {}'.format(valeur, my_f))
     if la_valeur is None:
-        myloc = locale.getdefaultlocale()
-        print('valeur par défaut: language {}, code {}\n'.format(myloc[0], myloc[1]))
-
-        if VERBOSITY > 1:
-            pdb.set_trace()
+        if contexte.interactif and contexte.verbosity > 1:
+            import pdb; pdb.set_trace()
         else:
             if my_f:
                 raise my_f
@@ -822,149 +3006,818 @@ def mysafe_atof(valeur):
     return la_valeur
 
 
-# On demarre ici
-def main(*args, **kwargs):
-    print('\n******************************************************')
-    print('*   Convertisseur de relevés bancaires BNP Paribas   *')
-    print('********************  PDF -> CSV/XLSX  ***************\n')
+# Utilisation comme bibliothèque : ni affichage, ni input(), ni pdb, ni exit()
+class Statement(UnReleve):
+    """Relevé renvoyé par convert_pdf() : le relevé lu, avec le compte, l'année et
+    le mois du relevé et les soldes en centimes"""
+    def __init__(self, nom="inconnu", contexte=None, compte=None, annee=None, mois=None):
+        super().__init__(nom, contexte)
+        self.compte = compte
+        self.annee = annee
+        self.mois = mois
 
-    if PDFTOTEXT_SPEC is None:
+    def __repr__(self):
+        return 'Compte : {} -- {}/{} -- {} opérations'.format(self.compte, self.mois,
+                                                               self.annee, len(self.liste))
+
+    @property
+    def operations(self):
+        """Les opérations du relevé (uneOperation), par date"""
+        return self.liste
+
+    @staticmethod
+    def _solde(Ope):
+        return Ope.centimes_credit - Ope.centimes_debit
+
+    @property
+    def solde_initial(self):
+        """Solde initial en centimes, négatif s'il est débiteur"""
+        return self._solde(self.head[0]) if self.head else None
+
+    @property
+    def solde_final(self):
+        """Solde final en centimes, négatif s'il est débiteur"""
+        return self._solde(self.tail[-1]) if self.tail else None
+
+    def vers_dict(self):
+        """Le relevé en types de base pour JSON : dates ISO, montants en centimes"""
+        return {'nom': self.nom, 'compte': self.compte, 'annee': self.annee,
+                'mois': self.mois, 'monnaie': self.monnaie,
+                'solde_initial': self.solde_initial, 'solde_final': self.solde_final,
+                'operations': [{'date': iso_date(Ope.dt_date),
+                                'date_valeur': iso_date(Ope.dt_valeur),
+                                'date_oper': iso_date(Ope.dt_oper), 'description': Ope.desc,
+                                'debit': Ope.centimes_debit, 'credit': Ope.centimes_credit}
+                               for Ope in self.liste]}
+
+
+# lignes de contrôle ajoutées par l'analyse à la fin du relevé, avant le solde final
+LIGNES_CONTROLE = ("SOMME DE CONTROLE", "TOTAL DES MONTANTS")
+
+
+def sorte_ligne(Ope, where=''):
+    """Sorte d'une ligne du relevé (where : voir UnReleve.ajoute()) : 'opening' pour le
+    solde initial, 'operation', 'control' pour les lignes de contrôle, 'closing' pour
+    le solde final"""
+    if 'head' in where:
+        return 'opening'
+    if 'tail' in where:
+        return 'control' if Ope.desc in LIGNES_CONTROLE else 'closing'
+    return 'operation'
+
+
+def identifiant_releve(compte, annee, mois):
+    """Identifiant d'un relevé dans le flux NDJSON : '3000400123-2016-03'"""
+    return '-'.join(champ for champ in (compte, annee, mois) if champ)
+
+
+def enregistrement_JSON(Ope, where='', compte=None, identifiant=None):
+    """Une ligne du relevé en types de base pour JSON : sorte (voir sorte_ligne()),
+    compte et identifiant du relevé (voir identifiant_releve()), dates ISO, montants
+    en centimes"""
+    return {'kind': sorte_ligne(Ope, where), 'account': compte, 'statement': identifiant,
+            'date': iso_date(Ope.dt_date),
+            'date_valeur': iso_date(Ope.dt_valeur), 'date_oper': iso_date(Ope.dt_oper),
+            'description': Ope.desc, 'debit': Ope.centimes_debit,
+            'credit': Ope.centimes_credit}
+
+
+class TamponTri:
+    """Tampon de réordonnancement borné : rend les opérations qu'on lui pousse dans
+    l'ordre de list.sort() (stable, voir uneOperation.__lt__), à condition qu'aucune
+    n'arrive avec plus de taille opérations de retard. Il ne garde jamais plus de
+    taille opérations"""
+
+    def __init__(self, taille=TRI_FENETRE):
+        self.taille = taille
+        self.tas = []
+        self.num = 0
+
+    def pousse(self, Ope):
+        """Ajoute une opération ; renvoie celles qui peuvent sortir"""
+        heapq.heappush(self.tas, (Ope._cle(), self.num, Ope))
+        self.num += 1
+        if len(self.tas) > self.taille:
+            return (heapq.heappop(self.tas)[2],)
+        return ()
+
+    def vide(self):
+        """Itérateur sur les opérations restantes, dans l'ordre"""
+        while self.tas:
+            yield heapq.heappop(self.tas)[2]
+
+
+class FluxReleve(UnReleve):
+    """Relevé lu au fil de l'eau : ses opérations ne sont pas gardées, operations()
+    les rend au fur et à mesure que l'analyse les reconnaît, et la mémoire occupée ne
+    dépend pas de la taille du relevé. Les sommes ne sont contrôlées qu'au solde
+    final : SommesIncorrectes est alors levée après que toutes les opérations ont été
+    rendues.
+
+        releve = FluxReleve("relevé", contexte)
+        for where, Ope in releve.operations(lignes, '2016', '03', trier=True):
+            ...
+    """
+    def __init__(self, nom="inconnu", contexte=None):
+        super().__init__(nom, contexte)
+        self.reconnues = collections.deque()
+
+    def ajoute(self, Ope, where=''):
+        """Met l'opération reconnue en attente d'être rendue par operations()"""
+        self.reconnues.append((where, Ope))
+
+    def operations(self, lignes, annee, mois, nom="", trier=False, fenetre=TRI_FENETRE):
+        """Itérateur sur les couples (where, opération) du relevé, voir ajoute() :
+        solde initial, opérations, lignes de contrôle et solde final. Les opérations
+        sont dans l'ordre du relevé ou, avec trier, dans celui de UnReleve tant
+        qu'aucune n'arrive avec plus de fenetre opérations de retard. Les lignes qui
+        suivent le solde final ne sont pas lues"""
+        analyse = AnalyseReleve(self, annee, mois, nom)
+        tampon = TamponTri(fenetre) if trier else None
+        for ligne in lignes:
+            fini = analyse.pousse(ligne)
+            yield from self._reconnues(tampon)
+            if fini:
+                break
+        analyse.termine()
+        yield from self._reconnues(tampon)
+        if tampon is not None:
+            # relevé sans solde final
+            for Ope in tampon.vide():
+                yield '', Ope
+
+    def _reconnues(self, tampon):
+        reconnues = self.reconnues
+        while reconnues:
+            where, Ope = reconnues.popleft()
+            if tampon is None or 'head' in where:
+                yield where, Ope
+            elif 'tail' in where:
+                for Ope_triee in tampon.vide():
+                    yield '', Ope_triee
+                yield where, Ope
+            else:
+                for Ope_triee in tampon.pousse(Ope):
+                    yield '', Ope_triee
+
+    def lignes_flux(self, lignes, annee, mois, nom="", sorte='csv', trier=False,
+                    fenetre=TRI_FENETRE, compte=None):
+        """Itérateur sur les lignes du CSV (les mêmes que lignes_CSV()) ou, avec
+        sorte='ndjson', du NDJSON du relevé (les mêmes que lignes_NDJSON()), au fur et
+        à mesure de l'analyse"""
+        operations = self.operations(lignes, annee, mois, nom, trier, fenetre)
+        if sorte == 'ndjson':
+            import json
+            identifiant = identifiant_releve(compte, annee, mois)
+            for where, Ope in operations:
+                yield json.dumps(enregistrement_JSON(Ope, where, compte, identifiant),
+                                 ensure_ascii=False) + "\n"
+            return
+        entete = False
+        for where, Ope in operations:
+            if not entete:
+                # la monnaie du compte est lue avant le solde initial
+                yield self.entete_CSV()
+                entete = True
+            yield self.ligne_CSV(Ope, where)
+        if not entete:
+            yield self.entete_CSV()
+
+
+def periode_texte(lignes):
+    """Renvoie (annee, mois) d'un relevé d'après la date de son solde final
+    ('SOLDE CREDITEUR AU 26.03.2016'), None s'il n'y en a pas"""
+    for ligne in reversed(lignes):
+        if classe_ligne(ligne) & LIGNE_SOLDE:
+            for date in ligne.split():
+                jour = decode_date(date, '%d.%m.%Y')
+                if jour is not None:
+                    return '{:04d}'.format(jour.year), '{:02d}'.format(jour.month)
+    return None
+
+
+def periode_nom(nom):
+    """Renvoie (compte, annee, mois) d'après le nom d'un relevé, quel que soit le compte,
+    (None, None, None) si le nom n'est pas celui d'un relevé"""
+    compte = compte_releve(nom) if nom else None
+    cle = cle_releve(nom, compte) if compte is not None else None
+    return cle if cle is not None else (None, None, None)
+
+
+def convert_text(texte, nom=None, annee=None, mois=None, contexte=None):
+    """Comme convert_pdf(), pour le texte déjà produit par 'pdftotext -layout'"""
+    contexte = (contexte if contexte is not None else Contexte()).remplace(interactif=False)
+    compte, annee_nom, mois_nom = periode_nom(nom)
+    annee, mois = annee or annee_nom, mois or mois_nom
+    lignes = io.StringIO(texte, newline=None).readlines()
+    nom = nom or "<texte>"
+    if not (annee and mois):
+        periode = periode_texte(lignes)
+        if periode is None:
+            raise ReleveIllisible("le fichier {} semble mal formatté".format(nom))
+        annee, mois = annee or periode[0], mois or periode[1]
+    releve = Statement(nom, contexte, compte, annee, mois)
+    releve.ajoute_from_lignes(lignes, annee, mois, nom)
+    return releve
+
+
+def convert_pdf(source, annee=None, mois=None, contexte=None, nom=None):
+    """Convertit un relevé et renvoie un Statement, sans rien écrire sur la sortie
+    standard. source est le contenu du PDF (bytes) ou le chemin d'un PDF, ou d'un TXT
+    déjà produit par 'pdftotext -layout'. Un contenu est lu en mémoire par le module
+    pdftotext ; sans lui, il est écrit dans un fichier temporaire pour le programme
+    pdftotext (voir lignes_PDF()). L'année et le mois ('AAAA', 'MM')
+    sont pris dans le nom du fichier (nom, pour un contenu en bytes) ou, à défaut,
+    dans la date du solde final. Lève PdftotextAbsent, ReleveIllisible,
+    SommesIncorrectes ou DelaiDepasse (programme pdftotext arrêté après
+    PDFTOTEXT_DELAI secondes)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        pdf = bytes(source)
+        nom = nom or "<bytes>"
+    else:
+        pdf = os.fspath(source)
+        nom = nom or os.path.basename(pdf)
+        if pdf.split('.')[-1].lower() == 'txt':
+            with open(pdf, 'r') as file:
+                return convert_text(file.read(), nom, annee, mois, contexte)
+    verifie_pdftotext()
+    # une seule analyse, arrêtée au solde final : les pages suivantes ne sont pas
+    # converties. Sans année ni mois, elle ne sert qu'à lire le texte jusqu'au solde
+    compte, annee_nom, mois_nom = periode_nom(nom)
+    annee, mois = annee or annee_nom, mois or mois_nom
+    texte, donnees, nombre = analyse_PDF(pdf, annee or '2000', mois or '01', contexte, nom)
+    if donnees is None or not (annee and mois):
+        return convert_text(texte, nom, annee, mois, contexte)
+    releve = Statement.depuis_donnees(dict(donnees, nom=nom), (
+        contexte if contexte is not None else Contexte()).remplace(interactif=False))
+    releve.compte, releve.annee, releve.mois = compte, annee, mois
+    return releve
+
+
+def verifie_pdftotext():
+    """Lève PdftotextAbsent s'il n'y a ni le module ni le programme pdftotext"""
+    if module_pdftotext() is None:
+        import shutil
         if shutil.which(PDFTOTEXT) is None:
-            print("Fichier {} absent !".format(PDFTOTEXT))
-            input("Bye bye :(")
-            exit()
+            raise PdftotextAbsent("ni le module pdftotext ni {} ne sont installés"
+                                  .format(PDFTOTEXT))
+
+
+def iter_operations(source, annee=None, mois=None, contexte=None):
+    """Itérateur sur les opérations (uneOperation) d'un relevé, voir convert_pdf()"""
+    yield from convert_pdf(source, annee, mois, contexte).operations
+
+
+def flux_operations(source, annee=None, mois=None, contexte=None, nom=None, trier=False,
+                    fenetre=TRI_FENETRE, sorte=None):
+    """Comme iter_operations(), mais au fil de l'eau : itérateur sur les couples
+    (where, opération) du relevé, rendus dès que l'analyse les reconnaît (voir
+    FluxReleve.operations()), ou sur les lignes du CSV ou du NDJSON si sorte vaut
+    'csv' ou 'ndjson'. Les pages d'un PDF sont converties au fur et à mesure, un TXT
+    est lu ligne à ligne. Sans année ni mois, ni dans l'appel ni dans le nom du
+    fichier, le texte est lu en entier pour les trouver à la date du solde final"""
+    contexte = (contexte if contexte is not None else Contexte()).remplace(interactif=False)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        nom = nom or "<bytes>"
+        verifie_pdftotext()
+        lignes = lignes_PDF(bytes(source))
+    else:
+        source = os.fspath(source)
+        nom = nom or os.path.basename(source)
+        if source.split('.')[-1].lower() == 'txt':
+            lignes = open(source, 'r')
+        else:
+            verifie_pdftotext()
+            lignes = lignes_PDF(source)
+    ouvertes = lignes
+    try:
+        compte, annee_nom, mois_nom = periode_nom(nom)
+        annee, mois = annee or annee_nom, mois or mois_nom
+        if not (annee and mois):
+            lignes = list(lignes)
+            periode = periode_texte(lignes)
+            if periode is None:
+                raise ReleveIllisible("le fichier {} semble mal formatté".format(nom))
+            annee, mois = annee or periode[0], mois or periode[1]
+        releve = FluxReleve(nom, contexte)
+        if sorte is None:
+            yield from releve.operations(lignes, annee, mois, nom, trier, fenetre)
+        else:
+            yield from releve.lignes_flux(lignes, annee, mois, nom, sorte, trier, fenetre,
+                                          compte)
+    finally:
+        if hasattr(ouvertes, 'close'):
+            ouvertes.close()
+
+
+def ecrit_flux(source, sortie='-', sorte='csv', annee=None, mois=None, contexte=None,
+               nom=None, trier=False, fenetre=TRI_FENETRE):
+    """Écrit le CSV ou le NDJSON (sorte='ndjson') d'un relevé au fil de l'analyse, en
+    mémoire constante, voir flux_operations(). sortie est '-' pour la sortie standard,
+    un chemin, ou un fichier texte déjà ouvert. Renvoie le nombre de lignes écrites"""
+    lignes = flux_operations(source, annee, mois, contexte, nom, trier, fenetre, sorte)
+    if sortie == '-':
+        sortie = sys.stdout
+    if hasattr(sortie, 'write'):
+        return ecrit_lignes(lignes, sortie)
+    with open(sortie, 'w') as file:
+        return ecrit_lignes(lignes, file)
+
+
+def ecrit_lignes(lignes, file):
+    """Écrit les lignes dans le fichier au fur et à mesure ; renvoie leur nombre"""
+    nombre = 0
+    for ligne in lignes:
+        file.write(ligne)
+        nombre += 1
+    return nombre
+
+
+def conversion_service(contenu, nom, sorte, texte, contexte):
+    """Conversion d'un envoi du mode service, dans un processus du pool : contenu est
+    le PDF, ou son texte si texte est vrai. Renvoie le CSV ou le JSON, en bytes"""
+    if texte:
+        releve = convert_text(contenu.decode('utf-8'), nom, contexte=contexte)
+    else:
+        releve = convert_pdf(contenu, contexte=contexte, nom=nom)
+    if sorte == 'csv':
+        return ''.join(releve.lignes_CSV()).encode('utf-8')
+    import json
+    return json.dumps(releve.vers_dict(), ensure_ascii=False).encode('utf-8')
+
+
+def quantiles(valeurs):
+    """Moyenne, médiane, 95e centile et maximum d'une série de durées, en ms"""
+    if not valeurs:
+        return {'moyenne': None, 'p50': None, 'p95': None, 'max': None}
+    valeurs = sorted(valeurs)
+    def rang(q):
+        return round(valeurs[round(q * (len(valeurs) - 1))] * 1000, 3)
+    return {'moyenne': round(sum(valeurs) / len(valeurs) * 1000, 3), 'p50': rang(0.5),
+            'p95': rang(0.95), 'max': round(valeurs[-1] * 1000, 3)}
+
+
+class ServiceConversion:
+    """Service HTTP local (--serve) : les relevés envoyés par POST /convert sont mis
+    dans une file bornée, convertis par un pool de jobs processus, et renvoyés en CSV
+    ou en JSON. GET /stats donne la profondeur de la file et les latences.
+
+        POST /convert?format=json|csv&nom=RCHQ_101_..._20160326_2153.pdf
+             corps : le PDF, ou son texte 'pdftotext -layout' (Content-Type: text/plain)
+
+    Une file pleine répond 503, un relevé illisible 422, sans pdftotext 501"""
+
+    def __init__(self, jobs=1, attente_max=SERVICE_ATTENTE_MAX, contexte=None,
+                 taille_max=SERVICE_TAILLE_MAX*1024*1024):
+        self.jobs = jobs
+        self.attente_max = attente_max
+        self.taille_max = taille_max
+        contexte = contexte if contexte is not None else Contexte()
+        self.contexte = contexte.remplace(interactif=False, rapport=None)
+        self.file = None
+        self.executeur = None
+        self.en_cours = 0
+        self.compteurs = {'recues': 0, 'traitees': 0, 'erreurs': 0, 'refusees': 0}
+        self.latences = collections.deque(maxlen=SERVICE_LATENCES)
+        self.debut = time.monotonic()
 
+    def __repr__(self):
+        return 'Service : {} processus -- {} en attente au plus'.format(self.jobs,
+                                                                      self.attente_max)
+
+    def statistiques(self):
+        attente, conversion, totale = zip(*self.latences) if self.latences else ((), (), ())
+        return {'duree': round(time.monotonic() - self.debut, 3),
+                'file': {'attente': self.file.qsize() if self.file else 0,
+                         'capacite': self.attente_max, 'en_cours': self.en_cours,
+                         'processus': self.jobs},
+                'requetes': dict(self.compteurs),
+                'latence_ms': {'attente': quantiles(attente),
+                               'conversion': quantiles(conversion),
+                               'totale': quantiles(totale)}}
+
+    async def _ouvrier(self):
+        """Passe les conversions de la file au pool, une à la fois : le pool n'a jamais
+        plus de jobs conversions, les autres attendent dans la file"""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            contenu, nom, sorte, texte, futur, arrivee = await self.file.get()
+            debut = time.perf_counter()
+            self.en_cours += 1
+            try:
+                resultat = await loop.run_in_executor(self.executeur, conversion_service,
+                                                      contenu, nom, sorte, texte, self.contexte)
+            except Exception as e:
+                self.compteurs['erreurs'] += 1
+                if not futur.done():
+                    futur.set_exception(e)
+            else:
+                self.compteurs['traitees'] += 1
+                if not futur.done():
+                    futur.set_result(resultat)
+            finally:
+                self.en_cours -= 1
+                fin = time.perf_counter()
+                self.latences.append((debut - arrivee, fin - debut, fin - arrivee))
+                self.file.task_done()
+
+    async def _convertit(self, params, entetes, corps):
+        import asyncio, json
+        sorte = params.get('format', ['json'])[0]
+        if sorte not in ('csv', 'json'):
+            return 400, {'erreur': "format : 'csv' ou 'json' attendu"}
+        if not corps:
+            return 400, {'erreur': "aucun relevé envoyé"}
+        self.compteurs['recues'] += 1
+        if self.file.full():
+            self.compteurs['refusees'] += 1
+            return 503, {'erreur': "file d'attente pleine"}
+        nom = params.get('nom', [None])[0] or entetes.get('x-filename')
+        texte = entetes.get('content-type', '').startswith('text/plain')
+        futur = asyncio.get_running_loop().create_future()
+        self.file.put_nowait((corps, nom, sorte, texte, futur, time.perf_counter()))
+        try:
+            resultat = await futur
+        except ReleveIllisible as e:
+            return 422, {'erreur': str(e), 'type': type(e).__name__}
+        except PdftotextAbsent as e:
+            return 501, {'erreur': str(e), 'type': type(e).__name__}
+        except DelaiDepasse as e:
+            return 504, {'erreur': str(e), 'type': type(e).__name__}
+        except Exception as e:
+            return 500, {'erreur': str(e), 'type': type(e).__name__}
+        if sorte == 'csv':
+            return 200, resultat, 'text/csv; charset=utf-8'
+        return 200, resultat, 'application/json'
+
+    async def _traite(self, methode, cible, entetes, corps):
+        """Renvoie (statut, contenu[, type]) ; un contenu dict est envoyé en JSON"""
+        from urllib.parse import urlsplit, parse_qs
+        url = urlsplit(cible)
+        if url.path == '/stats':
+            if methode != 'GET':
+                return 405, {'erreur': 'GET attendu'}
+            return 200, self.statistiques()
+        if url.path == '/convert':
+            if methode != 'POST':
+                return 405, {'erreur': 'POST attendu'}
+            return await self._convertit(parse_qs(url.query), entetes, corps)
+        return 404, {'erreur': 'chemins : POST /convert, GET /stats'}
+
+    async def _reponse(self, writer, statut, contenu, type_contenu='application/json',
+                       garde=False):
+        import json
+        from http import HTTPStatus
+        if isinstance(contenu, dict):
+            contenu = json.dumps(contenu, ensure_ascii=False).encode('utf-8')
+        entete = ["HTTP/1.1 {} {}".format(statut, HTTPStatus(statut).phrase),
+                  "Content-Type: " + type_contenu,
+                  "Content-Length: {}".format(len(contenu)),
+                  "Connection: " + ("keep-alive" if garde else "close")]
+        if statut == 503:
+            entete.append("Retry-After: 1")
+        writer.write(('\r\n'.join(entete) + '\r\n\r\n').encode('latin-1') + contenu)
+        await writer.drain()
+
+    async def _client(self, reader, writer):
+        """Une connexion : requêtes HTTP/1.1 successives (keep-alive)"""
+        import asyncio
+        try:
+            while True:
+                ligne = await reader.readline()
+                if not ligne.strip():
+                    break
+                try:
+                    methode, cible, version = ligne.decode('latin-1').split()
+                except ValueError:
+                    await self._reponse(writer, 400, {'erreur': 'requête invalide'})
+                    break
+                entetes = {}
+                while True:
+                    ligne = await reader.readline()
+                    if ligne in (b'\r\n', b'\n', b''):
+                        break
+                    cle, _, valeur = ligne.decode('latin-1').partition(':')
+                    entetes[cle.strip().lower()] = valeur.strip()
+                try:
+                    longueur = int(entetes.get('content-length') or 0)
+                except ValueError:
+                    longueur = -1
+                if longueur < 0 or longueur > self.taille_max:
+                    await self._reponse(writer, 413 if longueur > 0 else 400,
+                                        {'erreur': 'taille du relevé invalide'})
+                    break
+                corps = await reader.readexactly(longueur) if longueur else b''
+                garde = (version == 'HTTP/1.1' and
+                         entetes.get('connection', '').lower() != 'close')
+                await self._reponse(writer, *await self._traite(methode, cible, entetes, corps),
+                                    garde=garde)
+                if not garde:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def sert(self, hote=SERVICE_HOTE, port=8000, pret=None):
+        """Démarre le service et répond jusqu'à l'arrêt du programme. pret est appelé
+        avec le port d'écoute une fois le service démarré (utile avec port=0)"""
+        import asyncio
+        from concurrent.futures import ProcessPoolExecutor
+        self.file = asyncio.Queue(self.attente_max)
+        self.executeur = ProcessPoolExecutor(self.jobs)
+        # les processus sont lancés avant d'accepter des connexions : lancés plus tard
+        # par fork(), ils hériteraient des sockets des clients et les garderaient ouvertes
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executeur, int)
+                               for _ in range(self.jobs)))
+        ouvriers = [asyncio.ensure_future(self._ouvrier()) for _ in range(self.jobs)]
+        try:
+            serveur = await asyncio.start_server(self._client, hote, port)
+            async with serveur:
+                if pret is not None:
+                    pret(serveur.sockets[0].getsockname()[1])
+                await serveur.serve_forever()
+        finally:
+            for ouvrier in ouvriers:
+                ouvrier.cancel()
+            self.executeur.shutdown(cancel_futures=True)
+
+
+def au_revoir(message):
+    """Dernier message de la ligne de commande : attend l'utilisateur, pour que la
+    console reste ouverte, sauf en mode non interactif"""
+    if INTERACTIF:
+        input(message)
+    else:
+        print(message)
+
+
+# On demarre ici
+def main(*args, **kwargs):
     global PREFIXE_COMPTE
     global VERBOSITY
+    global INTERACTIF
+    global SORTIES
+    global RAPPORT
+    global PDFTOTEXT_DELAI
+    global FLUX
 
+    import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--verbosity", type=int, default=0, help="increase output verbosity")
     parser.add_argument("--prefixe", help="prefixe des fichiers à traiter")
     parser.add_argument("--dir", help="répertoire des fichiers à traiter")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="nombre de conversions PDF simultanées (0: un par processeur)")
+
+    parser.add_argument("--cache",
+                        help="répertoire du cache des relevés analysés "
+                        "(défaut: '{}' dans le répertoire des relevés, '' pour désactiver)".format(
+                            CACHE_REP))
+    parser.add_argument("--cache-max", type=int, default=CACHE_TAILLE_MAX,
+                        help="taille maximale du cache, en Mo")
+    parser.add_argument("--rebuild-outputs", action="store_true",
+                        help="régénère tous les CSV/XLSX à partir du cache, sans lire les PDF")
+    parser.add_argument("--classeur", choices=['annee', 'compte'],
+                        help="exporte aussi un classeur XLSX consolidé par année, ou pour tout "
+                        "le compte : une feuille par mois et une feuille de synthèse")
+    parser.add_argument("--sqlite", metavar="FICHIER",
+                        help="importe aussi les opérations dans une base SQLite")
+    parser.add_argument("--archive", metavar="REPERTOIRE",
+                        help="ajoute aussi les opérations à une archive en colonnes, "
+                        "projetée en mémoire à la lecture (voir LectureArchive)")
+    parser.add_argument("--watch", action="store_true",
+                        help="reste actif et convertit les nouveaux PDF dès leur arrivée")
+    parser.add_argument("--format", default=','.join(SORTIES),
+                        help="fichiers produits pour chaque relevé, séparés par des virgules "
+                        "(défaut: '%(default)s'), et 'ndjson' pour un flux NDJSON des "
+                        "relevés convertis (voir --output, --tout)")
+    parser.add_argument("--output", metavar="FICHIER", default='-',
+                        help="destination du flux NDJSON de --format ndjson, '-' pour la "
+                        "sortie standard (défaut)")
+    parser.add_argument("--tout", action="store_true",
+                        help="le flux NDJSON contient tous les relevés du compte, pas "
+                        "seulement ceux convertis par l'exécution")
+    parser.add_argument("--comptes", metavar="LISTE",
+                        help="préfixes des comptes à traiter en une fois, séparés par des "
+                        "virgules, ou 'auto' pour tous les comptes trouvés")
+    parser.add_argument("--recursif", action="store_true",
+                        help="traite aussi les relevés des sous-répertoires")
+    parser.add_argument("--report", metavar="FICHIER",
+                        help="écrit les durées de chaque étape, par fichier et au total, "
+                        "dans un rapport JSON")
+    parser.add_argument("--timeout", type=float, default=PDFTOTEXT_DELAI,
+                        help="durée maximale d'un programme pdftotext, en secondes, sans le "
+                        "module pdftotext (défaut: %(default)s)")
+    parser.add_argument("--serve", metavar="[HOTE:]PORT",
+                        help="service HTTP de conversion (POST /convert, GET /stats), "
+                        "sur {} par défaut".format(SERVICE_HOTE))
+    parser.add_argument("--queue", type=int, default=SERVICE_ATTENTE_MAX,
+                        help="nombre de conversions en attente au plus, avec --serve "
+                        "(défaut: %(default)s)")
     myargs = parser.parse_args()
 
-    if myargs.verbosity:
-        VERBOSITY = myargs.verbosity
-
-    chemin = os.getcwd()
-    if myargs.dir:
-        myargs.dir = os.path.expanduser(myargs.dir)
-        if os.path.isabs(myargs.dir):
-            chemin = myargs.dir
+    sorties = tuple(ext.strip().lower() for ext in myargs.format.split(',') if ext.strip())
+    if not sorties or not set(sorties) <= set(FORMATS_FICHIERS) | {'ndjson'}:
+        parser.error("--format : liste de 'csv', 'xlsx' et 'ndjson' attendue")
+    SORTIES = sorties
+    if myargs.tout and myargs.watch:
+        parser.error("--tout ne s'emploie pas avec --watch")
+    if (myargs.comptes or myargs.recursif) and (myargs.watch or myargs.rebuild_outputs):
+        parser.error("--comptes et --recursif ne s'emploient pas avec --watch "
+                     "ni avec --rebuild-outputs")
+    if myargs.serve and (myargs.watch or myargs.rebuild_outputs or myargs.comptes
+                         or myargs.recursif):
+        parser.error("--serve ne s'emploie pas avec --watch, --rebuild-outputs, --comptes "
+                     "ni --recursif")
+    if myargs.serve:
+        hote, _, port = myargs.serve.rpartition(':')
+        if not port.isdigit() or myargs.queue < 1:
+            parser.error("--serve : [HOTE:]PORT attendu, --queue : au moins 1")
+    if myargs.report:
+        RAPPORT = Rapport()
+    if myargs.timeout <= 0:
+        parser.error("--timeout : durée positive attendue")
+    PDFTOTEXT_DELAI = myargs.timeout
+    if 'ndjson' in SORTIES and not myargs.serve:
+        if myargs.output == '-':
+            # la sortie standard est réservée au flux : les messages passent sur la sortie
+            # d'erreur, et personne n'est là pour répondre aux questions
+            sys.stdout.reconfigure(encoding='utf-8', newline='\n')
+            FLUX = sys.stdout
+            sys.stdout = sys.stderr
+            INTERACTIF = False
         else:
-            chemin = os.path.join(chemin, myargs.dir)
+            FLUX = open(os.path.expanduser(myargs.output), 'w', encoding='utf-8',
+                        newline='\n')
 
-    if myargs.prefixe:
-        PREFIXE_COMPTE = myargs.prefixe
-    else:
-        # default: explore '.', then convertBNP base dir
-        if os.path.isfile('./prefixe_compte.txt'):
-            with open('./prefixe_compte.txt', 'r') as file:
-                PREFIXE_COMPTE = file.readline().strip()
+    try:
+        print('\n******************************************************')
+        print('*   Convertisseur de relevés bancaires BNP Paribas   *')
+        print('********************  PDF -> CSV/XLSX  ***************\n')
+
+        if myargs.jobs < 1:
+            myargs.jobs = os.cpu_count() or 1
+
+        if myargs.serve:
+            import asyncio
+            if module_pdftotext() is None:
+                import shutil
+                if shutil.which(PDFTOTEXT) is None:
+                    print("Fichier {} absent : seuls les textes sont acceptés".format(PDFTOTEXT))
+            service = ServiceConversion(myargs.jobs, myargs.queue,
+                                        Contexte(verbosity=myargs.verbosity, interactif=False))
+            hote = hote or SERVICE_HOTE
+            try:
+                asyncio.run(service.sert(hote, int(port), lambda port: print(
+                    "Service de conversion : http://{}:{}/convert ({} processus)".format(
+                        hote, port, myargs.jobs), flush=True)))
+            except KeyboardInterrupt:
+                pass
+            return 0
+
+        if not myargs.rebuild_outputs and module_pdftotext() is None:
+            import shutil
+            if shutil.which(PDFTOTEXT) is None:
+                print("Fichier {} absent !".format(PDFTOTEXT))
+                au_revoir("Bye bye :(")
+                sys.exit(1)
+
+        if myargs.verbosity:
+            VERBOSITY = myargs.verbosity
+        if myargs.watch:
+            INTERACTIF = False
+
+        chemin = os.getcwd()
+        if myargs.dir:
+            myargs.dir = os.path.expanduser(myargs.dir)
+            if os.path.isabs(myargs.dir):
+                chemin = myargs.dir
+            else:
+                chemin = os.path.join(chemin, myargs.dir)
+
+        if myargs.prefixe:
+            PREFIXE_COMPTE = myargs.prefixe
         else:
-            mes_pdfs = os.path.join(os.path.dirname(
-                PREFIXE_SCRIPT), 'prefixe_compte.txt')
+            # default: explore '.', then convertBNP base dir
+            if os.path.isfile('./prefixe_compte.txt'):
+                with open('./prefixe_compte.txt', 'r') as file:
+                    PREFIXE_COMPTE = file.readline().strip()
+            else:
+                mes_pdfs = os.path.join(os.path.dirname(
+                    PREFIXE_SCRIPT), 'prefixe_compte.txt')
+                if os.path.isfile(mes_pdfs):
+                    with open(mes_pdfs, 'r') as file:
+                        PREFIXE_COMPTE = file.readline().strip()
+            # override with the local file, if any
+            mes_pdfs = os.path.join(chemin, 'prefixe_compte.txt')
             if os.path.isfile(mes_pdfs):
                 with open(mes_pdfs, 'r') as file:
                     PREFIXE_COMPTE = file.readline().strip()
-        # override with the local file, if any
-        mes_pdfs = os.path.join(chemin, 'prefixe_compte.txt')
-        if os.path.isfile(mes_pdfs):
-            with open(mes_pdfs, 'r') as file:
-                PREFIXE_COMPTE = file.readline().strip()
-
-    fichiers = os.listdir(chemin)
-
-    mes_pdfs = filtrer(fichiers, 'pdf')
-    deja_en_txt = filtrer(fichiers, 'txt')
-    deja_en_csv = filtrer(fichiers, 'csv')
-    deja_en_xlsx = filtrer(fichiers, 'xlsx')
-
-    mes_mois_disponibles = mois_dispos(mes_pdfs)
-    mes_mois_deja_en_txt = mois_dispos(deja_en_txt)
-
-    if len(mes_mois_disponibles) == 0:
-        print("Il n'y a pas de relevés de compte en PDF dans le répertoire")
-        print(chemin + "\n")
-        print("contenant " + PREFIXE_COMPTE + " avant le champs 'date'")
-        print("\nIl faut placer les fichiers convertBNP.py et pdftotext.exe")
-        print("à côté des fichiers de relevé de compte en PDF et adapter")
-        print("la ligne 48 (PREFIXE_COMPTE = XXXXX) du fichier convertBNP.py")
-        print("pour la faire correspondre à votre numéro de compte.\n")
-        input("Bye bye :(")
-        exit()
-
-    affiche(mes_mois_disponibles)
-    touch = 0
-    temp_list = []
 
-    # on convertit tous les nouveaux relevés PDF en TXT sauf si CSV deja dispo
-    for releve in mes_pdfs:
-        operation = releve.split('.')   # strip the extension
-        operation = operation[0].split('_')   # get chunks
-        if "FRAIS" in operation[0]:
-            continue
-        for num, val in enumerate(operation[1:]):
-            if PREFIXE_COMPTE not in val:
-                continue
-            annee = operation[num+2][0:4]
-            mois = operation[num+2][4:6]
-            csv = PREFIXE_CSV+annee+'-'+mois+".csv"
-            xlsx = PREFIXE_CSV+annee+'-'+mois+".xlsx"
-            if csv not in deja_en_csv:
-                touch = touch + 1
-                extraction_PDF(releve, deja_en_txt, temp_list, myargs.dir)
-            elif xlsx not in deja_en_xlsx:
-                touch = touch + 1
-                extraction_PDF(releve, deja_en_txt, temp_list, myargs.dir)
-    if touch != 0:
-        print("")
-
-    # on remet à jour la liste de TXT
-    fichiers = os.listdir(chemin)
-    deja_en_txt = filtrer(fichiers, 'txt')
-    mes_mois_deja_en_txt = mois_dispos(deja_en_txt)
-
-    # on convertit tous les nouveaux TXT en CSV
-    for txt in deja_en_txt:
-        operation = txt.split('.')   # strip the extension
-        operation = operation[0].split('_')   # get chunks
-        if "FRAIS" in operation[0]:
-            continue
-        for num, val in enumerate(operation[1:]):
-            if PREFIXE_COMPTE not in val:
-                continue
-            # the next element contains the date
-            annee = operation[num+2][0:4]
-            mois = operation[num+2][4:6]
-            csv = PREFIXE_CSV+annee+'-'+mois+".csv"
-            xlsx = PREFIXE_CSV+annee+'-'+mois+".xlsx"
-            if csv not in deja_en_csv:
-                releve = UnReleve()
-                releve.ajoute_from_TXT(txt, annee, mois, myargs.dir)
-                releve.genere_CSV(PREFIXE_CSV+annee+'-'+mois, myargs.dir, mois)
-            elif xlsx not in deja_en_xlsx:
-                releve = UnReleve()
-                releve.ajoute_from_TXT(txt, annee, mois, myargs.dir)
-                releve.genere_CSV(PREFIXE_CSV+annee+'-'+mois, myargs.dir, mois)
-
-    # on efface les fichiers TXT
-    if len(temp_list):
-        print("[txt-> x  ] Nettoyage\n")
-        for txt in temp_list:
-            if myargs.dir:
-                txt = os.path.join(myargs.dir, txt)
-            os.remove(txt)
-
-    if touch == 0:
-        input("Pas de nouveau relevé. Bye bye.")
-    else:
-        print(str(touch)+" relevés de comptes convertis.")
-        input("Terminé. Bye bye.")
+        cache = None
+        if myargs.cache is None:
+            cache = CacheReleves(os.path.join(chemin, CACHE_REP), myargs.cache_max*1024*1024)
+        elif myargs.cache:
+            cache = CacheReleves(os.path.expanduser(myargs.cache), myargs.cache_max*1024*1024)
+        if cache is not None:
+            registre_profils(os.path.join(cache.repertoire, PROFILS_FICHIER))
+
+        # bases où importer les relevés : base SQLite, archive en colonnes
+        bases = []
+        if myargs.sqlite:
+            bases.append(GrandLivre(os.path.expanduser(myargs.sqlite)))
+        if myargs.archive:
+            bases.append(ArchiveColonnes(os.path.expanduser(myargs.archive)))
+
+        if myargs.rebuild_outputs:
+            if cache is None:
+                print("L'option --rebuild-outputs nécessite le cache des relevés")
+                au_revoir("Bye bye :(")
+                sys.exit(1)
+            nombre = regenere_depuis_cache(cache, myargs.dir)
+            if myargs.classeur:
+                genere_classeurs(((annee, mois, releve)
+                                  for pdf_file, annee, mois, releve in cache.entrees()
+                                  if PREFIXE_COMPTE in pdf_file), myargs.classeur, myargs.dir)
+            if bases:
+                for pdf_file, annee, mois, releve in cache.entrees():
+                    if PREFIXE_COMPTE in pdf_file:
+                        for base in bases:
+                            base.importe(releve, compte_fichier(pdf_file), annee, mois, pdf_file)
+            for base in bases:
+                base.ferme()
+            if RAPPORT:
+                RAPPORT.ecrit(myargs.report)
+            print("\n"+str(nombre)+" relevés de comptes régénérés depuis le cache.")
+            au_revoir("Terminé. Bye bye.")
+            return 0
+
+        if myargs.comptes or myargs.recursif:
+            touch, comptes = convertit_lots(chemin, myargs, cache, bases)
+            ferme_executeur()
+            for base in bases:
+                base.ferme()
+            if RAPPORT:
+                RAPPORT.ecrit(myargs.report)
+            print("\n{} relevés de comptes convertis ({} comptes).".format(touch, comptes))
+            au_revoir("Terminé. Bye bye.")
+            return 0
+
+        # un seul parcours du répertoire, puis des recherches dans des dictionnaires
+        with chrono('decouverte'):
+            catalogue = Catalogue(chemin)
+            manifeste = Manifeste(chemin)
+
+        mes_mois_disponibles = catalogue.mois_disponibles()
+
+        if len(mes_mois_disponibles) == 0 and not myargs.watch:
+            print("Il n'y a pas de relevés de compte en PDF dans le répertoire")
+            print(chemin + "\n")
+            print("contenant " + PREFIXE_COMPTE + " avant le champs 'date'")
+            print("\nIl faut placer les fichiers convertBNP.py et pdftotext.exe")
+            print("à côté des fichiers de relevé de compte en PDF et adapter")
+            print("la ligne 48 (PREFIXE_COMPTE = XXXXX) du fichier convertBNP.py")
+            print("pour la faire correspondre à votre numéro de compte.\n")
+            au_revoir("Bye bye :(")
+            sys.exit(1)
+
+        affiche(mes_mois_disponibles)
+        with chrono('decouverte'):
+            a_lire = a_convertir(catalogue, manifeste)
+        touch = convertit(a_lire, chemin, myargs, cache, manifeste, bases)
+        complete(catalogue, a_lire, chemin, myargs, cache, manifeste, bases)
+        manifeste.sauve()
+        if a_lire:
+            print("")
+
+        if myargs.watch:
+            print(str(touch)+" relevés de comptes convertis.")
+            surveille(chemin, myargs, cache, manifeste, bases)
+        ferme_executeur()
+        for base in bases:
+            base.ferme()
+        if RAPPORT:
+            RAPPORT.ecrit(myargs.report)
+        if myargs.watch:
+            return 0
+
+        if not a_lire:
+            au_revoir("Pas de nouveau relevé. Bye bye.")
+        else:
+            print(str(touch)+" relevés de comptes convertis.")
+            au_revoir("Terminé. Bye bye.")
 
-    # EOF
+        # EOF
 
-    return 0
+        return 0
+    finally:
+        # le fichier de --output ; la sortie standard reste ouverte
+        if FLUX is not None and myargs.output != '-':
+            FLUX.close()
+            FLUX = None
 
 
 if __name__ == "__main__":